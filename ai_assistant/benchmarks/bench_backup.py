@@ -0,0 +1,108 @@
+"""Backup cost and what it does to concurrent chat writes.
+
+    PYTHONPATH=src python benchmarks/bench_backup.py --mb 200
+
+Fills a store with ``--mb`` MB of messages. Then, for each kind of backup,
+a writer thread appends messages the whole time the backup runs. Reported are
+backup time and size and the writer's append latency. ``none`` is the writer
+running alone for one second, as a baseline.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from assistant.backups import create_backup
+from assistant.memory import ConversationMemory
+
+MESSAGE = "x" * 4000
+
+
+def _fill(memory: ConversationMemory, mb: int) -> None:
+    for start in range(0, mb * 250, 1000):
+        memory.append_many([("s", "user", MESSAGE, 1000) for _ in range(start, start + 1000)])
+
+
+def _with_writer(memory: ConversationMemory, work: Callable[[], Any]) -> Dict[str, Any]:
+    latencies: List[float] = []
+    done = threading.Event()
+
+    def writer() -> None:
+        while not done.is_set():
+            start = time.perf_counter()
+            memory.append("w", "user", "hello")
+            latencies.append((time.perf_counter() - start) * 1000)
+            time.sleep(0.001)
+
+    thread = threading.Thread(target=writer)
+    thread.start()
+    start = time.perf_counter()
+    result = work()
+    elapsed = time.perf_counter() - start
+    done.set()
+    thread.join()
+    latencies.sort()
+    return {
+        "backup_ms": round(elapsed * 1000, 1),
+        "backup_bytes": Path(result).stat().st_size if result else 0,
+        "appends": len(latencies),
+        "append_p50_ms": round(statistics.median(latencies), 3),
+        "append_p99_ms": round(latencies[int(len(latencies) * 0.99)], 3),
+        "append_max_ms": round(latencies[-1], 3),
+    }
+
+
+def run(mb: int, step_pages: int = 1024) -> List[Dict[str, Any]]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "bench.sqlite3")
+        dest = str(Path(tmp) / "backups")
+        memory = ConversationMemory(path)
+        _fill(memory, mb)
+
+        def backup(mode: str, compress: bool = False) -> Callable[[], Any]:
+            return lambda: create_backup(path, dest, mode, compress, step_pages)
+
+        scenarios: Dict[str, Callable[[], Any]] = {
+            "none": lambda: time.sleep(1.0),
+            "full": backup("full"),
+            "full_gzip": backup("full", compress=True),
+        }
+        for name, work in scenarios.items():
+            results.append({"backup": name, "mb": mb, **_with_writer(memory, work)})
+        # About 1% of the store changes between the full backup and the next one.
+        _fill(memory, max(1, mb // 100))
+        row = _with_writer(memory, backup("incremental"))
+        results.append({"backup": "incremental", "mb": mb, **row})
+        memory.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--mb", type=int, default=200)
+    parser.add_argument("--step-pages", type=int, default=1024)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.mb, args.step_pages)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for row in results:
+        print(
+            f"{row['backup']:>12}  {row['backup_ms']:>9} ms  {row['backup_bytes']:>11} B  "
+            f"append p50 {row['append_p50_ms']:>7} ms  p99 {row['append_p99_ms']:>7} ms  "
+            f"max {row['append_max_ms']:>7} ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""Compression ratio and CPU cost of message compression on a chat-like corpus.
+
+    PYTHONPATH=src python benchmarks/bench_compression.py
+    PYTHONPATH=src python benchmarks/bench_compression.py --db assistant_memory.sqlite3
+
+The generated corpus mixes short user and assistant turns with tool results
+shaped like ``fetch_url_text`` output (navigation boilerplate and paragraphs,
+5-100 KB) and replies quoting them. ``--db`` samples the newest messages of a
+real store instead. Dictionaries are trained on a separate slice of the
+corpus. ``stored_ratio`` is stored bytes over raw bytes, headers included.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import time
+from typing import Any, Dict, List, Optional
+
+from assistant.compression import Compressor, train_dictionary, zstandard
+from assistant.memory import ConversationMemory
+
+WORDS = (
+    "the of and to in is that for it as with was on be by this are from at or an have not "
+    "they which one you were all we can her has there been if more when will would who so "
+    "no time could people year way use data model server request cache latency memory "
+    "session token user answer question result page error value function python query "
+    "database network file system price weather city history report update version"
+).split()
+NAV = (
+    "Home | Products | Pricing | Docs | Blog | About us | Contact | Sign in\n"
+    "Accept cookies? We use cookies to improve your experience. Privacy policy.\n"
+)
+FOOTER = "\n(c) 2024 Example Corp. All rights reserved. Terms | Privacy | Sitemap | Careers\n"
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def corpus(count: int, seed: int = 0) -> List[Dict[str, str]]:
+    rng = random.Random(seed)
+    messages: List[Dict[str, str]] = []
+    page = ""
+    while len(messages) < count:
+        kind = rng.random()
+        if kind < 0.1:
+            paragraphs = [
+                " ".join(_sentence(rng, rng.randint(8, 20)) for _ in range(rng.randint(3, 8)))
+                for _ in range(rng.randint(5, 120))
+            ]
+            page = NAV + "\n\n".join(paragraphs)[: rng.randint(5_000, 100_000)] + FOOTER
+            messages.append({"kind": "page", "text": page})
+        elif kind < 0.2 and page:
+            start = rng.randrange(len(page))
+            quote = page[start : start + rng.randint(200, 3000)]
+            messages.append({"kind": "reply", "text": f"According to the page:\n\n> {quote}\n"})
+        elif kind < 0.6:
+            text = _sentence(rng, rng.randint(4, 25))
+            messages.append({"kind": "turn", "text": text.rstrip(".") + "?"})
+        else:
+            sentences = [_sentence(rng, rng.randint(6, 18)) for _ in range(rng.randint(1, 5))]
+            text = "Sure! " + " ".join(sentences) + " Let me know if you need anything else."
+            messages.append({"kind": "turn", "text": text})
+    return messages
+
+
+def _schemes(dictionary: bytes) -> Dict[str, Compressor]:
+    schemes = {
+        "off": Compressor("off"),
+        "zlib-1": Compressor("zlib", level=1),
+        "zlib-6": Compressor("zlib", level=6),
+        "zlib-6+dict": Compressor("zlib", level=6, dictionaries=[dictionary]),
+    }
+    if zstandard is not None:
+        schemes["zstd-3"] = Compressor("zstd", level=3)
+        schemes["zstd-3+dict"] = Compressor("zstd", level=3, dictionaries=[dictionary])
+    return schemes
+
+
+def _measure(compressor: Compressor, texts: List[bytes]) -> Dict[str, float]:
+    start = time.perf_counter()
+    frames = [compressor.compress(text) for text in texts]
+    compress_s = time.perf_counter() - start
+    start = time.perf_counter()
+    for frame in frames:
+        compressor.decompress(frame)
+    decompress_s = time.perf_counter() - start
+    raw = sum(map(len, texts))
+    return {
+        "stored_ratio": round(sum(map(len, frames)) / raw, 3),
+        "compress_mb_per_s": round(raw / max(compress_s, 1e-9) / 1e6, 1),
+        "decompress_mb_per_s": round(raw / max(decompress_s, 1e-9) / 1e6, 1),
+        "compress_us_per_message": round(compress_s / len(texts) * 1e6, 1),
+    }
+
+
+def run(count: int, db: Optional[str] = None, dict_size: int = 16 * 1024) -> List[Dict[str, Any]]:
+    if db:
+        memory = ConversationMemory(db)
+        texts = memory.sample_messages(count * 2)
+        memory.close()
+        messages = [{"kind": "all", "text": text} for text in texts]
+    else:
+        messages = corpus(count * 2)
+    training, sample = messages[: len(messages) // 2], messages[len(messages) // 2 :]
+    dictionary = train_dictionary([m["text"].encode() for m in training], dict_size)
+    groups = {"all": [m["text"].encode() for m in sample]}
+    for kind in sorted({m["kind"] for m in sample} - {"all"}):
+        groups[kind] = [m["text"].encode() for m in sample if m["kind"] == kind]
+    results = []
+    for name, compressor in _schemes(dictionary).items():
+        for kind, texts in groups.items():
+            if texts:
+                row = {"scheme": name, "messages": kind, "count": len(texts)}
+                results.append({**row, **_measure(compressor, texts)})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--db", help="Sample messages from this store instead")
+    parser.add_argument("--dict-size", type=int, default=16 * 1024)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.messages, args.db, args.dict_size)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for row in results:
+        print(
+            f"{row['scheme']:>12}  {row['messages']:>6} x{row['stored_ratio']:<6} "
+            f"comp {row['compress_mb_per_s']:>8} MB/s  decomp {row['decompress_mb_per_s']:>8} MB/s"
+            f"  {row['compress_us_per_message']:>8} us/msg"
+        )
+
+
+if __name__ == "__main__":
+    main()
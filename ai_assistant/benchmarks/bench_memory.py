@@ -0,0 +1,85 @@
+"""Fetch latency of ConversationMemory as the messages table grows.
+
+    PYTHONPATH=src python benchmarks/bench_memory.py --sizes 10000 100000 1000000
+
+Rows are spread over many sessions; each size reports the latency of fetching
+the last 50 messages of one session. With the (session_id, id) index the
+numbers stay flat; ``--no-index`` drops it to show the full-scan baseline.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from assistant.memory import ConversationMemory
+
+
+def _grow(memory: ConversationMemory, start: int, stop: int, sessions: int) -> None:
+    conn = memory._conn()
+    with conn:
+        conn.executemany(
+            "INSERT INTO messages (session_id, role, content, tokens) VALUES (?, ?, ?, ?)",
+            (
+                (f"s{i % sessions}", "user", memory._encode(f"message {i}"), 4)
+                for i in range(start, stop)
+            ),
+        )
+
+
+def _time_fetch(memory: ConversationMemory, session_id: str, repeat: int) -> List[float]:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        memory.fetch(session_id, limit=50)
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+
+def run(sizes: List[int], sessions: int, repeat: int, index: bool) -> List[Dict[str, Any]]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        memory = ConversationMemory(str(Path(tmp) / "bench.sqlite3"))
+        if not index:
+            memory._conn().execute("DROP INDEX idx_messages_session_id")
+        total = 0
+        for size in sorted(sizes):
+            _grow(memory, total, size, sessions)
+            total = size
+            samples = _time_fetch(memory, "s7", repeat)
+            results.append(
+                {
+                    "rows": size,
+                    "index": index,
+                    "p50_ms": round(statistics.median(samples), 4),
+                    "p95_ms": round(sorted(samples)[int(len(samples) * 0.95) - 1], 4),
+                }
+            )
+        memory.close()
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--sessions", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--no-index", action="store_true")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.sessions, args.repeat, index=not args.no_index)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for row in results:
+        print(f"{row['rows']:>10} rows  p50 {row['p50_ms']:.3f} ms  p95 {row['p95_ms']:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+"""Per-request overhead of the middleware stack, BaseHTTPMiddleware vs pure ASGI.
+
+    PYTHONPATH=src python benchmarks/bench_middleware.py --requests 5000
+
+``legacy`` rebuilds the previous stack: request id, security headers, rate
+limit, body size and metrics as BaseHTTPMiddleware / ``@app.middleware``
+layers, with the body buffered up front. ``asgi`` is the current stack.
+Both wrap the same trivial routes, and ``bare`` has no middleware at all, so
+the difference from ``bare`` is the cost of the stack itself.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+import httpx
+from fastapi import FastAPI, Request
+from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.responses import JSONResponse, Response
+
+from assistant.logging_utils import get_request_id
+from assistant.metrics import REQUEST_COUNT, REQUEST_LATENCY
+from assistant.middleware import (
+    BodySizeLimitMiddleware,
+    MetricsMiddleware,
+    RateLimitMiddleware,
+    RequestIdMiddleware,
+    SecurityHeadersMiddleware,
+)
+from assistant.ratelimit import RateLimit, RateLimitPolicy, TokenBucketLimiter
+
+MAX_BYTES = 1_000_000
+RATE = 10**9  # never limits; only the bookkeeping is measured
+
+
+class LegacyRequestId(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        req_id = request.headers.get("X-Request-ID") or get_request_id()
+        request.state.request_id = req_id
+        response = await call_next(request)
+        response.headers["X-Request-ID"] = req_id
+        return response
+
+
+class LegacySecurityHeaders(BaseHTTPMiddleware):
+    async def dispatch(self, request: Request, call_next):
+        response = await call_next(request)
+        response.headers.setdefault("X-Content-Type-Options", "nosniff")
+        response.headers.setdefault("X-Frame-Options", "DENY")
+        response.headers.setdefault("Referrer-Policy", "no-referrer")
+        response.headers.setdefault("X-XSS-Protection", "0")
+        return response
+
+
+class LegacyRateLimit(BaseHTTPMiddleware):
+    def __init__(self, app):
+        super().__init__(app)
+        self.policy = RateLimitPolicy(RateLimit(RATE, 60))
+        self.limiter = TokenBucketLimiter()
+
+    async def dispatch(self, request: Request, call_next):
+        client_ip = request.client.host if request.client else "unknown"
+        checks = self.policy.checks(client_ip, request.headers.get("X-API-Key"), request.url.path)
+        decision = self.limiter.acquire(checks)
+        if not decision.allowed:
+            return JSONResponse({"detail": "rate limit exceeded"}, status_code=429)
+        response = await call_next(request)
+        response.headers.update(decision.headers())
+        return response
+
+
+def _routes(app: FastAPI) -> FastAPI:
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        return {"size": len(await request.body())}
+
+    return app
+
+
+def bare_app() -> FastAPI:
+    return _routes(FastAPI())
+
+
+def legacy_app() -> FastAPI:
+    app = _routes(FastAPI())
+    app.add_middleware(LegacyRequestId)
+    app.add_middleware(LegacySecurityHeaders)
+    app.add_middleware(LegacyRateLimit)
+
+    @app.middleware("http")
+    async def enforce_body_size(request: Request, call_next):
+        if request.method in {"POST", "PUT", "PATCH"}:
+            body = await request.body()
+            if len(body) > MAX_BYTES:
+                return Response("request too large", status_code=413)
+            request._body = body  # type: ignore[attr-defined]
+        return await call_next(request)
+
+    @app.middleware("http")
+    async def metrics_middleware(request: Request, call_next):
+        path = request.url.path
+        method = request.method
+        with REQUEST_LATENCY.labels(path=path, method=method).time():
+            response = await call_next(request)
+        REQUEST_COUNT.labels(path=path, method=method, status=str(response.status_code)).inc()
+        return response
+
+    return app
+
+
+def asgi_app() -> FastAPI:
+    app = _routes(FastAPI())
+    app.add_middleware(RequestIdMiddleware)
+    app.add_middleware(SecurityHeadersMiddleware)
+    app.add_middleware(RateLimitMiddleware, rate=RATE, per_seconds=60)
+    app.add_middleware(BodySizeLimitMiddleware, max_bytes=MAX_BYTES)
+    app.add_middleware(MetricsMiddleware, routes=app.routes)
+    return app
+
+
+async def _per_request_us(app: FastAPI, method: str, body: bytes, requests: int) -> float:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        path = "/echo" if method == "POST" else "/ping"
+        for _ in range(min(200, requests)):  # warm up
+            await client.request(method, path, content=body or None)
+        start = time.perf_counter()
+        for _ in range(requests):
+            await client.request(method, path, content=body or None)
+        return (time.perf_counter() - start) / requests * 1e6
+
+
+def run(requests: int, body_bytes: int) -> List[Dict[str, Any]]:
+    results = []
+    body = b"x" * body_bytes
+    for name, factory in (("bare", bare_app), ("legacy", legacy_app), ("asgi", asgi_app)):
+        for method, payload in (("GET", b""), ("POST", body)):
+            us = asyncio.run(_per_request_us(factory(), method, payload, requests))
+            results.append({"stack": name, "method": method, "us_per_request": round(us, 1)})
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--body-bytes", type=int, default=4096)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.requests, args.body_bytes)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for row in results:
+        print(f"{row['stack']:>7}  {row['method']:<4}  {row['us_per_request']:>8} us/req")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""Per-request cost and memory of the token-bucket limiter vs the old timestamp lists.
+
+    PYTHONPATH=src python benchmarks/bench_rate_limit.py --rates 60 1000 --keys 100000
+
+``legacy`` is the previous RateLimitMiddleware algorithm: a list of request
+timestamps per client IP, filtered on every request and never evicted.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from assistant.ratelimit import RateLimit, TokenBucketLimiter
+
+
+class LegacyLimiter:
+    def __init__(self, rate: int, per_seconds: float) -> None:
+        self.rate = rate
+        self.per = per_seconds
+        self.bucket: Dict[str, List[float]] = {}
+
+    def allow(self, key: str, now: float) -> bool:
+        window_start = now - self.per
+        timestamps = [t for t in self.bucket.get(key, []) if t >= window_start]
+        if len(timestamps) >= self.rate:
+            return False
+        timestamps.append(now)
+        self.bucket[key] = timestamps
+        return True
+
+
+class BucketLimiter:
+    def __init__(self, rate: int, per_seconds: float) -> None:
+        self.limit = RateLimit(rate, per_seconds)
+        self.limiter = TokenBucketLimiter()
+
+    def allow(self, key: str, now: float) -> bool:
+        return self.limiter.acquire(((key, self.limit),), now).allowed
+
+
+def _per_request_ns(limiter: Any, rate: int, requests: int) -> float:
+    # One client sending just under its limit: the legacy list stays ~rate long.
+    step = 60.0 / rate
+    start = time.perf_counter_ns()
+    for i in range(requests):
+        limiter.allow("ip:client", i * step)
+    return (time.perf_counter_ns() - start) / requests
+
+
+def _memory_bytes(limiter: Any, keys: int) -> int:
+    tracemalloc.start()
+    for i in range(keys):
+        limiter.allow(f"ip:{i}", float(i) / 1000)
+    # Everyone went quiet long ago; only the bucket limiter forgets them.
+    limiter.allow("ip:late", 10_000.0)
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size
+
+
+def run(rates: List[int], keys: int, requests: int) -> List[Dict[str, Any]]:
+    results = []
+    for name, cls in (("legacy", LegacyLimiter), ("token_bucket", BucketLimiter)):
+        for rate in rates:
+            results.append(
+                {
+                    "limiter": name,
+                    "rate": rate,
+                    "ns_per_request": round(_per_request_ns(cls(rate, 60), rate, requests)),
+                }
+            )
+        results.append(
+            {
+                "limiter": name,
+                "keys": keys,
+                "retained_bytes": _memory_bytes(cls(60, 60), keys),
+            }
+        )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rates", type=int, nargs="+", default=[60, 1000])
+    parser.add_argument("--keys", type=int, default=100_000, help="Distinct clients for memory")
+    parser.add_argument("--requests", type=int, default=50_000)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.rates, args.keys, args.requests)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for row in results:
+        if "rate" in row:
+            print(
+                f"{row['limiter']:>12}  rate {row['rate']:>5}/60s  "
+                f"{row['ns_per_request']:>8} ns/req"
+            )
+        else:
+            print(
+                f"{row['limiter']:>12}  {row['keys']:>7} idle keys  {row['retained_bytes']:>10} B"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,364 @@
+"""End-to-end load and latency of /chat, /chat/stream and /ws.
+
+    PYTHONPATH=src python benchmarks/bench_server.py --concurrency 1 16 64 --output server.json
+    PYTHONPATH=src python benchmarks/bench_server.py --ttft-ms 300 --token-ms 20 --rate 50
+    PYTHONPATH=src python benchmarks/bench_server.py --server subprocess --workers 4
+    PYTHONPATH=src python benchmarks/bench_server.py --cassette calls.jsonl --replay-speed 2
+
+``--server thread`` (default) runs uvicorn in a thread of this process, so the
+provider can be swapped for a simulated one (``--ttft-ms``/``--token-ms``) instead
+of ``LocalEchoProvider``. Load generator and server then share the GIL;
+``--server subprocess`` runs ``uvicorn assistant.server:app`` separately, with the
+provider the environment configures, and ``--url`` targets a running server.
+``--cassette`` replays recorded provider calls (see ``PROVIDER_RECORD``) from a
+local stand-in speaking the ``--upstream`` API, so the real OpenAI or Ollama
+client code runs with production-like timing.
+
+Workers are closed-loop (each sends its next request when the last one is
+done) unless ``--rate`` is given. Then requests are scheduled at that rate
+and latency counts from the scheduled start, so a stalled server is not
+hidden by requests that were never sent. TTFT is the time to the first
+content event or frame; for /chat it equals latency.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+
+SCENARIOS = ("chat", "stream", "ws")
+
+
+class SimulatedProvider:
+    """Configurable latency: ``ttft`` before the first token, ``token_interval`` after each."""
+
+    name = "simulated"
+    model = "simulated"
+
+    def __init__(self, ttft: float, token_interval: float, tokens: int = 20) -> None:
+        self.ttft = ttft
+        self.token_interval = token_interval
+        self.tokens = tokens
+
+    def _usage(self, messages: List[Dict[str, Any]]) -> Dict[str, int]:
+        return {"prompt_tokens": 10 * len(messages), "completion_tokens": self.tokens}
+
+    async def generate(self, messages, tools=None, tool_choice=None, temperature=0.2, timeout=None):
+        await asyncio.sleep(self.ttft + self.tokens * self.token_interval)
+        content = "".join(f"token{i} " for i in range(self.tokens))
+        return {"content": content, "tool_calls": None, "usage": self._usage(messages)}
+
+    async def stream(self, messages, tools=None, tool_choice=None, temperature=0.2, timeout=None):
+        await asyncio.sleep(self.ttft)
+        for i in range(self.tokens):
+            yield {"content": f"token{i} ", "tool_calls": None}
+            await asyncio.sleep(self.token_interval)
+        yield {"content": "", "tool_calls": None, "usage": self._usage(messages)}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _server_env(db_dir: str) -> Dict[str, str]:
+    return {
+        "ASSISTANT_DB_PATH": os.path.join(db_dir, "bench.sqlite3"),
+        "RATE_LIMIT": "1000000000/60",  # measure the server, not the limiter
+        "API_KEYS": "",
+        "LOG_LEVEL": "WARNING",
+    }
+
+
+@contextmanager
+def _serve(app: Any) -> Iterator[str]:
+    import uvicorn
+
+    port = _free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+@contextmanager
+def thread_server(provider: Optional[SimulatedProvider]) -> Iterator[str]:
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.update(_server_env(tmp))
+        from assistant.server import app
+
+        with _serve(app) as url:
+            if provider is not None:
+                app.state.registry.provider = provider
+            yield url
+
+
+@contextmanager
+def standin(cassette: str, upstream: str, speed: float) -> Iterator[None]:
+    """Replay ``cassette`` from a local OpenAI/Ollama stand-in the server talks to."""
+    from assistant.cassette import Cassette, ReplayProvider
+    from assistant.standin import create_app
+
+    with _serve(create_app(ReplayProvider(Cassette(cassette), speed=speed))) as url:
+        if upstream == "openai":
+            os.environ.update({"OPENAI_API_KEY": "stand-in", "OPENAI_BASE_URL": f"{url}/v1"})
+        else:
+            os.environ.pop("OPENAI_API_KEY", None)
+            os.environ["OLLAMA_HOST"] = url
+        yield
+
+
+@contextmanager
+def subprocess_server(workers: int) -> Iterator[str]:
+    with tempfile.TemporaryDirectory() as tmp:
+        port = _free_port()
+        env = {**os.environ, **_server_env(tmp)}
+        env["PYTHONPATH"] = os.pathsep.join(filter(None, ["src", env.get("PYTHONPATH")]))
+        command = [sys.executable, "-m", "uvicorn", "assistant.server:app", "--port", str(port)]
+        command += ["--workers", str(workers), "--log-level", "warning", "--no-access-log"]
+        process = subprocess.Popen(command, env=env)
+        url = f"http://127.0.0.1:{port}"
+        try:
+            deadline = time.monotonic() + 30
+            while True:
+                try:
+                    if httpx.get(f"{url}/health").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    if time.monotonic() > deadline or process.poll() is not None:
+                        raise RuntimeError("server did not start")
+                    time.sleep(0.1)
+            yield url
+        finally:
+            process.terminate()
+            process.wait()
+
+
+async def _chat(client: httpx.AsyncClient, session: str, started: float) -> float:
+    response = await client.post("/chat", json={"session_id": session, "message": "hello"})
+    response.raise_for_status()
+    return time.perf_counter() - started
+
+
+async def _stream(client: httpx.AsyncClient, session: str, started: float) -> float:
+    first = None
+    body = {"session_id": session, "message": "hello"}
+    async with client.stream("POST", "/chat/stream", json=body) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if first is None and line.startswith("data: ") and line != "data: [DONE]":
+                first = time.perf_counter() - started
+    return first if first is not None else time.perf_counter() - started
+
+
+class _Socket:
+    """One websocket per worker, as a browser tab would keep."""
+
+    def __init__(self, url: str) -> None:
+        self.url = url.replace("http", "ws", 1) + "/ws"
+        self.connection: Any = None
+
+    async def turn(self, started: float) -> float:
+        import websockets
+
+        if self.connection is None:
+            self.connection = await websockets.connect(self.url)
+        await self.connection.send(json.dumps({"message": "hello", "stream": True}))
+        first = None
+        while True:
+            frame = json.loads(await self.connection.recv())
+            if first is None and "delta" in frame:
+                first = time.perf_counter() - started
+            if frame.get("done"):
+                return first if first is not None else time.perf_counter() - started
+
+    async def close(self) -> None:
+        if self.connection is not None:
+            await self.connection.close()
+
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * len(ordered) + 0.5)) - 1)]
+
+
+def _summary(samples: List[float]) -> Dict[str, float]:
+    if not samples:
+        return {}
+    return {
+        "p50_ms": round(statistics.median(samples) * 1000, 2),
+        "p95_ms": round(_percentile(samples, 95) * 1000, 2),
+        "p99_ms": round(_percentile(samples, 99) * 1000, 2),
+        "max_ms": round(max(samples) * 1000, 2),
+    }
+
+
+async def _load(
+    url: str, scenario: str, concurrency: int, requests: int, rate: Optional[float]
+) -> Dict[str, Any]:
+    latencies: List[float] = []
+    ttfts: List[float] = []
+    errors = 0
+    issued = 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        begin = time.perf_counter()
+
+        async def worker(index: int) -> None:
+            nonlocal issued, errors
+            session = f"bench-{scenario}-{index}"
+            socket_ = _Socket(url) if scenario == "ws" else None
+            try:
+                while issued < requests:
+                    number = issued
+                    issued += 1
+                    started = time.perf_counter()
+                    if rate:
+                        started = begin + number / rate
+                        await asyncio.sleep(max(0.0, started - time.perf_counter()))
+                    try:
+                        if scenario == "chat":
+                            ttft = await _chat(client, session, started)
+                        elif scenario == "stream":
+                            ttft = await _stream(client, session, started)
+                        else:
+                            ttft = await socket_.turn(started)  # type: ignore[union-attr]
+                    except Exception:
+                        errors += 1
+                        continue
+                    latencies.append(time.perf_counter() - started)
+                    ttfts.append(ttft)
+            finally:
+                if socket_ is not None:
+                    await socket_.close()
+
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        elapsed = time.perf_counter() - begin
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "rate": rate,
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "latency": _summary(latencies),
+        "ttft": _summary(ttfts),
+    }
+
+
+def run(
+    url: str,
+    scenarios: List[str],
+    concurrency: List[int],
+    requests: int,
+    rate: Optional[float] = None,
+    warmup: int = 20,
+) -> List[Dict[str, Any]]:
+    results = []
+    for scenario in scenarios:
+        asyncio.run(_load(url, scenario, 1, warmup, None))
+        for level in concurrency:
+            results.append(asyncio.run(_load(url, scenario, level, requests, rate)))
+    return results
+
+
+def metadata(args: argparse.Namespace) -> Dict[str, Any]:
+    try:
+        revision = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    return {
+        "benchmark": "server",
+        "revision": revision,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "args": vars(args),
+    }
+
+
+@contextmanager
+def _target(args: argparse.Namespace) -> Iterator[str]:
+    if args.cassette and not args.url:
+        with standin(args.cassette, args.upstream, args.replay_speed):
+            args.cassette = None
+            with _target(args) as url:
+                yield url
+    elif args.url:
+        yield args.url.rstrip("/")
+    elif args.server == "subprocess":
+        with subprocess_server(args.workers) as url:
+            yield url
+    else:
+        provider = None
+        if args.ttft_ms is not None or args.token_ms is not None:
+            provider = SimulatedProvider(
+                (args.ttft_ms or 0) / 1000, (args.token_ms or 0) / 1000, args.tokens
+            )
+        with thread_server(provider) as url:
+            yield url
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--server", choices=["thread", "subprocess"], default="thread")
+    parser.add_argument("--url", help="Benchmark an already running server instead")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers (subprocess)")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--requests", type=int, default=500, help="Per scenario and level")
+    parser.add_argument("--rate", type=float, help="Requests per second (open loop)")
+    parser.add_argument("--ttft-ms", type=float, help="Simulated provider time to first token")
+    parser.add_argument("--token-ms", type=float, help="Simulated provider time per token")
+    parser.add_argument("--tokens", type=int, default=20, help="Simulated reply length")
+    parser.add_argument("--cassette", help="Replay recorded provider calls from a stand-in")
+    parser.add_argument("--upstream", choices=["openai", "ollama"], default="openai")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="0 replays without waits")
+    parser.add_argument("--output", help="Write results and run metadata as JSON")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    with _target(args) as url:
+        results = run(url, args.scenarios, args.concurrency, args.requests, args.rate)
+    report = {"meta": metadata(args), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for row in results:
+        latency, ttft = row["latency"], row["ttft"]
+        print(
+            f"{row['scenario']:>6}  c={row['concurrency']:<4} {row['rps']:>8} rps  "
+            f"p50 {latency.get('p50_ms')} p95 {latency.get('p95_ms')} "
+            f"p99 {latency.get('p99_ms')} ms  ttft p50 {ttft.get('p50_ms')} ms  "
+            f"errors {row['errors']}"
+        )
+
+
+if __name__ == "__main__":
+    main()
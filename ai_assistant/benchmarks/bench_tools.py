@@ -0,0 +1,104 @@
+"""Tool registry and ToolRunner overhead per call.
+
+    PYTHONPATH=src python benchmarks/bench_tools.py --calls 20000
+
+``parse`` validates a call's arguments against its compiled schema,
+``schemas`` builds the OpenAI tool list sent with every model request, and
+``run_sync`` / ``run_async`` go through ``ToolRunner.run`` (thread pool or event
+loop, timeout, metrics and span) with a tool that does nothing, so the time is
+the runner's own.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from typing import Any, Dict, List
+
+from assistant.tools import REGISTRY, ToolRegistry, ToolRunner
+
+SCHEMA = {
+    "type": "object",
+    "properties": {
+        "a": {"type": "number"},
+        "b": {"type": "number"},
+        "unit": {"type": "string", "enum": ["m", "s"]},
+    },
+    "required": ["a", "b"],
+    "additionalProperties": False,
+}
+ARGUMENTS = json.dumps({"a": 1, "b": 2.5, "unit": "m"})
+
+
+def _registry() -> ToolRegistry:
+    registry = ToolRegistry()
+    registry.register("noop_sync", lambda args: args["a"], SCHEMA)
+
+    async def noop_async(args: Dict[str, Any]) -> Any:
+        return args["a"]
+
+    registry.register("noop_async", noop_async, SCHEMA)
+    return registry
+
+
+def _us_per_call(func, calls: int) -> float:
+    for _ in range(min(200, calls)):
+        func()
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+async def _runner_us(runner: ToolRunner, name: str, calls: int, batch: int) -> float:
+    tool_calls = [{"name": name, "arguments": ARGUMENTS}] * batch
+    for _ in range(min(50, calls)):
+        await runner.run(tool_calls)
+    start = time.perf_counter()
+    for _ in range(calls // batch):
+        await runner.run(tool_calls)
+    return (time.perf_counter() - start) / (calls // batch * batch) * 1e6
+
+
+def run(calls: int, batch: int) -> List[Dict[str, Any]]:
+    registry = _registry()
+    spec = registry.get("noop_sync")
+    assert spec is not None
+    results = [
+        {
+            "op": "parse",
+            "us_per_call": _us_per_call(lambda: spec.parse_arguments(ARGUMENTS), calls),
+        },
+        {"op": "schemas", "us_per_call": _us_per_call(REGISTRY.openai_schemas, calls)},
+    ]
+    runner = ToolRunner(registry=registry)
+    try:
+        for op, name in (("run_sync", "noop_sync"), ("run_async", "noop_async")):
+            us = asyncio.run(_runner_us(runner, name, calls, batch))
+            results.append({"op": op, "batch": batch, "us_per_call": us})
+    finally:
+        runner.close()
+    for row in results:
+        row["us_per_call"] = round(row["us_per_call"], 2)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=20_000)
+    parser.add_argument("--batch", type=int, default=1, help="Tool calls per model turn")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.calls, args.batch)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for row in results:
+        print(f"{row['op']:>10}  {row['us_per_call']:>8} us/call")
+
+
+if __name__ == "__main__":
+    main()
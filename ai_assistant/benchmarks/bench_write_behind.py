@@ -0,0 +1,79 @@
+"""Chat-turn throughput of direct vs write-behind memory appends.
+
+    PYTHONPATH=src python benchmarks/bench_write_behind.py --sessions 1 10 100
+
+Each simulated session runs the engine's memory pattern per turn (append the
+user message, fetch history, append the reply) as its own asyncio task.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from assistant.memory import ConversationMemory
+from assistant.memory_writer import WriteBehindMemory
+
+
+async def _session(store: Any, session_id: str, turns: int) -> None:
+    for turn in range(turns):
+        await store.aappend(session_id, "user", f"question {turn}")
+        await store.afetch(session_id)
+        await store.aappend(session_id, "assistant", f"answer {turn}")
+        # Yield as a provider call would, so sessions interleave.
+        await asyncio.sleep(0)
+
+
+async def _measure(store: Any, sessions: int, turns: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*(_session(store, f"s{i}", turns) for i in range(sessions)))
+    if isinstance(store, WriteBehindMemory):
+        await store.aflush()
+    return time.perf_counter() - start
+
+
+def run(session_counts: List[int], turns: int) -> List[Dict[str, Any]]:
+    results = []
+    for sessions in session_counts:
+        for mode in ("direct", "write_behind"):
+            with tempfile.TemporaryDirectory() as tmp:
+                memory = ConversationMemory(str(Path(tmp) / "bench.sqlite3"))
+                store: Any = memory if mode == "direct" else WriteBehindMemory(memory)
+                elapsed = asyncio.run(_measure(store, sessions, turns))
+                if isinstance(store, WriteBehindMemory):
+                    store.close()
+                memory.close()
+            total = sessions * turns
+            results.append(
+                {
+                    "mode": mode,
+                    "sessions": sessions,
+                    "turns": total,
+                    "turns_per_s": round(total / elapsed, 1),
+                }
+            )
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 10, 100])
+    parser.add_argument("--turns", type=int, default=200, help="Turns per session")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = run(args.sessions, args.turns)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for row in results:
+        print(f"{row['mode']:>12}  {row['sessions']:>4} sessions  {row['turns_per_s']:>10} turns/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""Run every benchmark with small settings and write one comparable JSON report.
+
+    PYTHONPATH=src python benchmarks/suite.py --output base.json
+    PYTHONPATH=src python benchmarks/suite.py --output head.json --compare base.json
+
+Each benchmark's rows are stored under its name, with run metadata. With
+``--compare`` every timing or throughput in a row is printed next to the
+baseline's value for the row with the same parameters, and the relative change
+is shown as better or worse. Numbers from different machines do not compare.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import bench_backup
+import bench_compression
+import bench_encryption
+import bench_memory
+import bench_middleware
+import bench_rate_limit
+import bench_server
+import bench_tools
+import bench_write_behind
+
+SUITE: Dict[str, Callable[[], List[Dict[str, Any]]]] = {
+    "backup": lambda: bench_backup.run(20),
+    "compression": lambda: bench_compression.run(500),
+    "encryption": lambda: bench_encryption.run([200, 2000], 500, 50),
+    "memory": lambda: bench_memory.run([10_000, 100_000], 1000, 200, True),
+    "middleware": lambda: bench_middleware.run(2000, 4096),
+    "rate_limit": lambda: bench_rate_limit.run([60, 1000], 10_000, 20_000),
+    "tools": lambda: bench_tools.run(5000, 1),
+    "write_behind": lambda: bench_write_behind.run([1, 10], 100),
+}
+
+# Results in a row, as opposed to the parameters identifying it.
+HIGHER_IS_BETTER = ("rps", "_per_s")
+LOWER_IS_BETTER = ("_ms", "_us", "us_per_", "ns_per_", "_bytes", "_ratio")
+COUNTS = {"requests", "errors"}
+
+
+def _server(concurrency: List[int], requests: int) -> List[Dict[str, Any]]:
+    with bench_server.thread_server(None) as url:
+        return bench_server.run(url, list(bench_server.SCENARIOS), concurrency, requests)
+
+
+def _flatten(row: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    flat: Dict[str, Any] = {}
+    for key, value in row.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{prefix}{key}."))
+        else:
+            flat[prefix + key] = value
+    return flat
+
+
+def _direction(key: str) -> Optional[int]:
+    name = key.rsplit(".", 1)[-1]
+    if any(part in name for part in HIGHER_IS_BETTER):
+        return 1
+    if any(part in name for part in LOWER_IS_BETTER):
+        return -1
+    return None
+
+
+def _identity(row: Dict[str, Any]) -> Tuple:
+    return tuple(
+        sorted(
+            (key, value)
+            for key, value in row.items()
+            if _direction(key) is None and key not in COUNTS
+        )
+    )
+
+
+def compare(
+    head: Dict[str, Any], base: Dict[str, Any]
+) -> Iterator[Tuple[str, str, str, Any, Any, float]]:
+    """``(benchmark, params, metric, base, head, change)`` for metrics in both reports.
+
+    ``change`` is positive when head is better.
+    """
+    for name, rows in head["results"].items():
+        baseline = {_identity(flat): flat for flat in map(_flatten, base["results"].get(name, []))}
+        for flat in map(_flatten, rows):
+            identity = _identity(flat)
+            old = baseline.get(identity)
+            if old is None:
+                continue
+            params = " ".join(f"{key}={value}" for key, value in identity)
+            for key, value in flat.items():
+                direction = _direction(key)
+                if direction is None or not old.get(key) or value is None:
+                    continue
+                change = (value - old[key]) / old[key] * direction
+                yield name, params, key, old[key], value, change
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--only", nargs="+", choices=[*SUITE, "server"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 16])
+    parser.add_argument("--requests", type=int, default=200, help="Server requests per level")
+    parser.add_argument("--output", help="Write the report as JSON")
+    parser.add_argument("--compare", help="Baseline report to compare against")
+    args = parser.parse_args()
+
+    benchmarks = {**SUITE, "server": lambda: _server(args.concurrency, args.requests)}
+    results = {}
+    for name in args.only or benchmarks:
+        print(f"running {name}", file=sys.stderr)
+        results[name] = benchmarks[name]()
+    meta = bench_server.metadata(args)
+    meta["benchmark"] = "suite"
+    report = {"meta": meta, "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if not args.compare:
+        print(json.dumps(report, indent=2))
+        return
+    with open(args.compare, encoding="utf-8") as f:
+        base = json.load(f)
+    for name, params, key, old, new, change in compare(report, base):
+        verdict = "better" if change > 0 else "worse"
+        print(f"{name:>12}  {params:<40} {key:<16} {old:>10} -> {new:<10} {change:+.1%} {verdict}")
+
+
+if __name__ == "__main__":
+    main()
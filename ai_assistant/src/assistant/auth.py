@@ -1,16 +1,32 @@
 from __future__ import annotations
 
+import hmac
 from typing import Optional
 from fastapi import Header, HTTPException, status
 
-from .config import load_settings
+from .config import get_settings, hash_api_key
 
 
 def api_key_auth(x_api_key: Optional[str] = Header(default=None)) -> None:
-    settings = load_settings()
-    allowed = settings.api_keys or []
+    allowed = get_settings().api_key_digests
     if not allowed:
         return
-    if x_api_key in allowed:
-        return
-    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid api key")
\ No newline at end of file
+    # A dict lookup finds the one candidate, then the full digest is compared
+    # in constant time. Neither step's timing reveals anything about the keys.
+    if x_api_key:
+        digest = hash_api_key(x_api_key)
+        candidate = allowed.get(digest[:8])
+        if candidate is not None and hmac.compare_digest(candidate, digest):
+            return
+    raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="invalid api key")
+
+
+def history_auth(x_api_key: Optional[str] = Header(default=None)) -> None:
+    # Reading history back is refused on open servers unless explicitly enabled.
+    settings = get_settings()
+    if not settings.api_key_digests and not settings.export_enabled:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="history export needs API_KEYS or EXPORT_ENABLED",
+        )
+    api_key_auth(x_api_key)
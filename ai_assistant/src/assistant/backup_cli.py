@@ -1,27 +1,158 @@
 from __future__ import annotations
 
 import argparse
-import shutil
-from datetime import datetime
+import dataclasses
+import gzip
+import json
+import sys
+from contextlib import contextmanager
 from pathlib import Path
+from typing import IO, Dict, Iterator, List, Optional
 
+from .backups import MODES, create_backup, restore_backup, verify_backup
 from .config import load_settings
+from .compression import train_dictionary
+from .memory import ConversationMemory, mark_restored
+from .registry import build_compressor
+from .retention import run_retention
 
 
-def backup(dest_dir: str) -> str:
+def backup(
+    dest_dir: str,
+    mode: str = "full",
+    compress: bool = False,
+    step_pages: int = 1024,
+    pause: float = 0.0,
+    verify: bool = True,
+) -> str:
+    """Back the live store up without locking writers out; see ``backups.create_backup``."""
     settings = load_settings()
-    src = Path(settings.assistant_db_path)
-    Path(dest_dir).mkdir(parents=True, exist_ok=True)
-    ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
-    dest = Path(dest_dir) / f"assistant_memory_{ts}.sqlite3"
-    shutil.copy2(src, dest)
-    return str(dest)
+    path = create_backup(
+        settings.assistant_db_path, dest_dir, mode, compress, step_pages, pause, verify
+    )
+    return str(path)
 
 
 def restore(src_file: str) -> None:
     settings = load_settings()
-    dest = Path(settings.assistant_db_path)
-    shutil.copy2(Path(src_file), dest)
+    restore_backup(Path(src_file), settings.assistant_db_path)
+    # Running servers drop cached history and reconnect on their next read.
+    mark_restored(settings.assistant_db_path)
+
+
+def verify(src_file: str) -> List[str]:
+    return verify_backup(Path(src_file))
+
+
+def reencrypt(batch_size: int = 500) -> int:
+    """Rewrite every row still under an old key, as Fernet or as plaintext."""
+    settings = load_settings()
+    memory = ConversationMemory(settings.assistant_db_path, compressor=build_compressor(settings))
+    try:
+        return memory.reencrypt(batch_size=batch_size)
+    finally:
+        memory.close()
+
+
+@contextmanager
+def _ndjson_file(path: str, mode: str) -> Iterator[IO[str]]:
+    if path == "-":
+        yield sys.stdout if mode == "w" else sys.stdin
+    elif path.endswith(".gz"):
+        with gzip.open(path, mode + "t", encoding="utf-8") as f:
+            yield f  # type: ignore[misc]
+    else:
+        with open(path, mode, encoding="utf-8") as f:
+            yield f
+
+
+def export(
+    dest: str, session_id: Optional[str] = None, after: int = 0, batch_size: int = 500
+) -> int:
+    """Write messages as NDJSON (gzipped for ``*.gz``, stdout for ``-``) in id order."""
+    settings = load_settings()
+    memory = ConversationMemory(settings.assistant_db_path, compressor=build_compressor(settings))
+    count = 0
+    try:
+        with _ndjson_file(dest, "w") as out:
+            for batch in memory.iter_message_batches(session_id, after, batch_size):
+                out.write("".join(json.dumps(m, ensure_ascii=False) + "\n" for m in batch))
+                count += len(batch)
+    finally:
+        memory.close()
+    return count
+
+
+def import_messages(src: str, batch_size: int = 500) -> int:
+    """Append messages from an export, ``batch_size`` rows per transaction.
+
+    Messages get new ids and the current time as ``created_at``: retention
+    relies on ids growing with time.
+    """
+    settings = load_settings()
+    memory = ConversationMemory(settings.assistant_db_path, compressor=build_compressor(settings))
+    count = 0
+    try:
+        with _ndjson_file(src, "r") as f:
+            batch = []
+            for line in f:
+                if not line.strip():
+                    continue
+                m = json.loads(line)
+                batch.append((m["session_id"], m["role"], m["content"], m.get("tokens")))
+                if len(batch) >= batch_size:
+                    count += len(memory.append_many(batch))
+                    batch = []
+            if batch:
+                count += len(memory.append_many(batch))
+    finally:
+        memory.close()
+    # Running servers reload cached history of the sessions written to.
+    mark_restored(settings.assistant_db_path)
+    return count
+
+
+def train(dest: str, samples: int = 5000, size: int = 16 * 1024) -> int:
+    """Write a compression dictionary built from the newest ``samples`` messages."""
+    settings = load_settings()
+    memory = ConversationMemory(settings.assistant_db_path, compressor=build_compressor(settings))
+    try:
+        texts = memory.sample_messages(samples)
+    finally:
+        memory.close()
+    dictionary = train_dictionary([text.encode("utf-8") for text in texts if text], size)
+    Path(dest).write_bytes(dictionary)
+    return len(dictionary)
+
+
+def prune(
+    session_ttl_days: Optional[float] = None,
+    message_ttl_days: Optional[float] = None,
+    max_messages: Optional[int] = None,
+    archive_dir: Optional[str] = None,
+    vacuum: bool = False,
+) -> Dict[str, int]:
+    """Apply the retention settings, or the limits given here instead, once."""
+    settings = load_settings()
+    overrides = {
+        "memory_session_ttl_days": session_ttl_days,
+        "memory_message_ttl_days": message_ttl_days,
+        "memory_max_messages": max_messages,
+        "memory_archive_dir": archive_dir,
+    }
+    settings = dataclasses.replace(
+        settings, **{name: value for name, value in overrides.items() if value is not None}
+    )
+    memory = ConversationMemory(settings.assistant_db_path, compressor=build_compressor(settings))
+    try:
+        counts = run_retention(memory, settings)
+        if vacuum:
+            counts["reclaimed_bytes"] += memory.enable_incremental_vacuum()
+    finally:
+        memory.close()
+    # Running servers drop cached history of the deleted sessions on their next read.
+    mark_restored(settings.assistant_db_path)
+    return counts
 
 
 def main() -> None:
@@ -30,17 +161,82 @@ def main() -> None:
 
     p_b = sub.add_parser("backup")
     p_b.add_argument("dest_dir")
+    p_b.add_argument("--mode", choices=MODES, default="full")
+    p_b.add_argument("--compress", action="store_true", help="gzip the backup")
+    p_b.add_argument("--step-pages", type=int, default=1024, help="Pages copied per step")
+    p_b.add_argument("--pause-ms", type=float, default=0.0, help="Sleep between steps")
+    p_b.add_argument("--no-verify", action="store_true", help="Skip the integrity check")
 
     p_r = sub.add_parser("restore")
     p_r.add_argument("src_file")
 
+    p_v = sub.add_parser("verify", help="Rebuild a backup and integrity-check it")
+    p_v.add_argument("src_file")
+
+    p_e = sub.add_parser("reencrypt", help="Move stored rows to the active encryption key")
+    p_e.add_argument("--batch-size", type=int, default=500)
+
+    p_p = sub.add_parser("prune", help="Delete history past the retention limits")
+    p_p.add_argument("--session-ttl-days", type=float, help="Delete sessions idle this long")
+    p_p.add_argument("--message-ttl-days", type=float, help="Delete messages older than this")
+    p_p.add_argument("--max-messages", type=int, help="Keep at most this many per session")
+    p_p.add_argument("--archive-dir", help="Archive deleted sessions here as NDJSON.gz")
+    p_p.add_argument("--vacuum", action="store_true", help="Also rewrite the file to shrink it")
+
+    p_x = sub.add_parser("export", help="Write messages as NDJSON (.gz to compress, - for stdout)")
+    p_x.add_argument("dest")
+    p_x.add_argument("--session", help="Only this session")
+    p_x.add_argument("--after", type=int, default=0, help="Only messages after this id")
+    p_x.add_argument("--batch-size", type=int, default=500)
+
+    p_i = sub.add_parser("import", help="Append messages from an NDJSON export")
+    p_i.add_argument("src")
+    p_i.add_argument("--batch-size", type=int, default=500)
+
+    p_t = sub.add_parser("train-dictionary", help="Build a MEMORY_COMPRESSION_DICTS file")
+    p_t.add_argument("dest")
+    p_t.add_argument("--samples", type=int, default=5000)
+    p_t.add_argument("--size", type=int, default=16 * 1024)
+
     args = parser.parse_args()
     if args.cmd == "backup":
-        path = backup(args.dest_dir)
+        path = backup(
+            args.dest_dir,
+            args.mode,
+            args.compress,
+            args.step_pages,
+            args.pause_ms / 1000,
+            not args.no_verify,
+        )
         print(path)
     elif args.cmd == "restore":
         restore(args.src_file)
         print("OK")
+    elif args.cmd == "verify":
+        problems = verify(args.src_file)
+        for problem in problems:
+            print(problem)
+        print("FAILED" if problems else "OK")
+        if problems:
+            sys.exit(1)
+    elif args.cmd == "reencrypt":
+        print(f"{reencrypt(args.batch_size)} rows re-encrypted")
+    elif args.cmd == "prune":
+        counts = prune(
+            args.session_ttl_days,
+            args.message_ttl_days,
+            args.max_messages,
+            args.archive_dir,
+            args.vacuum,
+        )
+        print(" ".join(f"{name}={count}" for name, count in counts.items()))
+    elif args.cmd == "export":
+        count = export(args.dest, args.session, args.after, args.batch_size)
+        print(f"{count} messages exported", file=sys.stderr)
+    elif args.cmd == "import":
+        print(f"{import_messages(args.src, args.batch_size)} messages imported")
+    elif args.cmd == "train-dictionary":
+        print(f"{train(args.dest, args.samples, args.size)} bytes written to {args.dest}")
 
 
 if __name__ == "__main__":
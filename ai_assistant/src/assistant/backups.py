@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import struct
+import time
+import zlib
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import IO, Any, Callable, Dict, List, Optional
+
+from .memory import migrate
+
+# A backup is a data file plus two sidecars: ``<file>.pages`` holds a short
+# digest of every page of the database as backed up, and ``<file>.json`` the
+# manifest, written last so that a backup without one is known to be partial.
+# Full backups are plain SQLite files (gzipped for ``*.gz``); incremental and
+# differential ones are deltas holding only the pages that changed since their
+# base, another backup in the same directory.
+MODES = ("full", "incremental", "differential")
+DELTA_MAGIC = b"AMDELTA1"
+DIGEST_BYTES = 8
+_PAGE_HEADER = struct.Struct(">I")
+_DELTA_HEADER = struct.Struct(">II")
+
+
+class BackupError(Exception):
+    pass
+
+
+def _progress(pause: float) -> Optional[Callable[[int, int, int], None]]:
+    if not pause:
+        return None
+    return lambda status, remaining, total: time.sleep(pause)
+
+
+def snapshot(db_path: str, dest: str, step_pages: int = 1024, pause: float = 0.0) -> None:
+    """Copy a consistent snapshot of ``db_path`` to ``dest`` with SQLite's online backup API.
+
+    The copy goes ``step_pages`` pages at a time, sleeping ``pause`` seconds
+    between steps. It reads from one pinned read transaction: with the store in
+    WAL mode, writers keep committing meanwhile, and the copy neither includes
+    their changes nor restarts because of them.
+    """
+    source = sqlite3.connect(db_path, isolation_level=None)
+    target = sqlite3.connect(dest)
+    try:
+        source.execute("PRAGMA busy_timeout = 5000")
+        source.execute("BEGIN")
+        source.execute("SELECT count(*) FROM sqlite_master").fetchone()
+        source.backup(target, pages=step_pages, progress=_progress(pause))
+        source.execute("COMMIT")
+        # A self-contained file, without -wal/-shm next to it.
+        target.execute("PRAGMA journal_mode = DELETE")
+    finally:
+        source.close()
+        target.close()
+
+
+def integrity_check(path: str) -> List[str]:
+    """Problems ``PRAGMA integrity_check`` finds in the database at ``path``, if any."""
+    conn = sqlite3.connect(path)
+    try:
+        rows = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+    except sqlite3.DatabaseError as exc:
+        return [str(exc)]
+    finally:
+        conn.close()
+    return [] if rows == ["ok"] else rows
+
+
+def _page_size(path: str) -> int:
+    conn = sqlite3.connect(path)
+    try:
+        return int(conn.execute("PRAGMA page_size").fetchone()[0])
+    finally:
+        conn.close()
+
+
+def page_digests(path: str, page_size: int) -> bytes:
+    digests = bytearray()
+    with open(path, "rb") as f:
+        for page in iter(lambda: f.read(page_size), b""):
+            digests += hashlib.blake2b(page, digest_size=DIGEST_BYTES).digest()
+    return bytes(digests)
+
+
+def _open(path: Path, mode: str) -> IO[bytes]:
+    if path.suffix == ".gz":
+        return gzip.open(path, mode, compresslevel=6)  # type: ignore[return-value]
+    return open(path, mode)  # type: ignore[return-value]
+
+
+def read_manifest(path: Path) -> Optional[Dict[str, Any]]:
+    """The manifest of the backup at ``path``; None for plain copies made before manifests."""
+    try:
+        return json.loads(Path(f"{path}.json").read_text(encoding="utf-8"))
+    except FileNotFoundError:
+        return None
+
+
+def latest_backup(dest_dir: str, kind: Optional[str] = None) -> Optional[Path]:
+    """The newest complete backup in ``dest_dir``, optionally only of ``kind``."""
+    newest: Optional[Path] = None
+    newest_at = ""
+    for manifest_path in Path(dest_dir).glob("assistant_memory_*.json"):
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+        if kind is not None and manifest["kind"] != kind:
+            continue
+        if manifest["created_at"] > newest_at:
+            newest, newest_at = manifest_path.with_suffix(""), manifest["created_at"]
+    return newest
+
+
+def _write_delta(
+    snapshot_path: str, dest: Path, page_size: int, digests: bytes, base_digests: bytes
+) -> int:
+    changed = 0
+    page_count = len(digests) // DIGEST_BYTES
+    with open(snapshot_path, "rb") as src, _open(dest, "wb") as out:
+        out.write(DELTA_MAGIC + _DELTA_HEADER.pack(page_size, page_count))
+        for number in range(page_count):
+            page = src.read(page_size)
+            at = number * DIGEST_BYTES
+            if digests[at : at + DIGEST_BYTES] != base_digests[at : at + DIGEST_BYTES]:
+                out.write(_PAGE_HEADER.pack(number) + page)
+                changed += 1
+    return changed
+
+
+def _apply_delta(delta: Path, target: str) -> None:
+    with _open(delta, "rb") as src, open(target, "r+b") as out:
+        header = src.read(len(DELTA_MAGIC) + _DELTA_HEADER.size)
+        if not header.startswith(DELTA_MAGIC):
+            raise BackupError(f"{delta} is not a backup delta")
+        page_size, page_count = _DELTA_HEADER.unpack(header[len(DELTA_MAGIC) :])
+        while True:
+            number = src.read(_PAGE_HEADER.size)
+            if not number:
+                break
+            page = src.read(page_size)
+            if len(number) < _PAGE_HEADER.size or len(page) < page_size:
+                raise BackupError(f"{delta} is truncated")
+            out.seek(_PAGE_HEADER.unpack(number)[0] * page_size)
+            out.write(page)
+        out.truncate(page_count * page_size)
+
+
+def create_backup(
+    db_path: str,
+    dest_dir: str,
+    mode: str = "full",
+    compress: bool = False,
+    step_pages: int = 1024,
+    pause: float = 0.0,
+    verify: bool = True,
+) -> Path:
+    """Back ``db_path`` up into ``dest_dir`` and return the new backup's path.
+
+    ``incremental`` stores the pages changed since the latest backup,
+    ``differential`` those changed since the latest full one; either falls back
+    to a full backup when there is no base. ``verify`` integrity-checks the
+    snapshot before anything is written next to the other backups.
+    """
+    if mode not in MODES:
+        raise ValueError(f"unknown backup mode: {mode}")
+    Path(dest_dir).mkdir(parents=True, exist_ok=True)
+    created_at = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    name = f"assistant_memory_{created_at}"
+    tmp = str(Path(dest_dir) / f".{name}.tmp")
+    try:
+        snapshot(db_path, tmp, step_pages, pause)
+        if verify:
+            problems = integrity_check(tmp)
+            if problems:
+                raise BackupError(f"snapshot failed its integrity check: {problems[:5]}")
+        page_size = _page_size(tmp)
+        digests = page_digests(tmp, page_size)
+
+        base = None
+        if mode != "full":
+            base = latest_backup(dest_dir, kind="full" if mode == "differential" else None)
+        if base is not None and (read_manifest(base) or {}).get("page_size") != page_size:
+            base = None  # e.g. after a VACUUM with a new page size
+
+        gz = ".gz" if compress else ""
+        if base is None:
+            path = Path(dest_dir) / f"{name}.sqlite3{gz}"
+            if compress:
+                with open(tmp, "rb") as src, _open(path, "wb") as out:
+                    shutil.copyfileobj(src, out, 1024 * 1024)
+            else:
+                os.replace(tmp, path)
+            kind, changed = "full", len(digests) // DIGEST_BYTES
+        else:
+            path = Path(dest_dir) / f"{name}.delta{gz}"
+            base_digests = Path(f"{base}.pages").read_bytes()
+            changed = _write_delta(tmp, path, page_size, digests, base_digests)
+            kind = "incremental" if mode == "incremental" else "differential"
+
+        Path(f"{path}.pages").write_bytes(digests)
+        manifest = {
+            "kind": kind,
+            "base": base.name if base is not None else None,
+            "created_at": created_at,
+            "page_size": page_size,
+            "page_count": len(digests) // DIGEST_BYTES,
+            "changed_pages": changed,
+            "bytes": path.stat().st_size,
+        }
+        Path(f"{path}.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+        return path
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def materialize(path: Path, dest: str) -> None:
+    """Write the database as of backup ``path`` to ``dest``, applying deltas onto their bases."""
+    manifest = read_manifest(path)
+    if manifest is None or manifest["kind"] == "full":
+        with _open(path, "rb") as src, open(dest, "wb") as out:
+            shutil.copyfileobj(src, out, 1024 * 1024)
+        return
+    base = path.parent / manifest["base"]
+    if not base.exists():
+        raise BackupError(f"{path} needs its base backup {base}")
+    materialize(base, dest)
+    _apply_delta(path, dest)
+
+
+def _check(path: Path, rebuilt: str) -> List[str]:
+    problems = []
+    manifest = read_manifest(path)
+    if manifest is not None:
+        expected = Path(f"{path}.pages").read_bytes()
+        if page_digests(rebuilt, manifest["page_size"]) != expected:
+            problems.append("pages differ from the digests recorded at backup time")
+    return problems + integrity_check(rebuilt)
+
+
+def verify_backup(path: Path) -> List[str]:
+    """Rebuild backup ``path`` and check it against its page digests and SQLite's own checks."""
+    tmp = f"{path.parent / ('.' + path.name)}.verify"
+    try:
+        materialize(path, tmp)
+        return _check(path, tmp)
+    except (BackupError, OSError, EOFError, zlib.error) as exc:
+        return [str(exc)]
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def restore_backup(path: Path, db_path: str) -> None:
+    """Replace the contents of ``db_path`` with backup ``path``.
+
+    The backup is rebuilt and checked next to the database first. It is then
+    copied in with the backup API as one write transaction, rather than by
+    renaming files: connections that are open keep working and switch to the
+    restored data all at once when it commits, and a leftover ``-wal`` file
+    can't be replayed onto the new database. Backups taken before a schema
+    change are migrated first, so running servers can read them.
+    """
+    tmp = f"{db_path}.restore-tmp"
+    try:
+        materialize(path, tmp)
+        problems = _check(path, tmp)
+        if problems:
+            raise BackupError(f"{path} failed verification: {problems[:5]}")
+        source = sqlite3.connect(tmp)
+        migrate(source)
+        target = sqlite3.connect(db_path)
+        try:
+            target.execute("PRAGMA busy_timeout = 5000")
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import IO, Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .completion_cache import fingerprint
+from .provider_base import ProviderBase
+
+GENERATE = "generate"
+STREAM = "stream"
+
+
+class CassetteMissError(LookupError):
+    pass
+
+
+def _elapsed(start: float) -> float:
+    return time.perf_counter() - start
+
+
+def _compact(chunk: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        key: value for key, value in chunk.items() if value not in (None, "") and key != "cache"
+    }
+
+
+def _chunk(stored: Dict[str, Any]) -> Dict[str, Any]:
+    chunk = {"content": "", "tool_calls": None, **stored}
+    if "usage" not in stored:
+        chunk.pop("usage", None)
+    return chunk
+
+
+def _open(path: Path, mode: str) -> IO[str]:
+    if path.suffix == ".gz":
+        return gzip.open(path, mode + "t", encoding="utf-8")  # type: ignore[return-value]
+    return open(path, mode, encoding="utf-8")
+
+
+class Cassette:
+    """Recorded provider calls, one JSON object per line (gzipped for ``*.gz`` paths).
+
+    Each interaction holds the request fingerprint (as for the completion
+    cache), the request messages and tool names, and the response chunks with
+    their offsets in milliseconds from the start of the call. A generate call
+    is stored as a single chunk at its latency. Lookups by fingerprint return
+    recordings of the same request in turn; with ``strict=False`` a request
+    that was never recorded gets the next interaction in recording order.
+    ``models`` lists the recorded models in the order they first appear.
+    """
+
+    def __init__(self, path: str, strict: bool = False) -> None:
+        self.path = Path(path)
+        self.strict = strict
+        self.interactions: List[Dict[str, Any]] = []
+        self.models: List[Optional[str]] = []
+        self._by_key: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._turns: Dict[str, int] = defaultdict(int)
+        self._next = 0
+        self._lock = threading.Lock()
+        if self.path.exists():
+            with _open(self.path, "r") as f:
+                for line in f:
+                    if line.strip():
+                        self._add(json.loads(line))
+
+    def __len__(self) -> int:
+        return len(self.interactions)
+
+    def _add(self, interaction: Dict[str, Any]) -> None:
+        self.interactions.append(interaction)
+        if interaction.get("model") not in self.models:
+            self.models.append(interaction.get("model"))
+        self._by_key[interaction["key"]].append(interaction)
+
+    def append(self, interaction: Dict[str, Any]) -> None:
+        line = json.dumps(interaction, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with _open(self.path, "a") as f:
+                f.write(line + "\n")
+            self._add(interaction)
+
+    def find(self, *keys: str) -> Dict[str, Any]:
+        """Return a recording of the first of ``keys`` that was recorded."""
+        with self._lock:
+            for key in keys:
+                matches = self._by_key.get(key)
+                if matches:
+                    turn = self._turns[key]
+                    self._turns[key] = turn + 1
+                    return matches[turn % len(matches)]
+            if self.strict or not self.interactions:
+                raise CassetteMissError("no recorded interaction for this request")
+            interaction = self.interactions[self._next % len(self.interactions)]
+            self._next += 1
+            return interaction
+
+
+def _request(
+    model: Optional[str],
+    messages: List[Dict[str, Any]],
+    tools: Optional[List[Dict[str, Any]]],
+    tool_choice: str | None,
+    temperature: float,
+) -> Tuple[str, Dict[str, Any]]:
+    key = fingerprint(model, messages, tools, tool_choice, temperature)
+    names = [tool.get("function", {}).get("name") for tool in tools or ()]
+    return key, {"messages": messages, "tools": names or None, "temperature": temperature}
+
+
+class RecordingProvider(ProviderBase):
+    """Passes calls through to ``provider`` and appends completed ones to ``cassette``.
+
+    Calls that fail or streams closed early are not recorded. Other attributes
+    (``name``, ``model``, ``http_client``, ...) are those of the wrapped provider.
+    """
+
+    def __init__(self, provider: Any, cassette: Cassette) -> None:
+        self.provider = provider
+        self.cassette = cassette
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.provider, name)
+
+    def _interaction(
+        self, kind: str, request: Tuple[str, Dict[str, Any]], chunks: List[List[Any]]
+    ) -> Dict[str, Any]:
+        key, details = request
+        return {
+            "key": key,
+            "kind": kind,
+            "provider": getattr(self.provider, "name", None),
+            "model": getattr(self.provider, "model", None),
+            "request": details,
+            "chunks": chunks,
+        }
+
+    async def generate(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: str | None = None,
+        temperature: float = 0.2,
+        timeout: float | None = None,
+    ) -> Dict[str, Any]:
+        model = getattr(self.provider, "model", None)
+        request = _request(model, messages, tools, tool_choice, temperature)
+        start = time.perf_counter()
+        response = await self.provider.generate(
+            messages, tools=tools, tool_choice=tool_choice, temperature=temperature, timeout=timeout
+        )
+        elapsed = round((time.perf_counter() - start) * 1000, 3)
+        chunks = [[elapsed, _compact(response)]]
+        await asyncio.to_thread(self.cassette.append, self._interaction(GENERATE, request, chunks))
+        return response
+
+    async def stream(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: str | None = None,
+        temperature: float = 0.2,
+        timeout: float | None = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        model = getattr(self.provider, "model", None)
+        request = _request(model, messages, tools, tool_choice, temperature)
+        chunks: List[List[Any]] = []
+        start = time.perf_counter()
+        async for chunk in self.provider.stream(
+            messages, tools=tools, tool_choice=tool_choice, temperature=temperature, timeout=timeout
+        ):
+            chunks.append([round((time.perf_counter() - start) * 1000, 3), _compact(chunk)])
+            yield chunk
+        await asyncio.to_thread(self.cassette.append, self._interaction(STREAM, request, chunks))
+
+
+class ReplayProvider(ProviderBase):
+    """Answers from a cassette, reproducing the recorded timing.
+
+    ``speed`` scales the recorded offsets (2.0 replays twice as fast, 0 without
+    waiting). Setting ``ttft`` and/or ``interval`` (seconds) replaces them with
+    a fixed time to the first chunk and between later chunks. A generate call
+    replays a recorded stream joined into one response at the last chunk's
+    offset, and a stream replays a recorded generate call as one chunk.
+
+    Requests are matched against the calls recorded with each model in the
+    cassette, or only those recorded with ``model`` when it is given.
+    """
+
+    name = "replay"
+
+    def __init__(
+        self,
+        cassette: Cassette,
+        speed: float = 1.0,
+        ttft: Optional[float] = None,
+        interval: Optional[float] = None,
+        model: Optional[str] = None,
+    ) -> None:
+        self.cassette = cassette
+        self.speed = speed
+        self.ttft = ttft
+        self.interval = interval
+        self._models = [model] if model else None
+        self.model = model or next(filter(None, cassette.models), None) or "replay"
+
+    def _offsets(self, chunks: List[List[Any]]) -> List[float]:
+        if self.ttft is not None or self.interval is not None:
+            ttft, interval = self.ttft or 0.0, self.interval or 0.0
+            return [ttft + i * interval for i in range(len(chunks))]
+        if self.speed <= 0:
+            return [0.0] * len(chunks)
+        return [offset / 1000 / self.speed for offset, _chunk in chunks]
+
+    def _lookup(self, messages, tools, tool_choice, temperature) -> List[List[Any]]:
+        models = self._models or list(self.cassette.models)
+        keys = [_request(m, messages, tools, tool_choice, temperature)[0] for m in models]
+        return self.cassette.find(*keys)["chunks"]
+
+    async def generate(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: str | None = None,
+        temperature: float = 0.2,
+        timeout: float | None = None,
+    ) -> Dict[str, Any]:
+        start = time.perf_counter()
+        chunks = self._lookup(messages, tools, tool_choice, temperature)
+        response: Dict[str, Any] = {"content": "", "tool_calls": None}
+        for _offset, stored in chunks:
+            chunk = _chunk(stored)
+            response["content"] += chunk["content"]
+            response["tool_calls"] = chunk["tool_calls"] or response["tool_calls"]
+            if "usage" in chunk:
+                response["usage"] = chunk["usage"]
+        offsets = self._offsets(chunks)
+        await asyncio.sleep(max(0.0, (offsets[-1] if offsets else 0.0) - _elapsed(start)))
+        return response
+
+    async def stream(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: str | None = None,
+        temperature: float = 0.2,
+        timeout: float | None = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        start = time.perf_counter()
+        chunks = self._lookup(messages, tools, tool_choice, temperature)
+        # Offsets are from the start of the call, so slow consumers don't add drift.
+        for offset, (_recorded, stored) in zip(self._offsets(chunks), chunks):
+            await asyncio.sleep(max(0.0, offset - _elapsed(start)))
+            yield _chunk(stored)
@@ -6,20 +6,44 @@ import asyncio
 from .engine import AssistantEngine
 
 
-def cmd_chat(session_id: str) -> None:
-    engine = AssistantEngine(session_id=session_id)
-    print("Open Assistant — type /exit to quit\n")
+async def _chat_loop(engine: AssistantEngine, stream: bool) -> None:
+    try:
+        await _chat_turns(engine, stream)
+    finally:
+        close = getattr(engine.provider, "aclose", None)
+        if close is not None:
+            await close()
+
+
+async def _chat_turns(engine: AssistantEngine, stream: bool) -> None:
+    loop = asyncio.get_running_loop()
     while True:
         try:
-            user_input = input("You > ")
-        except (EOFError, KeyboardInterrupt):
+            user_input = await loop.run_in_executor(None, input, "You > ")
+        except EOFError:
             print("\nGoodbye.")
             break
         if user_input.strip() in {"/exit", ":q", "/quit"}:
             print("Goodbye.")
             break
-        content = asyncio.run(engine.chat_once(user_input))
-        print(f"Assistant: {content}\n")
+        if not stream:
+            content = await engine.chat_once(user_input)
+            print(f"Assistant: {content}\n")
+            continue
+        print("Assistant: ", end="", flush=True)
+        async for delta in engine.stream_once(user_input):
+            print(delta, end="", flush=True)
+        print("\n")
+
+
+def cmd_chat(session_id: str, stream: bool = True) -> None:
+    engine = AssistantEngine(session_id=session_id)
+    print("Open Assistant — type /exit to quit\n")
+    # One event loop for the whole session so the provider's HTTP pool stays usable.
+    try:
+        asyncio.run(_chat_loop(engine, stream))
+    except KeyboardInterrupt:
+        print("\nGoodbye.")
 
 
 def cmd_tools() -> None:
@@ -36,13 +60,16 @@ def main() -> None:
 
     chat_p = sub.add_parser("chat", help="Start interactive chat")
     chat_p.add_argument("--session-id", default="default")
+    chat_p.add_argument(
+        "--no-stream", action="store_true", help="Print replies only once they are complete"
+    )
 
     sub.add_parser("tools", help="List tools")
 
     args = parser.parse_args()
 
     if args.command == "chat":
-        cmd_chat(session_id=args.session_id)
+        cmd_chat(session_id=args.session_id, stream=not args.no_stream)
     elif args.command == "tools":
         cmd_tools()
 
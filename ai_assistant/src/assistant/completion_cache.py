@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .metrics import COMPLETION_CACHE_REQUESTS
+from .provider_base import ProviderBase
+
+HIT = "HIT"
+MISS = "MISS"
+BYPASS = "BYPASS"
+
+
+def _normalize_message(message: Dict[str, Any]) -> Dict[str, Any]:
+    normalized: Dict[str, Any] = {
+        "role": message.get("role"),
+        "content": (message.get("content") or "").strip(),
+    }
+    for key in ("name", "tool_call_id", "tool_calls"):
+        if message.get(key):
+            normalized[key] = message[key]
+    return normalized
+
+
+def fingerprint(
+    model: Optional[str],
+    messages: List[Dict[str, Any]],
+    tools: Optional[List[Dict[str, Any]]] = None,
+    tool_choice: str | None = None,
+    temperature: float = 0.2,
+    collapse_repeats: bool = False,
+) -> str:
+    """Stable hash of everything that determines a completion.
+
+    Message content is stripped and only fields the provider sees are kept, so
+    requests that differ only in surrounding whitespace or bookkeeping share a key.
+    ``collapse_repeats`` also ignores a message identical to the one before it,
+    which is what a resent message looks like in the history.
+    """
+    normalized: List[Dict[str, Any]] = []
+    for message in messages:
+        item = _normalize_message(message)
+        if not (collapse_repeats and normalized and normalized[-1] == item):
+            normalized.append(item)
+    payload = {
+        "model": model,
+        "messages": normalized,
+        "tools": tools or None,
+        "tool_choice": tool_choice if tools else None,
+        "temperature": round(float(temperature), 4),
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class MemoryCompletionBackend:
+    """In-process LRU of responses, bounded by entry count and serialized size."""
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 32 * 1024 * 1024) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.time():
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._pop(key)
+            self._entries[key] = (value, time.time() + ttl)
+            self._bytes += len(value)
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                self._pop(next(iter(self._entries)))
+
+    def _pop(self, key: str) -> None:
+        value, _expires_at = self._entries.pop(key)
+        self._bytes -= len(value)
+
+
+class SQLiteCompletionBackend:
+    """Responses kept in the memory store's database, so they survive restarts.
+
+    Values go through the store's encryption; expired and surplus rows are pruned
+    every ``prune_every`` writes.
+    """
+
+    # Calls do SQLite I/O, so ``CachingProvider`` makes them from a worker thread.
+    blocking = True
+
+    def __init__(self, memory: Any, max_entries: int = 1000, prune_every: int = 100) -> None:
+        self.memory = memory
+        self.max_entries = max_entries
+        self.prune_every = prune_every
+        self._writes = 0
+
+    def get(self, key: str) -> Optional[str]:
+        return self.memory.get_completion(key, time.time())
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        now = time.time()
+        self.memory.put_completion(key, value, now + ttl, now)
+        self._writes += 1
+        if self._writes % self.prune_every == 0:
+            self.memory.prune_completions(self.max_entries, now)
+
+
+class CachingProvider(ProviderBase):
+    """Serves repeated requests from a completion cache in front of ``provider``.
+
+    Only deterministic requests are cached: temperature 0, or callers passing
+    ``cache=True``; ``cache=False`` always bypasses. Responses carry a ``cache``
+    key (``HIT``, ``MISS`` or ``BYPASS``). Other attributes (``model``,
+    ``http_client``, ...) are those of the wrapped provider.
+    """
+
+    def __init__(self, provider: Any, backend: Any, ttl: float = 3600.0) -> None:
+        self.provider = provider
+        self.backend = backend
+        self.ttl = ttl
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.provider, name)
+
+    def _key(self, messages, tools, tool_choice, temperature, cache) -> Optional[str]:
+        if cache is False or (cache is None and temperature != 0):
+            COMPLETION_CACHE_REQUESTS.labels(result="bypass").inc()
+            return None
+        model = getattr(self.provider, "model", None)
+        return fingerprint(model, messages, tools, tool_choice, temperature)
+
+    async def _call(self, method: Any, *args: Any) -> Any:
+        if getattr(self.backend, "blocking", False):
+            return await asyncio.to_thread(method, *args)
+        return method(*args)
+
+    async def _lookup(self, key: str) -> Optional[Dict[str, Any]]:
+        cached = await self._call(self.backend.get, key)
+        COMPLETION_CACHE_REQUESTS.labels(result="hit" if cached is not None else "miss").inc()
+        return json.loads(cached) if cached is not None else None
+
+    async def _store(self, key: str, response: Dict[str, Any], ttl: Optional[float]) -> None:
+        value = {"content": response.get("content") or "", "tool_calls": response.get("tool_calls")}
+        await self._call(
+            self.backend.set, key, json.dumps(value, ensure_ascii=False), ttl or self.ttl
+        )
+
+    async def generate(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: str | None = None,
+        temperature: float = 0.2,
+        timeout: float | None = None,
+        cache: Optional[bool] = None,
+        cache_ttl: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        key = self._key(messages, tools, tool_choice, temperature, cache)
+        if key is None:
+            response = await self.provider.generate(
+                messages,
+                tools=tools,
+                tool_choice=tool_choice,
+                temperature=temperature,
+                timeout=timeout,
+            )
+            return {**response, "cache": BYPASS}
+        cached = await self._lookup(key)
+        if cached is not None:
+            return {**cached, "cache": HIT}
+        response = await self.provider.generate(
+            messages, tools=tools, tool_choice=tool_choice, temperature=temperature, timeout=timeout
+        )
+        await self._store(key, response, cache_ttl)
+        return {**response, "cache": MISS}
+
+    async def stream(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: str | None = None,
+        temperature: float = 0.2,
+        timeout: float | None = None,
+        cache: Optional[bool] = None,
+        cache_ttl: Optional[float] = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        key = self._key(messages, tools, tool_choice, temperature, cache)
+        cached = await self._lookup(key) if key is not None else None
+        if cached is not None:
+            yield {**cached, "cache": HIT}
+            return
+        status = BYPASS if key is None else MISS
+        parts: List[str] = []
+        tool_calls = None
+        async for chunk in self.provider.stream(
+            messages, tools=tools, tool_choice=tool_choice, temperature=temperature, timeout=timeout
+        ):
+            parts.append(chunk.get("content") or "")
+            tool_calls = chunk.get("tool_calls") or tool_calls
+            yield {**chunk, "cache": status}
+        # Only reached when the stream completed, so partial replies are never cached.
+        if key is not None:
+            await self._store(key, {"content": "".join(parts), "tool_calls": tool_calls}, cache_ttl)
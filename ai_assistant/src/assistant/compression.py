@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import hashlib
+import zlib
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence
+
+try:
+    import zstandard  # type: ignore
+except ImportError:  # pragma: no cover
+    zstandard = None  # type: ignore[assignment]
+
+# Header byte of a stored message (inside the encryption envelope, if any).
+# Bytes from 0x06 up start plain UTF-8 text as written by earlier versions; text
+# that itself starts with a byte below 0x06 is stored behind RAW.
+RAW = 0x01
+ZLIB = 0x02
+ZLIB_DICT = 0x03
+ZSTD = 0x04
+ZSTD_DICT = 0x05
+_FIRST_TEXT_BYTE = 0x06
+DICT_ID_BYTES = 4
+
+CODECS = ("off", "zlib", "zstd")
+
+
+class DecompressionError(ValueError):
+    pass
+
+
+def dictionary_id(dictionary: bytes) -> bytes:
+    return hashlib.sha256(dictionary).digest()[:DICT_ID_BYTES]
+
+
+def train_dictionary(samples: Sequence[bytes], size: int = 16 * 1024) -> bytes:
+    """A shared dictionary of content common to ``samples`` (e.g. recent messages).
+
+    Uses zstd's trainer when ``zstandard`` is installed. Otherwise it picks the
+    word trigrams found in the most samples, weighted by length. The best ones
+    go last, because zlib finds matches near the end of its window most cheaply.
+    Either kind works with both codecs.
+    """
+    if zstandard is not None and len(samples) >= 10:
+        try:
+            return zstandard.train_dictionary(size, list(samples)).as_bytes()
+        except zstandard.ZstdError:
+            pass  # too few or too similar samples; fall back below
+    seen: Counter = Counter()
+    for sample in samples:
+        words = sample.split(b" ")
+        seen.update({b" ".join(words[i : i + 3]) + b" " for i in range(len(words) - 2)})
+    ranked = sorted(
+        (gram for gram, count in seen.items() if count > 1),
+        key=lambda gram: seen[gram] * len(gram),
+        reverse=True,
+    )
+    chosen: List[bytes] = []
+    total = 0
+    for gram in ranked:
+        if total + len(gram) > size:
+            break
+        chosen.append(gram)
+        total += len(gram)
+    return b"".join(reversed(chosen))
+
+
+class Compressor:
+    """Per-message compression with a one-byte codec header.
+
+    Messages shorter than ``min_bytes`` are stored as they are, unless a
+    dictionary is set, which makes compression worthwhile from
+    ``dict_min_bytes``. A compressed form that isn't smaller is not kept.
+    ``dictionaries`` are all readable; the first one is used for writing.
+    Any stored codec is read whatever ``codec`` is configured, so settings can
+    change under existing rows.
+    """
+
+    def __init__(
+        self,
+        codec: str = "off",
+        level: Optional[int] = None,
+        min_bytes: int = 512,
+        dictionaries: Sequence[bytes] = (),
+        dict_min_bytes: int = 64,
+    ) -> None:
+        if codec not in CODECS:
+            raise ValueError(f"unknown memory compression codec: {codec}")
+        if codec == "zstd" and zstandard is None:
+            raise RuntimeError("MEMORY_COMPRESSION=zstd needs the zstandard package")
+        self.codec = codec
+        self.level = level
+        self.min_bytes = min_bytes
+        self.dict_min_bytes = dict_min_bytes
+        self._dictionaries: Dict[bytes, bytes] = {dictionary_id(d): d for d in dictionaries}
+        self._dictionary = dictionaries[0] if dictionaries else None
+        self._dictionary_id = dictionary_id(dictionaries[0]) if dictionaries else b""
+        self._zstd: Dict[bytes, tuple] = {}
+
+    def _zstd_pair(self, dict_id: bytes) -> tuple:
+        # Dictionaries are parsed once per id, not per message.
+        pair = self._zstd.get(dict_id)
+        if pair is None:
+            data = self._dictionaries.get(dict_id)
+            zdict = zstandard.ZstdCompressionDict(data) if data is not None else None
+            level = self.level if self.level is not None else 3
+            pair = (zdict, level)
+            self._zstd[dict_id] = pair
+        return pair
+
+    def compress(self, data: bytes) -> bytes:
+        use_dict = self._dictionary is not None and len(data) >= self.dict_min_bytes
+        if self.codec != "off" and (use_dict or len(data) >= self.min_bytes):
+            frame = self._compress(data, use_dict)
+            if len(frame) < len(data):
+                return frame
+        if data and data[0] < _FIRST_TEXT_BYTE:
+            return bytes([RAW]) + data
+        return data
+
+    def _compress(self, data: bytes, use_dict: bool) -> bytes:
+        if self.codec == "zstd":
+            zdict, level = self._zstd_pair(self._dictionary_id if use_dict else b"")
+            body = zstandard.ZstdCompressor(level=level, dict_data=zdict).compress(data)
+            if use_dict:
+                return bytes([ZSTD_DICT]) + self._dictionary_id + body
+            return bytes([ZSTD]) + body
+        level = self.level if self.level is not None else 6
+        if use_dict:
+            packer = zlib.compressobj(level, zlib.DEFLATED, -15, zdict=self._dictionary)
+            body = packer.compress(data) + packer.flush()
+            return bytes([ZLIB_DICT]) + self._dictionary_id + body
+        return bytes([ZLIB]) + zlib.compress(data, level)
+
+    def decompress(self, frame: bytes) -> bytes:
+        if not frame or frame[0] >= _FIRST_TEXT_BYTE:
+            return frame
+        header = frame[0]
+        try:
+            if header == RAW:
+                return frame[1:]
+            if header == ZLIB:
+                return zlib.decompress(frame[1:])
+            if header in (ZLIB_DICT, ZSTD_DICT):
+                dict_id = frame[1 : 1 + DICT_ID_BYTES]
+                if dict_id not in self._dictionaries:
+                    raise DecompressionError(f"unknown compression dictionary {dict_id.hex()}")
+                body = frame[1 + DICT_ID_BYTES :]
+                if header == ZLIB_DICT:
+                    unpacker = zlib.decompressobj(-15, zdict=self._dictionaries[dict_id])
+                    return unpacker.decompress(body) + unpacker.flush()
+                return self._zstd_decompress(body, dict_id)
+            if header == ZSTD:
+                return self._zstd_decompress(frame[1:], b"")
+        except zlib.error as exc:
+            raise DecompressionError(f"corrupt compressed message: {exc}") from None
+        raise DecompressionError(f"unknown compression header {header:#04x}")
+
+    def _zstd_decompress(self, body: bytes, dict_id: bytes) -> bytes:
+        if zstandard is None:
+            raise DecompressionError("message is zstd-compressed but zstandard is not installed")
+        zdict, _level = self._zstd_pair(dict_id)
+        try:
+            return zstandard.ZstdDecompressor(dict_data=zdict).decompress(body)
+        except zstandard.ZstdError as exc:
+            raise DecompressionError(f"corrupt compressed message: {exc}") from None
+
+
+def load_dictionaries(paths: Optional[Iterable[str]]) -> List[bytes]:
+    dictionaries = []
+    for path in paths or ():
+        with open(path, "rb") as f:
+            dictionaries.append(f.read())
+    return dictionaries
@@ -1,20 +1,78 @@
 from __future__ import annotations
 
+import hashlib
+import logging
 import os
-from dataclasses import dataclass
+import signal
+import threading
+from dataclasses import dataclass, field
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Callable, Dict, List, Optional, Set
 
+logger = logging.getLogger(__name__)
 
-@dataclass
+
+def hash_api_key(key: str) -> bytes:
+    return hashlib.sha256(key.encode("utf-8")).digest()
+
+
+@dataclass(frozen=True)
 class Settings:
     openai_api_key: str | None = None
     openai_model: str = "gpt-4o-mini"
+    openai_base_url: str | None = None
 
     ollama_host: str | None = None
     ollama_model: str = "llama3.1:8b"
 
     assistant_db_path: str = "./assistant_memory.sqlite3"
+    memory_write_queue_size: int = 10_000
+    memory_write_batch_size: int = 256
+    memory_write_flush_ms: float = 5.0
+    history_cache_sessions: int = 10_000
+    history_cache_bytes: int = 64 * 1024 * 1024
+    history_cache_ttl_seconds: float = 900.0
+    memory_compression: str = "off"
+    memory_compression_level: int | None = None
+    memory_compression_min_bytes: int = 512
+    memory_compression_dicts: List[str] | None = None
+    memory_reencrypt: bool = False
+    memory_reencrypt_batch: int = 500
+    memory_reencrypt_pause_ms: float = 50.0
+    memory_session_ttl_days: float | None = None
+    memory_message_ttl_days: float | None = None
+    memory_max_messages: int | None = None
+    memory_retention_interval_s: float = 3600.0
+    memory_retention_batch: int = 500
+    memory_retention_pause_ms: float = 50.0
+    memory_archive_dir: Optional[str] = None
+
+    context_token_budget: int = 8000
+    context_token_budgets: Dict[str, int] | None = None
+    context_summary_tokens: int = 512
+    context_max_messages: int = 200
+    context_summarizer: str = "extractive"
+
+    tool_max_workers: int = 8
+    tool_timeout_seconds: float = 30.0
+    tool_timeouts: Dict[str, float] | None = None
+
+    web_cache_entries: int = 256
+    web_cache_bytes: int = 16 * 1024 * 1024
+    web_cache_dir: Optional[str] = None
+
+    completion_cache: str = "off"
+    completion_cache_entries: int = 1000
+    completion_cache_bytes: int = 32 * 1024 * 1024
+    completion_cache_ttl_seconds: float = 3600.0
+    single_flight: bool = True
+
+    rate_limit: str = "120/60"
+    rate_limit_routes: Dict[str, str] | None = None
+    rate_limit_keys: Dict[str, str] | None = None
+    rate_limit_max_keys: int = 100_000
+    rate_limit_lease: int = 16
+    rate_limit_redis_timeout: float = 0.1
     log_level: str = "INFO"
 
     server_host: str = "0.0.0.0"
@@ -22,17 +80,53 @@ class Settings:
 
     allowed_origins: List[str] | None = None
     api_keys: List[str] | None = None
+    export_enabled: bool = False
     request_max_bytes: int = 1_000_000
 
     sentry_dsn: str | None = None
     otlp_endpoint: str | None = None
+    trace_exporter: str = "off"
+    profile_sample_rate: float = 0.0
+    profile_header: bool = False
+    profile_interval_ms: float = 5.0
+    profile_dir: str | None = None
 
     redis_url: str | None = None
 
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0
+    provider_timeout_seconds: float = 60.0
+    provider_max_retries: int = 2
+    provider_record: str | None = None
+    provider_replay: str | None = None
+    provider_replay_strict: bool = False
+    provider_replay_speed: float = 1.0
+    provider_replay_ttft_ms: float | None = None
+    provider_replay_interval_ms: float | None = None
+    settings_reload_seconds: float = 2.0
+
+    # SHA-256 digests of ``api_keys`` by their first 8 bytes, built once per snapshot.
+    api_key_digests: Dict[bytes, bytes] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        digests = (hash_api_key(key) for key in self.api_keys or ())
+        object.__setattr__(self, "api_key_digests", {d[:8]: d for d in digests})
+
 
-def _load_dotenv_if_present(env_path: Path) -> None:
+def _load_dotenv_if_present(env_path: Path, owned: Optional[Set[str]] = None) -> Set[str]:
+    """Copy ``.env`` entries into the environment without overriding real variables.
+
+    Keys in ``owned`` came from an earlier load of the same file and may be
+    replaced, or removed when they are no longer in it. Returns the keys now
+    owned by the file.
+    """
+    owned = owned or set()
+    loaded: Set[str] = set()
     if not env_path.exists():
-        return
+        for key in owned:
+            os.environ.pop(key, None)
+        return loaded
     try:
         with env_path.open("r", encoding="utf-8") as f:
             for line in f:
@@ -44,10 +138,14 @@ def _load_dotenv_if_present(env_path: Path) -> None:
                 key, value = line.split("=", 1)
                 key = key.strip()
                 value = value.strip()
-                if key and key not in os.environ:
+                if key and (key not in os.environ or key in owned):
                     os.environ[key] = value
+                    loaded.add(key)
     except Exception:
-        pass
+        return owned
+    for key in owned - loaded:
+        os.environ.pop(key, None)
+    return loaded
 
 
 def _split_env_list(value: Optional[str]) -> Optional[List[str]]:
@@ -57,22 +155,214 @@ def _split_env_list(value: Optional[str]) -> Optional[List[str]]:
     return items or None
 
 
+def _split_env_map(
+    value: Optional[str], cast: Callable[[str], Any] = int
+) -> Optional[Dict[str, Any]]:
+    # "model-a=8000,model-b=4000" -> {"model-a": 8000, "model-b": 4000}
+    items = _split_env_list(value) or []
+    pairs = [item.rsplit("=", 1) for item in items if "=" in item]
+    return {key.strip(): cast(val) for key, val in pairs} or None
+
+
+def _optional_int(value: Optional[str]) -> Optional[int]:
+    return int(value) if value else None
+
+
+def _optional_float(value: Optional[str]) -> Optional[float]:
+    return float(value) if value else None
+
+
+def _default_env_path() -> Path:
+    return Path(__file__).resolve().parents[2] / ".env"
+
+
 def load_settings() -> Settings:
-    env_path = Path(__file__).resolve().parents[2] / ".env"
-    _load_dotenv_if_present(env_path)
+    """Read ``.env`` and the environment afresh; request paths use ``get_settings()``."""
+    _load_dotenv_if_present(_default_env_path())
+    return _settings_from_env()
+
+
+def _settings_from_env() -> Settings:
     return Settings(
         openai_api_key=os.getenv("OPENAI_API_KEY"),
         openai_model=os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+        openai_base_url=os.getenv("OPENAI_BASE_URL"),
         ollama_host=os.getenv("OLLAMA_HOST"),
         ollama_model=os.getenv("OLLAMA_MODEL", "llama3.1:8b"),
         assistant_db_path=os.getenv("ASSISTANT_DB_PATH", "./assistant_memory.sqlite3"),
+        memory_write_queue_size=int(os.getenv("MEMORY_WRITE_QUEUE_SIZE", "10000")),
+        memory_write_batch_size=int(os.getenv("MEMORY_WRITE_BATCH_SIZE", "256")),
+        memory_write_flush_ms=float(os.getenv("MEMORY_WRITE_FLUSH_MS", "5")),
+        history_cache_sessions=int(os.getenv("HISTORY_CACHE_SESSIONS", "10000")),
+        history_cache_bytes=int(os.getenv("HISTORY_CACHE_BYTES", str(64 * 1024 * 1024))),
+        history_cache_ttl_seconds=float(os.getenv("HISTORY_CACHE_TTL_SECONDS", "900")),
+        # off | zlib | zstd; dictionaries are files, the first one used for writing.
+        memory_compression=os.getenv("MEMORY_COMPRESSION", "off"),
+        memory_compression_level=_optional_int(os.getenv("MEMORY_COMPRESSION_LEVEL")),
+        memory_compression_min_bytes=int(os.getenv("MEMORY_COMPRESSION_MIN_BYTES", "512")),
+        memory_compression_dicts=_split_env_list(os.getenv("MEMORY_COMPRESSION_DICTS")),
+        # Rewrite rows under the active key in the background; on by default
+        # while old keys are configured, i.e. during a rotation.
+        memory_reencrypt=os.getenv(
+            "MEMORY_REENCRYPT", "1" if os.getenv("ASSISTANT_MEMORY_ENCRYPTION_OLD_KEYS") else "0"
+        ).lower()
+        in {"1", "true", "yes", "on"},
+        memory_reencrypt_batch=int(os.getenv("MEMORY_REENCRYPT_BATCH", "500")),
+        memory_reencrypt_pause_ms=float(os.getenv("MEMORY_REENCRYPT_PAUSE_MS", "50")),
+        # Retention is off until one of the limits is set; idle sessions are
+        # archived to MEMORY_ARCHIVE_DIR, if set, before they are deleted.
+        memory_session_ttl_days=_optional_float(os.getenv("MEMORY_SESSION_TTL_DAYS")),
+        memory_message_ttl_days=_optional_float(os.getenv("MEMORY_MESSAGE_TTL_DAYS")),
+        memory_max_messages=_optional_int(os.getenv("MEMORY_MAX_MESSAGES")),
+        memory_retention_interval_s=float(os.getenv("MEMORY_RETENTION_INTERVAL_S", "3600")),
+        memory_retention_batch=int(os.getenv("MEMORY_RETENTION_BATCH", "500")),
+        memory_retention_pause_ms=float(os.getenv("MEMORY_RETENTION_PAUSE_MS", "50")),
+        memory_archive_dir=os.getenv("MEMORY_ARCHIVE_DIR") or None,
+        context_token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "8000")),
+        context_token_budgets=_split_env_map(os.getenv("CONTEXT_TOKEN_BUDGETS")),
+        context_summary_tokens=int(os.getenv("CONTEXT_SUMMARY_TOKENS", "512")),
+        context_max_messages=int(os.getenv("CONTEXT_MAX_MESSAGES", "200")),
+        context_summarizer=os.getenv("CONTEXT_SUMMARIZER", "extractive"),
+        tool_max_workers=int(os.getenv("TOOL_MAX_WORKERS", "8")),
+        tool_timeout_seconds=float(os.getenv("TOOL_TIMEOUT_SECONDS", "30")),
+        tool_timeouts=_split_env_map(os.getenv("TOOL_TIMEOUTS"), float),
+        web_cache_entries=int(os.getenv("WEB_CACHE_ENTRIES", "256")),
+        web_cache_bytes=int(os.getenv("WEB_CACHE_BYTES", str(16 * 1024 * 1024))),
+        web_cache_dir=os.getenv("WEB_CACHE_DIR") or None,
+        completion_cache=os.getenv("COMPLETION_CACHE", "off").lower(),
+        completion_cache_entries=int(os.getenv("COMPLETION_CACHE_ENTRIES", "1000")),
+        completion_cache_bytes=int(os.getenv("COMPLETION_CACHE_BYTES", str(32 * 1024 * 1024))),
+        completion_cache_ttl_seconds=float(os.getenv("COMPLETION_CACHE_TTL_SECONDS", "3600")),
+        single_flight=os.getenv("SINGLE_FLIGHT", "1").lower() not in {"0", "false", "no", "off"},
+        rate_limit=os.getenv("RATE_LIMIT", "120/60"),
+        rate_limit_routes=_split_env_map(os.getenv("RATE_LIMIT_ROUTES"), str),
+        rate_limit_keys=_split_env_map(os.getenv("RATE_LIMIT_KEYS"), str),
+        rate_limit_max_keys=int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000")),
+        rate_limit_lease=int(os.getenv("RATE_LIMIT_LEASE", "16")),
+        rate_limit_redis_timeout=float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT", "0.1")),
         log_level=os.getenv("LOG_LEVEL", "INFO"),
         server_host=os.getenv("SERVER_HOST", "0.0.0.0"),
         server_port=int(os.getenv("SERVER_PORT", "8000")),
         allowed_origins=_split_env_list(os.getenv("ALLOWED_ORIGINS")),
         api_keys=_split_env_list(os.getenv("API_KEYS")),
+        export_enabled=os.getenv("EXPORT_ENABLED", "0").lower() in {"1", "true", "yes", "on"},
         request_max_bytes=int(os.getenv("REQUEST_MAX_BYTES", "1000000")),
         sentry_dsn=os.getenv("SENTRY_DSN"),
         otlp_endpoint=os.getenv("OTLP_ENDPOINT"),
+        # otlp | console | memory | off; OTLP whenever an endpoint is set.
+        trace_exporter=os.getenv("TRACE_EXPORTER", "otlp" if os.getenv("OTLP_ENDPOINT") else "off"),
+        profile_sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+        profile_header=os.getenv("PROFILE_HEADER", "0").lower() in {"1", "true", "yes", "on"},
+        profile_interval_ms=float(os.getenv("PROFILE_INTERVAL_MS", "5")),
+        profile_dir=os.getenv("PROFILE_DIR") or None,
         redis_url=os.getenv("REDIS_URL"),
-    )
\ No newline at end of file
+        http_max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+        http_max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")),
+        http_keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30")),
+        provider_timeout_seconds=float(os.getenv("PROVIDER_TIMEOUT_SECONDS", "60")),
+        provider_max_retries=int(os.getenv("PROVIDER_MAX_RETRIES", "2")),
+        provider_record=os.getenv("PROVIDER_RECORD") or None,
+        provider_replay=os.getenv("PROVIDER_REPLAY") or None,
+        provider_replay_strict=os.getenv("PROVIDER_REPLAY_STRICT", "0").lower()
+        in {"1", "true", "yes", "on"},
+        provider_replay_speed=float(os.getenv("PROVIDER_REPLAY_SPEED", "1")),
+        provider_replay_ttft_ms=_optional_float(os.getenv("PROVIDER_REPLAY_TTFT_MS")),
+        provider_replay_interval_ms=_optional_float(os.getenv("PROVIDER_REPLAY_INTERVAL_MS")),
+        settings_reload_seconds=float(os.getenv("SETTINGS_RELOAD_SECONDS", "2")),
+    )
+
+
+class SettingsStore:
+    """The current ``Settings`` snapshot, loaded once and swapped whole on reload.
+
+    ``get()`` only reads an attribute. A reload (``reload()``, SIGHUP, or a
+    changed ``.env`` mtime seen by the watcher thread) builds a complete new
+    snapshot first, so readers see either the old settings or the new ones.
+    A snapshot that fails to parse is logged and the old one kept.
+    """
+
+    def __init__(self, env_path: Optional[Path] = None) -> None:
+        self.env_path = env_path or _default_env_path()
+        self._settings: Optional[Settings] = None
+        self._owned: Set[str] = set()
+        self._mtime: Optional[float] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    def get(self) -> Settings:
+        settings = self._settings
+        if settings is None:
+            self.reload()
+            settings = self._settings
+        return settings  # type: ignore[return-value]
+
+    def reload(self) -> bool:
+        with self._lock:
+            mtime = self._stat()
+            owned = self._owned
+            try:
+                self._owned = _load_dotenv_if_present(self.env_path, owned)
+                settings = _settings_from_env()
+            except Exception:
+                if self._settings is None:
+                    raise
+                logger.exception("settings reload failed; keeping the previous settings")
+                return False
+            self._mtime = mtime
+            self._settings = settings
+            return True
+
+    def check(self) -> bool:
+        """Reload if ``.env`` changed since the last load."""
+        if self._stat() == self._mtime:
+            return False
+        return self.reload()
+
+    def _stat(self) -> Optional[float]:
+        try:
+            return self.env_path.stat().st_mtime
+        except OSError:
+            return None
+
+    def install_sighup(self) -> bool:
+        """Reload on SIGHUP. Only possible from the main thread on POSIX."""
+        if not hasattr(signal, "SIGHUP"):
+            return False
+
+        def handler(signum, frame) -> None:
+            # Off the signal handler: it may have interrupted a reload.
+            threading.Thread(target=self.reload, name="settings-reload", daemon=True).start()
+
+        try:
+            signal.signal(signal.SIGHUP, handler)
+        except ValueError:
+            return False
+        return True
+
+    def start_watching(self, interval: Optional[float] = None) -> None:
+        interval = self.get().settings_reload_seconds if interval is None else interval
+        if interval <= 0 or self._watcher is not None:
+            return
+        self._stop.clear()
+
+        def watch() -> None:
+            while not self._stop.wait(interval):
+                self.check()
+
+        self._watcher = threading.Thread(target=watch, name="settings-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watching(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join()
+            self._watcher = None
+
+
+SETTINGS = SettingsStore()
+
+
+def get_settings() -> Settings:
+    """The current settings snapshot; no filesystem access after the first call."""
+    return SETTINGS.get()
\ No newline at end of file
@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Sequence
+
+from .history_cache import Row
+from .tokens import MESSAGE_OVERHEAD_TOKENS, count_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+TRUNCATED_MARK = "\n[…truncated]"
+
+
+class ExtractiveSummarizer:
+    """Folds turns into the summary as clipped ``role: text`` lines, no model call.
+
+    When the summary outgrows ``max_tokens`` its oldest lines are dropped.
+    """
+
+    def __init__(self, max_tokens: int = 512, line_tokens: int = 48) -> None:
+        self.max_tokens = max_tokens
+        self.line_tokens = line_tokens
+
+    async def fold(self, summary: str, rows: Sequence[Row]) -> str:
+        lines = summary.splitlines() if summary else []
+        for _id, role, content, _tokens in rows:
+            text = " ".join(content.split())
+            clipped = truncate_to_tokens(text, self.line_tokens)
+            lines.append(f"- {role}: {clipped}{'…' if clipped != text else ''}")
+        while len(lines) > 1 and count_tokens("\n".join(lines)) > self.max_tokens:
+            lines.pop(0)
+        return truncate_to_tokens("\n".join(lines), self.max_tokens)
+
+
+class ProviderSummarizer:
+    """Asks the model to merge newly evicted turns into the existing summary.
+
+    Only the new turns and the previous summary are sent, so each fold costs one
+    small call. Falls back to ``ExtractiveSummarizer`` if the call fails.
+    """
+
+    def __init__(self, provider: Any, max_tokens: int = 512, timeout: float = 30.0) -> None:
+        self.provider = provider
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.fallback = ExtractiveSummarizer(max_tokens=max_tokens)
+
+    async def fold(self, summary: str, rows: Sequence[Row]) -> str:
+        turns = "\n".join(f"{role}: {content}" for _id, role, content, _tokens in rows)
+        prompt = (
+            f"Update the running summary of a conversation with the new turns below. "
+            f"Keep facts, decisions and open questions; stay under {self.max_tokens} tokens.\n\n"
+            f"Current summary:\n{summary or '(empty)'}\n\nNew turns:\n"
+            f"{truncate_to_tokens(turns, self.max_tokens * 8)}"
+        )
+        try:
+            response = await self.provider.generate(
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.0,
+                timeout=self.timeout,
+            )
+            content = (response.get("content") or "").strip()
+        except Exception:
+            logger.exception("summary update failed; using extractive fallback")
+            content = ""
+        if not content:
+            return await self.fallback.fold(summary, rows)
+        return truncate_to_tokens(content, self.max_tokens)
+
+
+class ContextAssembler:
+    """Builds the prompt history of a session within a token budget.
+
+    Messages are taken newest first while they fit ``budget_tokens`` (the newest
+    is truncated if it alone does not). Older messages are folded into a rolling
+    summary that is stored with the session and only ever extended with the rows
+    evicted since its last update.
+    """
+
+    def __init__(
+        self,
+        store: Any,
+        budget_tokens: int = 8000,
+        summary_tokens: int = 512,
+        max_messages: int = 200,
+        summarizer: Any = None,
+    ) -> None:
+        self.store = store
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        self.max_messages = max_messages
+        self.summarizer = summarizer or ExtractiveSummarizer(max_tokens=summary_tokens)
+
+    async def assemble(self, session_id: str) -> List[Dict[str, Any]]:
+        # Store calls run in a worker thread: a busy SQLite write lock must not
+        # stall the event loop.
+        fetched = await asyncio.to_thread(self.store.fetch_rows, session_id, self.max_messages)
+        stored = await asyncio.to_thread(self.store.get_summary, session_id)
+        upto_id, summary = (stored[0], stored[1]) if stored else (0, "")
+        # Rows already folded into the summary are not sent again. Queued rows
+        # (id 0) are newer than anything summarized.
+        rows = [row for row in fetched if row[0] == 0 or row[0] > upto_id]
+        # Room for the summary message is reserved up front so the total stays bounded.
+        reserved = self.summary_tokens + count_tokens(SUMMARY_PREFIX) + MESSAGE_OVERHEAD_TOKENS
+        budget = self.budget_tokens - reserved
+        window: List[Dict[str, Any]] = []
+        used = 0
+        cut = 0
+        for index in range(len(rows) - 1, -1, -1):
+            _id, role, content, tokens = rows[index]
+            cost = tokens + MESSAGE_OVERHEAD_TOKENS
+            if used + cost > budget:
+                if not window:
+                    keep = budget - MESSAGE_OVERHEAD_TOKENS - count_tokens(TRUNCATED_MARK)
+                    content = truncate_to_tokens(content, keep) + TRUNCATED_MARK
+                    window.append({"role": role, "content": content})
+                    index -= 1
+                cut = index + 1
+                break
+            window.append({"role": role, "content": content})
+            used += cost
+        window.reverse()
+
+        # A full fetch may leave older rows, beyond ``max_messages``, still to fold.
+        older_than = None
+        if len(fetched) >= self.max_messages and fetched[0][0] > upto_id:
+            older_than = fetched[0][0]
+        summary = await self._update_summary(session_id, upto_id, summary, rows[:cut], older_than)
+        if not summary:
+            return window
+        return [{"role": "system", "content": SUMMARY_PREFIX + summary}] + window
+
+    async def _update_summary(
+        self,
+        session_id: str,
+        upto_id: int,
+        summary: str,
+        evicted: Sequence[Row],
+        older_than: Optional[int],
+    ) -> str:
+        folded_upto = upto_id
+        while older_than is not None:
+            older = await asyncio.to_thread(
+                self.store.fetch_rows_between,
+                session_id,
+                folded_upto,
+                older_than,
+                self.max_messages,
+            )
+            if not older:
+                break
+            summary = await self.summarizer.fold(summary, older)
+            folded_upto = older[-1][0]
+            if len(older) < self.max_messages:
+                break
+        # Queued writes (id 0) are folded once they commit and have an id.
+        fresh = [row for row in evicted if row[0] > folded_upto]
+        if fresh:
+            summary = await self.summarizer.fold(summary, fresh)
+            folded_upto = fresh[-1][0]
+        if folded_upto != upto_id:
+            await asyncio.to_thread(
+                self.store.put_summary, session_id, folded_upto, summary, count_tokens(summary)
+            )
+        return summary
+
+
+def budget_for_model(model: Optional[str], default: int, overrides: Dict[str, int]) -> int:
+    if model and model in overrides:
+        return overrides[model]
+    return default
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import os
+from typing import Dict, List, Optional, Sequence
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.fernet import Fernet, InvalidToken
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+except Exception:  # pragma: no cover
+    Fernet = None  # type: ignore
+
+# Envelope: MAGIC, algorithm, 4-byte key id, 12-byte nonce, then ciphertext and
+# 16-byte tag. The first six bytes are authenticated as associated data.
+MAGIC = b"\x00"
+AES_GCM = b"\x01"
+KEY_ID_BYTES = 4
+NONCE_BYTES = 12
+HEADER_BYTES = len(MAGIC) + len(AES_GCM) + KEY_ID_BYTES
+# Fernet tokens are base64 of a 0x80 version byte and a 64-bit timestamp.
+FERNET_PREFIX = b"gAAAAA"
+
+KEY_ENV = "ASSISTANT_MEMORY_ENCRYPTION_KEY"
+OLD_KEYS_ENV = "ASSISTANT_MEMORY_ENCRYPTION_OLD_KEYS"
+
+
+class DecryptionError(ValueError):
+    def __init__(self, reason: str, message: str) -> None:
+        super().__init__(message)
+        self.reason = reason
+
+
+def is_envelope(blob: bytes) -> bool:
+    return blob[:1] == MAGIC
+
+
+def is_fernet_token(blob: bytes) -> bool:
+    return blob[:6] == FERNET_PREFIX
+
+
+class _Key:
+    def __init__(self, key: str) -> None:
+        raw = base64.urlsafe_b64decode(key.encode("ascii"))
+        if len(raw) != 32:
+            raise ValueError("memory encryption keys are 32 url-safe base64 bytes (a Fernet key)")
+        # Separate AEAD key from the same secret, so the Fernet key is not reused as is.
+        derived = HKDF(
+            algorithm=hashes.SHA256(), length=32, salt=None, info=b"assistant-memory-aes-gcm-v1"
+        ).derive(raw)
+        self.aead = AESGCM(derived)
+        self.id = hashlib.sha256(b"key-id" + derived).digest()[:KEY_ID_BYTES]
+        self.fernet = Fernet(key.encode("ascii"))
+
+
+class MemoryCipher:
+    """AES-256-GCM envelopes for stored messages, with several keys for rotation.
+
+    ``keys`` are Fernet-format keys (``Fernet.generate_key()``); the first one
+    encrypts, all of them decrypt. Envelopes name their key by a short id, so
+    a read tries only that key. Fernet tokens written by earlier versions are
+    decrypted with the same keys.
+    """
+
+    def __init__(self, keys: Sequence[str]) -> None:
+        if keys and Fernet is None:
+            raise RuntimeError("memory encryption needs the cryptography package")
+        self._keys: List[_Key] = [_Key(key) for key in keys]
+        self._by_id: Dict[bytes, _Key] = {}
+        for key in self._keys:
+            if key.id in self._by_id:
+                raise ValueError("memory encryption keys must be distinct")
+            self._by_id[key.id] = key
+        self._header = MAGIC + AES_GCM + self._keys[0].id if self._keys else None
+
+    @classmethod
+    def from_env(cls) -> "MemoryCipher":
+        keys = [os.getenv(KEY_ENV) or ""]
+        keys += (os.getenv(OLD_KEYS_ENV) or "").split(",")
+        return cls([key.strip() for key in keys if key.strip()])
+
+    @property
+    def enabled(self) -> bool:
+        return self._header is not None
+
+    @property
+    def key_id(self) -> Optional[bytes]:
+        return self._keys[0].id if self._keys else None
+
+    def encrypt(self, data: bytes) -> bytes:
+        if self._header is None:
+            return data
+        nonce = os.urandom(NONCE_BYTES)
+        return self._header + nonce + self._keys[0].aead.encrypt(nonce, data, self._header)
+
+    def decrypt(self, blob: bytes) -> bytes:
+        """Plaintext of an envelope or Fernet token; other blobs are returned unchanged."""
+        if is_envelope(blob):
+            header = blob[:HEADER_BYTES]
+            key = self._by_id.get(header[2:])
+            if header[1:2] != AES_GCM or key is None:
+                raise DecryptionError("unknown_key", f"no key for envelope {header.hex()}")
+            nonce = blob[HEADER_BYTES : HEADER_BYTES + NONCE_BYTES]
+            try:
+                return key.aead.decrypt(nonce, blob[HEADER_BYTES + NONCE_BYTES :], header)
+            except InvalidTag:
+                raise DecryptionError("invalid", "envelope failed authentication") from None
+        if is_fernet_token(blob) and self._keys:
+            for key in self._keys:
+                try:
+                    return key.fernet.decrypt(blob)
+                except InvalidToken:
+                    continue
+            raise DecryptionError("invalid", "Fernet token matches no configured key")
+        return blob
+
+    def is_current(self, blob: bytes) -> bool:
+        """Whether ``blob`` is encrypted under the active key (always, with no keys)."""
+        return self._header is None or blob[:HEADER_BYTES] == self._header
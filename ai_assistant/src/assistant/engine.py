@@ -1,70 +1,424 @@
 from __future__ import annotations
 
 import asyncio
-import json
-from typing import Any, Dict, List
+import time
+from contextlib import contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
 
-from .config import load_settings
+from . import tracing
+
+from .completion_cache import BYPASS, HIT, MISS, CachingProvider, fingerprint
+from .config import Settings, get_settings
+from .context import ContextAssembler
 from .memory import ConversationMemory
-from .tools import call_tool, export_tool_schemas_for_openai
+from .metrics import (
+    MEMORY_LATENCY,
+    PROVIDER_CALLS,
+    PROVIDER_IN_FLIGHT,
+    PROVIDER_LATENCY,
+    PROVIDER_TIME_TO_FIRST_TOKEN,
+    PROVIDER_TOKENS,
+)
+from .profiling import Profiler, StackSampler
+from .single_flight import SingleFlight
+from .tokens import count_tokens
+from .tools import ToolRunner, export_tool_schemas_for_openai
+
+
+# Profiles attached to spans are cut to this size; exported files are complete.
+_MAX_PROFILE_ATTRIBUTE = 64 * 1024
+
+
+def _token_counts(
+    messages: List[Dict[str, Any]], content: str, usage: Optional[Dict[str, int]]
+) -> Tuple[int, int]:
+    if usage:
+        return usage["prompt_tokens"], usage["completion_tokens"]
+    # e.g. the local provider: estimate
+    prompt = sum(count_tokens(m["content"]) for m in messages if isinstance(m.get("content"), str))
+    return prompt, count_tokens(content)
+
+
+@contextmanager
+def _timed_memory(op: str, parent: Any, **attributes: Any) -> Iterator[Any]:
+    start = time.perf_counter()
+    try:
+        with tracing.span(f"memory.{op}", parent, attributes) as current:
+            yield current
+    finally:
+        MEMORY_LATENCY.labels(op=op).observe(time.perf_counter() - start)
+
+
+class _ProviderCall:
+    """Metrics for one upstream provider call. Completion cache hits are not counted."""
+
+    def __init__(self, provider: str, model: str, kind: str) -> None:
+        self.provider, self.model, self.kind = provider, model, kind
+        self.cached = False
+        self.started: Optional[float] = None
+        self.first_chunk: Optional[float] = None
+
+    def __enter__(self) -> "_ProviderCall":
+        PROVIDER_IN_FLIGHT.labels(provider=self.provider).inc()
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type: Any, exc: Any, tb: Any) -> None:
+        PROVIDER_IN_FLIGHT.labels(provider=self.provider).dec()
+        if self.cached:
+            return
+        if exc_type is None:
+            outcome = "ok"
+        elif issubclass(exc_type, (asyncio.CancelledError, GeneratorExit)):
+            outcome = "cancelled"
+        else:
+            outcome = "error"
+        elapsed = time.perf_counter() - (self.started or 0.0)
+        PROVIDER_LATENCY.labels(self.provider, self.model, self.kind).observe(elapsed)
+        PROVIDER_CALLS.labels(self.provider, self.model, self.kind, outcome).inc()
+
+    def chunk(self, chunk: Dict[str, Any]) -> None:
+        if self.first_chunk is not None:
+            return
+        self.first_chunk = time.perf_counter()
+        self.cached = chunk.get("cache") == HIT
+        if not self.cached:
+            ttft = self.first_chunk - (self.started or 0.0)
+            PROVIDER_TIME_TO_FIRST_TOKEN.labels(self.provider, self.model).observe(ttft)
+
+    def tokens(self, messages: List[Dict[str, Any]], content: str, usage: Any) -> None:
+        if self.cached:
+            return
+        prompt, completion = _token_counts(messages, content, usage)
+        PROVIDER_TOKENS.labels(self.provider, self.model, "prompt").inc(prompt)
+        PROVIDER_TOKENS.labels(self.provider, self.model, "completion").inc(completion)
 
 
 class AssistantEngine:
-    def __init__(self, session_id: str = "default") -> None:
-        self.settings = load_settings()
-        self.memory = ConversationMemory(self.settings.assistant_db_path)
+    """Per-session chat handle.
+
+    Standalone use (CLI) builds its own settings, memory and provider; the server
+    passes shared components from ``AssistantRegistry`` so construction is cheap.
+    """
+
+    def __init__(
+        self,
+        session_id: str = "default",
+        *,
+        settings: Optional[Settings] = None,
+        memory: Optional[Any] = None,
+        provider: Any = None,
+        tool_schemas: Optional[List[Dict[str, Any]]] = None,
+        context: Optional[ContextAssembler] = None,
+        tool_runner: Optional[ToolRunner] = None,
+        single_flight: Optional[SingleFlight] = None,
+        profiler: Optional[Profiler] = None,
+    ) -> None:
+        self.settings = settings or get_settings()
+        self.memory = memory or ConversationMemory(self.settings.assistant_db_path)
         self.session_id = session_id
-        self.provider = self._init_provider()
+        self.provider = provider or self._init_provider()
+        self.tool_schemas = tool_schemas
+        self.context = context or self._init_context()
+        self.tool_runner = tool_runner or self._init_tool_runner()
+        self.single_flight = single_flight
+        self.profiler = profiler
+        # Completion cache result of the last turn (HIT, MISS, BYPASS), None without a cache.
+        self.cache_status: Optional[str] = None
+        # Id of the last turn's stack profile, None if it was not profiled.
+        self.profile_id: Optional[str] = None
+        self._trace_root: Any = None
 
     def _init_provider(self):
-        # Prefer OpenAI if configured
-        if self.settings.openai_api_key:
-            from .model_providers.openai_provider import OpenAIProvider
-
-            return OpenAIProvider(self.settings.openai_api_key, self.settings.openai_model)
-        # Then Ollama if configured
-        if self.settings.ollama_host:
-            from .model_providers.ollama_provider import OllamaProvider
-
-            return OllamaProvider(self.settings.ollama_host, self.settings.ollama_model)
-        # Fallback to local provider that runs without external deps
-        from .model_providers.local_provider import LocalEchoProvider
-
-        return LocalEchoProvider()
-
-    async def chat_once(self, user_message: str) -> str:
-        self.memory.append(self.session_id, "user", user_message)
-        messages = self.memory.fetch(self.session_id)
-
-        tools = export_tool_schemas_for_openai()
-        response = await self.provider.generate(messages=messages, tools=tools, tool_choice="auto")
-
-        content = response.get("content") or ""
-        tool_calls = response.get("tool_calls")
-
-        final_content = content
-        if tool_calls:
-            tool_messages: List[Dict[str, Any]] = []
-            for call in tool_calls:
-                name = call.get("name")
-                args_json = call.get("arguments") or "{}"
-                try:
-                    result = call_tool(name, args_json)
-                    result_str = json.dumps(result)
-                except Exception as exc:
-                    result_str = json.dumps({"error": str(exc)})
-                tool_messages.append(
-                    {
-                        "role": "tool",
-                        "tool_call_id": call.get("id", name),
-                        "name": name,
-                        "content": result_str,
-                    }
+        from .registry import build_provider
+
+        return build_provider(self.settings)
+
+    def _init_context(self) -> ContextAssembler:
+        from .registry import build_context
+
+        return build_context(self.settings, self.memory, self.provider)
+
+    def _init_tool_runner(self) -> ToolRunner:
+        from .registry import build_tool_runner
+
+        return build_tool_runner(self.settings)
+
+    async def _run_tools(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        results = await self.tool_runner.run(tool_calls)
+        return [
+            {
+                "role": "tool",
+                "tool_call_id": call.get("id") or call.get("name"),
+                "name": call.get("name"),
+                "content": result,
+            }
+            for call, result in zip(tool_calls, results)
+        ]
+
+    def _call_options(self, temperature: Optional[float], cache: Optional[bool]) -> Dict[str, Any]:
+        options: Dict[str, Any] = {"timeout": self.settings.provider_timeout_seconds}
+        if temperature is not None:
+            options["temperature"] = temperature
+        if cache is not None and isinstance(self.provider, CachingProvider):
+            options["cache"] = cache
+        return options
+
+    def _flight_key(self, kind: str, call: Dict[str, Any]) -> str:
+        # Resent messages show up as repeats in the history, so they are collapsed.
+        key = fingerprint(
+            getattr(self.provider, "model", None),
+            call["messages"],
+            call.get("tools"),
+            call.get("tool_choice"),
+            call.get("temperature", -1.0),  # -1: the provider's default
+            collapse_repeats=True,
+        )
+        return f"{kind}:{call.get('cache')}:{key}"
+
+    def _provider_call(self, kind: str) -> _ProviderCall:
+        provider = self.provider
+        name = getattr(provider, "name", None) or type(provider).__name__.lower()
+        return _ProviderCall(name, str(getattr(provider, "model", None) or "default"), kind)
+
+    async def _upstream_generate(self, call: Dict[str, Any]) -> Dict[str, Any]:
+        # Runs once per upstream call: single-flight followers share the result
+        # without coming through here, so tokens are not counted twice.
+        with self._provider_call("generate") as observed:
+            response = await self.provider.generate(**call)
+            observed.cached = response.get("cache") == HIT
+        observed.tokens(call["messages"], response.get("content") or "", response.get("usage"))
+        return response
+
+    async def _upstream_stream(self, call: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        parts: List[str] = []
+        usage = None
+        with self._provider_call("stream") as observed:
+            async for chunk in self.provider.stream(**call):
+                observed.chunk(chunk)
+                parts.append(chunk.get("content") or "")
+                usage = chunk.get("usage") or usage
+                yield chunk
+        observed.tokens(call["messages"], "".join(parts), usage)
+
+    def _span_labels(self) -> Dict[str, Any]:
+        provider = self.provider
+        return {
+            "llm.provider": getattr(provider, "name", None) or type(provider).__name__.lower(),
+            "llm.model": getattr(provider, "model", None),
+        }
+
+    def _trace_response(self, current: Any, call: Dict[str, Any], response: Dict[str, Any]) -> None:
+        if current is None or not current.is_recording():
+            return
+        prompt, completion = _token_counts(
+            call["messages"], response.get("content") or "", response.get("usage")
+        )
+        attributes = {
+            "llm.usage.prompt_tokens": prompt,
+            "llm.usage.completion_tokens": completion,
+            "llm.tool_calls": len(response.get("tool_calls") or []),
+            "llm.cache": response.get("cache"),
+        }
+        tracing.set_attributes(current, attributes)
+
+    async def _generate(self, **call: Any) -> Dict[str, Any]:
+        with tracing.span("provider.generate", self._trace_root, self._span_labels()) as current:
+            if self.single_flight is None:
+                response = await self._upstream_generate(call)
+            else:
+                key = self._flight_key("generate", call)
+                response = await self.single_flight.do(key, lambda: self._upstream_generate(call))
+            self._trace_response(current, call, response)
+            return response
+
+    async def _stream(self, **call: Any) -> AsyncIterator[Dict[str, Any]]:
+        if self.single_flight is None:
+            chunks = self._upstream_stream(call)
+        else:
+            key = self._flight_key("stream", call)
+            chunks = self.single_flight.stream(key, lambda: self._upstream_stream(call))
+        with tracing.span("provider.stream", self._trace_root, self._span_labels()) as current:
+            start = time.perf_counter()
+            parts: List[str] = []
+            last: Dict[str, Any] = {}
+            async for chunk in chunks:
+                if not parts and current is not None:
+                    ttft_ms = (time.perf_counter() - start) * 1000
+                    tracing.set_attributes(current, {"llm.time_to_first_token_ms": ttft_ms})
+                parts.append(chunk.get("content") or "")
+                last = {**last, **{k: v for k, v in chunk.items() if v is not None}}
+                yield chunk
+            self._trace_response(current, call, {**last, "content": "".join(parts)})
+
+    async def _run_tools_traced(self, tool_calls: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        # ToolRunner starts a "tool.call" span per call under the current span.
+        with tracing.use(self._trace_root):
+            return await self._run_tools(tool_calls)
+
+    def _start_profile(self, requested: Optional[bool]) -> Optional[StackSampler]:
+        self.profile_id = None
+        if self.profiler is None or not self.profiler.wanted(requested):
+            return None
+        return self.profiler.start()
+
+    def _finish_profile(self, root: Any, sampler: Optional[StackSampler]) -> None:
+        if sampler is None or self.profiler is None:
+            return
+        folded = sampler.stop()
+        context = root.get_span_context() if root is not None else None
+        if context is not None and context.is_valid:
+            self.profile_id = format(context.trace_id, "032x")
+        else:
+            self.profile_id = f"{self.session_id}-{int(time.time() * 1000)}"
+        path = self.profiler.export(self.profile_id, folded)
+        attributes = {
+            "profile.id": self.profile_id,
+            "profile.samples": sum(sampler.samples.values()),
+            "profile.folded": folded[:_MAX_PROFILE_ATTRIBUTE],
+            "profile.path": str(path) if path else None,
+        }
+        tracing.set_attributes(root, attributes)
+
+    @contextmanager
+    def _turn(self, name: str, profile: Optional[bool]) -> Iterator[Any]:
+        """Root span of one chat turn; stage spans hang off ``self._trace_root``."""
+        attributes = {"assistant.session_id": self.session_id, **self._span_labels()}
+        sampler = self._start_profile(profile)
+        with tracing.span(name, attributes=attributes) as root:
+            self._trace_root = root
+            try:
+                yield root
+            finally:
+                self._finish_profile(root, sampler)
+                tracing.set_attributes(root, {"assistant.cache": self.cache_status})
+                self._trace_root = None
+
+    def _record_cache(self, statuses: List[Optional[str]]) -> None:
+        # A turn counts as a hit only if every provider call in it was served from cache.
+        if not statuses or None in statuses:
+            self.cache_status = None
+        elif all(status == HIT for status in statuses):
+            self.cache_status = HIT
+        elif all(status == BYPASS for status in statuses):
+            self.cache_status = BYPASS
+        else:
+            self.cache_status = MISS
+
+    async def _followup_messages(
+        self, messages: List[Dict[str, Any]], content: str, tool_calls: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        # Tool results must follow the assistant turn that requested them.
+        assistant_turn = {
+            "role": "assistant",
+            "content": content or None,
+            "tool_calls": [
+                {
+                    "id": call.get("id") or call.get("name"),
+                    "type": "function",
+                    "function": {
+                        "name": call.get("name"),
+                        "arguments": call.get("arguments") or "{}",
+                    },
+                }
+                for call in tool_calls
+            ],
+        }
+        return messages + [assistant_turn] + await self._run_tools_traced(tool_calls)
+
+    async def chat_once(
+        self,
+        user_message: str,
+        *,
+        temperature: Optional[float] = None,
+        cache: Optional[bool] = None,
+        profile: Optional[bool] = None,
+    ) -> str:
+        """One turn. ``profile=True`` asks for a stack profile (see ``Profiler``)."""
+        with self._turn("assistant.chat", profile) as root:
+            with _timed_memory("append", root, **{"assistant.role": "user"}):
+                await self.memory.aappend(self.session_id, "user", user_message)
+            with _timed_memory("fetch", root) as fetch:
+                messages = await self.context.assemble(self.session_id)
+                tracing.set_attributes(fetch, {"assistant.messages": len(messages)})
+
+            tools = self.tool_schemas or export_tool_schemas_for_openai()
+            options = self._call_options(temperature, cache)
+            response = await self._generate(
+                messages=messages, tools=tools, tool_choice="auto", **options
+            )
+
+            content = response.get("content") or ""
+            tool_calls = response.get("tool_calls")
+            statuses = [response.get("cache")]
+
+            final_content = content
+            if tool_calls:
+                # Append tool messages and ask model to finalize
+                follow_resp = await self._generate(
+                    messages=await self._followup_messages(messages, content, tool_calls),
+                    tools=None,
+                    **options,
                 )
-            # Append tool messages and ask model to finalize
-            followup_messages = messages + ([{"role": "assistant", "content": content}] if content else []) + tool_messages
-            follow_resp = await self.provider.generate(messages=followup_messages, tools=None)
-            final_content = follow_resp.get("content") or content or ""
+                final_content = follow_resp.get("content") or content or ""
+                statuses.append(follow_resp.get("cache"))
+            self._record_cache(statuses)
+
+            with _timed_memory("append", root, **{"assistant.role": "assistant"}):
+                await self.memory.aappend(self.session_id, "assistant", final_content)
+            return final_content
+
+    async def stream_once(
+        self,
+        user_message: str,
+        *,
+        temperature: Optional[float] = None,
+        cache: Optional[bool] = None,
+        profile: Optional[bool] = None,
+    ) -> AsyncIterator[str]:
+        """Like ``chat_once`` but yield content deltas as the provider produces them.
+
+        Deltas from the tool-call follow-up round are yielded too; the assembled
+        reply is persisted once the stream completes.
+        """
+        with self._turn("assistant.stream", profile) as root:
+            with _timed_memory("append", root, **{"assistant.role": "user"}):
+                await self.memory.aappend(self.session_id, "user", user_message)
+            with _timed_memory("fetch", root) as fetch:
+                messages = await self.context.assemble(self.session_id)
+                tracing.set_attributes(fetch, {"assistant.messages": len(messages)})
+
+            tools = self.tool_schemas or export_tool_schemas_for_openai()
+            options = self._call_options(temperature, cache)
+            parts: List[str] = []
+            tool_calls = None
+            statuses: List[Optional[str]] = [None]
+            async for chunk in self._stream(
+                messages=messages, tools=tools, tool_choice="auto", **options
+            ):
+                statuses[-1] = chunk.get("cache")
+                if chunk.get("content"):
+                    parts.append(chunk["content"])
+                    yield chunk["content"]
+                if chunk.get("tool_calls"):
+                    tool_calls = chunk["tool_calls"]
+
+            content = "".join(parts)
+            final_content = content
+            if tool_calls:
+                follow_parts: List[str] = []
+                statuses.append(None)
+                async for chunk in self._stream(
+                    messages=await self._followup_messages(messages, content, tool_calls),
+                    tools=None,
+                    **options,
+                ):
+                    statuses[-1] = chunk.get("cache")
+                    if chunk.get("content"):
+                        follow_parts.append(chunk["content"])
+                        yield chunk["content"]
+                final_content = "".join(follow_parts) or content
+            self._record_cache(statuses)
 
-        self.memory.append(self.session_id, "assistant", final_content)
-        return final_content
\ No newline at end of file
+            with _timed_memory("append", root, **{"assistant.role": "assistant"}):
+                await self.memory.aappend(self.session_id, "assistant", final_content)
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .metrics import (
+    HISTORY_CACHE_BYTES,
+    HISTORY_CACHE_ENTRIES,
+    HISTORY_CACHE_EVICTIONS,
+    HISTORY_CACHE_HITS,
+    HISTORY_CACHE_MISSES,
+)
+
+# (id, role, content, tokens)
+Row = Tuple[int, str, str, int]
+
+# Rough per-row bookkeeping cost on top of the content itself.
+_ROW_OVERHEAD = 64
+
+
+class _Entry:
+    __slots__ = ("rows", "complete", "loading", "size", "touched")
+
+    def __init__(self, loading: bool) -> None:
+        self.rows: List[Row] = []
+        # True when ``rows`` holds the session's entire history.
+        self.complete = False
+        self.loading = loading
+        self.size = 0
+        self.touched = time.monotonic()
+
+
+class HistoryCache:
+    """Recent decoded history per session, kept in sync by the memory store.
+
+    Entries are bounded by count and total size and evicted LRU-first or after
+    ``ttl`` seconds without access. ``ConversationMemory`` writes new rows through
+    after they commit; a load registers its entry before reading the database so
+    rows committed during the read are merged instead of lost.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 10_000,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl: float = 900.0,
+        rows_per_session: int = 200,
+    ) -> None:
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.rows_per_session = rows_per_session
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, session_id: str, limit: int) -> Optional[List[Row]]:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            now = time.monotonic()
+            if entry is not None and not entry.loading and now - entry.touched > self.ttl:
+                self._drop(session_id, "ttl")
+                entry = None
+            if entry is None or entry.loading or (len(entry.rows) < limit and not entry.complete):
+                HISTORY_CACHE_MISSES.inc()
+                return None
+            entry.touched = now
+            self._entries.move_to_end(session_id)
+            HISTORY_CACHE_HITS.inc()
+            return entry.rows[-limit:]
+
+    def begin_load(self, session_id: str) -> bool:
+        """Reserve an entry before reading the database; False if another load is running."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and entry.loading:
+                return False
+            if entry is not None:
+                self._drop(session_id, None)
+            self._entries[session_id] = _Entry(loading=True)
+            return True
+
+    def finish_load(self, session_id: str, rows: List[Row], complete: bool) -> None:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is None or not entry.loading:
+                return  # invalidated while loading
+            merged = {row[0]: row for row in rows}
+            merged.update((row[0], row) for row in entry.rows)
+            entry.rows = [merged[row_id] for row_id in sorted(merged)]
+            entry.complete = complete
+            entry.loading = False
+            self._resize(entry)
+            self._evict()
+
+    def abort_load(self, session_id: str) -> None:
+        with self._lock:
+            entry = self._entries.get(session_id)
+            if entry is not None and entry.loading:
+                self._drop(session_id, None)
+
+    def extend(self, rows: Iterable[Tuple[str, int, str, str, int]]) -> None:
+        """Write through committed ``(session_id, id, role, content, tokens)`` rows."""
+        with self._lock:
+            for session_id, row_id, role, content, tokens in rows:
+                entry = self._entries.get(session_id)
+                if entry is None or (entry.rows and entry.rows[-1][0] >= row_id):
+                    continue
+                entry.rows.append((row_id, role, content, tokens))
+                entry.size += len(content) + _ROW_OVERHEAD
+                self._bytes += len(content) + _ROW_OVERHEAD
+                if not entry.loading:
+                    entry.touched = time.monotonic()
+                    self._entries.move_to_end(session_id)
+                    self._resize(entry)
+            self._evict()
+
+    def invalidate(self, session_id: Optional[str] = None) -> None:
+        with self._lock:
+            targets = [session_id] if session_id is not None else list(self._entries)
+            for key in targets:
+                if key in self._entries:
+                    self._drop(key, "invalidate")
+
+    def _resize(self, entry: _Entry) -> None:
+        if len(entry.rows) > self.rows_per_session:
+            entry.rows = entry.rows[-self.rows_per_session :]
+            entry.complete = False
+        size = sum(len(row[2]) + _ROW_OVERHEAD for row in entry.rows)
+        self._bytes += size - entry.size
+        entry.size = size
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if not entry.loading and now - entry.touched > self.ttl:
+                self._drop(key, "ttl")
+            elif len(self._entries) > self.max_sessions or self._bytes > self.max_bytes:
+                self._drop(key, "lru")
+            else:
+                break
+        HISTORY_CACHE_ENTRIES.set(len(self._entries))
+        HISTORY_CACHE_BYTES.set(self._bytes)
+
+    def _drop(self, session_id: str, reason: Optional[str]) -> None:
+        entry = self._entries.pop(session_id)
+        self._bytes -= entry.size
+        if reason is not None:
+            HISTORY_CACHE_EVICTIONS.labels(reason=reason).inc()
+
+    def stats(self) -> Dict[str, int]:
+        return {"sessions": len(self._entries), "bytes": self._bytes}
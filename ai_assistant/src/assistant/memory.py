@@ -1,76 +1,669 @@
 from __future__ import annotations
 
-import base64
+import asyncio
+import logging
 import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
-import os
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
 
 try:
-    from cryptography.fernet import Fernet
-except Exception:  # pragma: no cover
-    Fernet = None  # type: ignore
+    import fcntl
+except ImportError:  # pragma: no cover - Windows: prunes are not serialized across processes
+    fcntl = None  # type: ignore[assignment]
+
+from .compression import Compressor, DecompressionError
+from .encryption import DecryptionError, MemoryCipher
+from .history_cache import HistoryCache, Row
+from .metrics import (
+    MEMORY_COMPRESSION_BYTES,
+    MEMORY_DECRYPT_FAILURES,
+    MEMORY_PRUNED,
+    MEMORY_RECLAIMED_BYTES,
+    MEMORY_REENCRYPTED,
+)
+from .tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version.
+# Never edit a shipped entry; append a new one instead.
+MIGRATIONS: List[str] = [
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        session_id TEXT NOT NULL,
+        role TEXT NOT NULL,
+        content BLOB NOT NULL,
+        created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_messages_session_id ON messages (session_id, id)",
+    # Token count of the plaintext content, computed once at insert time.
+    "ALTER TABLE messages ADD COLUMN tokens INTEGER",
+    # Rolling summary of everything up to and including upto_id.
+    """
+    CREATE TABLE IF NOT EXISTS summaries (
+        session_id TEXT PRIMARY KEY,
+        upto_id INTEGER NOT NULL,
+        content BLOB NOT NULL,
+        tokens INTEGER NOT NULL
+    )
+    """,
+    # Provider responses cached by request fingerprint (see completion_cache.py).
+    """
+    CREATE TABLE IF NOT EXISTS completion_cache (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires_at REAL NOT NULL,
+        created_at REAL NOT NULL
+    )
+    """,
+]
+
+# Per-connection tuning. WAL lets readers proceed while a writer commits and
+# synchronous=NORMAL is durable across application crashes in WAL mode.
+PRAGMAS: List[str] = [
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+]
+
+# Statements are kept as module constants so sqlite3's per-connection statement
+# cache reuses the prepared form.
+INSERT_MESSAGE = "INSERT INTO messages (session_id, role, content, tokens) VALUES (?, ?, ?, ?)"
+SELECT_RECENT = (
+    "SELECT id, role, content, tokens FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?"
+)
+SELECT_BETWEEN = (
+    "SELECT id, role, content, tokens FROM messages "
+    "WHERE session_id = ? AND id > ? AND id < ? ORDER BY id LIMIT ?"
+)
+SELECT_NEWEST = "SELECT content FROM messages ORDER BY id DESC LIMIT ?"
+# Keyset pages for exports: "id > last seen id" costs the same on every page, unlike OFFSET.
+SELECT_PAGE = (
+    "SELECT id, session_id, role, content, tokens, created_at FROM messages "
+    "WHERE id > ? ORDER BY id LIMIT ?"
+)
+SELECT_SESSION_PAGE = (
+    "SELECT id, session_id, role, content, tokens, created_at FROM messages "
+    "WHERE session_id = ? AND id > ? ORDER BY id LIMIT ?"
+)
+SELECT_SUMMARY = "SELECT upto_id, content, tokens FROM summaries WHERE session_id = ?"
+UPSERT_SUMMARY = (
+    "INSERT INTO summaries (session_id, upto_id, content, tokens) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (session_id) DO UPDATE SET "
+    "upto_id = excluded.upto_id, content = excluded.content, tokens = excluded.tokens"
+)
+
+SELECT_COMPLETION = "SELECT value FROM completion_cache WHERE key = ? AND expires_at > ?"
+UPSERT_COMPLETION = (
+    "INSERT INTO completion_cache (key, value, expires_at, created_at) VALUES (?, ?, ?, ?) "
+    "ON CONFLICT (key) DO UPDATE SET "
+    "value = excluded.value, expires_at = excluded.expires_at, created_at = excluded.created_at"
+)
+# Tables holding encrypted blobs, as (table, blob column).
+ENCRYPTED_COLUMNS: List[Tuple[str, str]] = [
+    ("messages", "content"),
+    ("summaries", "content"),
+    ("completion_cache", "value"),
+]
+
+PRUNE_COMPLETIONS = (
+    "DELETE FROM completion_cache WHERE expires_at <= ? OR key IN "
+    "(SELECT key FROM completion_cache WHERE expires_at > ? "
+    "ORDER BY created_at DESC LIMIT -1 OFFSET ?)"
+)
+
+# Retention. Ids grow with created_at, so "older than" is an id range and no
+# index on created_at is needed.
+SELECT_MESSAGE_FROM = "SELECT id, created_at FROM messages WHERE id >= ? ORDER BY id LIMIT 1"
+SELECT_IDLE_SESSIONS = (
+    "SELECT session_id FROM messages GROUP BY session_id HAVING MAX(id) <= ? LIMIT ?"
+)
+SELECT_LONG_SESSIONS = "SELECT session_id FROM messages GROUP BY session_id HAVING COUNT(*) > ?"
+SELECT_NTH_NEWEST = "SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT 1 OFFSET ?"
+SELECT_SESSION_UPTO = (
+    "SELECT id, session_id FROM messages WHERE session_id = ? AND id <= ? ORDER BY id LIMIT ?"
+)
+ARCHIVE_SESSION_UPTO = (
+    "SELECT id, session_id, role, content, tokens, created_at FROM messages "
+    "WHERE session_id = ? AND id <= ? ORDER BY id LIMIT ?"
+)
+SELECT_UPTO = "SELECT id, session_id FROM messages WHERE id <= ? ORDER BY id LIMIT ?"
+DELETE_MESSAGE = "DELETE FROM messages WHERE id = ?"
+DELETE_ORPHAN_SUMMARY = (
+    "DELETE FROM summaries WHERE session_id = ? "
+    "AND NOT EXISTS (SELECT 1 FROM messages WHERE session_id = ?)"
+)
+
+
+def migrate(conn: sqlite3.Connection) -> None:
+    """Bring the database behind ``conn`` up to the current schema."""
+    # IMMEDIATE takes the write lock up front so concurrent processes migrate once.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        for number, statement in enumerate(MIGRATIONS[version:], start=version + 1):
+            conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {number}")
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+
+
+def restore_marker_path(db_path: str) -> Path:
+    return Path(f"{db_path}-restored")
+
+
+def mark_restored(db_path: str) -> None:
+    """Tell every ``ConversationMemory`` on ``db_path`` that the file was replaced.
+
+    Processes notice the changed marker on their next read and drop cached
+    history and open connections.
+    """
+    restore_marker_path(db_path).write_text(uuid.uuid4().hex, encoding="utf-8")
 
 
 class ConversationMemory:
-    def __init__(self, db_path: str) -> None:
+    def __init__(
+        self,
+        db_path: str,
+        cache: Optional[HistoryCache] = None,
+        cipher: Optional[MemoryCipher] = None,
+        compressor: Optional[Compressor] = None,
+    ) -> None:
         self.db_path = db_path
+        self.cache = cache
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._generation = 0
+        self._schema_generation = 0
+        self._restore_marker = restore_marker_path(db_path)
+        self._restore_seen = self._restore_stamp()
         self._ensure_tables()
-        self._fernet = self._init_fernet()
-
-    def _init_fernet(self):
-        key_b64 = os.getenv("ASSISTANT_MEMORY_ENCRYPTION_KEY")
-        if not key_b64 or not Fernet:
-            return None
-        try:
-            return Fernet(key_b64.encode("utf-8"))
-        except Exception:
-            return None
+        # Keys come from ASSISTANT_MEMORY_ENCRYPTION_KEY (and _OLD_KEYS) unless given.
+        self.cipher = cipher if cipher is not None else MemoryCipher.from_env()
+        # Without one, nothing new is compressed but compressed rows still read.
+        self.compressor = compressor if compressor is not None else Compressor()
 
     def _encode(self, text: str) -> bytes:
+        # Compress first: ciphertext doesn't compress.
         data = text.encode("utf-8")
-        if self._fernet:
-            return self._fernet.encrypt(data)
-        return data
+        frame = self.compressor.compress(data)
+        MEMORY_COMPRESSION_BYTES.labels(stage="raw").inc(len(data))
+        MEMORY_COMPRESSION_BYTES.labels(stage="stored").inc(len(frame))
+        return self.cipher.encrypt(frame)
 
     def _decode(self, blob: bytes) -> str:
-        data = blob
-        if self._fernet:
-            try:
-                data = self._fernet.decrypt(blob)
-            except Exception:
-                pass
+        try:
+            data = self.compressor.decompress(self.cipher.decrypt(blob))
+        except DecryptionError as exc:
+            # One unreadable row should not take the whole session down with it.
+            MEMORY_DECRYPT_FAILURES.labels(reason=exc.reason).inc()
+            logger.error("could not decrypt a stored message: %s", exc)
+            return ""
+        except DecompressionError as exc:
+            MEMORY_DECRYPT_FAILURES.labels(reason="decompress").inc()
+            logger.error("could not decompress a stored message: %s", exc)
+            return ""
         return data.decode("utf-8", errors="replace")
 
+    def _conn(self) -> sqlite3.Connection:
+        # One long-lived connection per thread; sqlite3 connections must not be
+        # used concurrently, and WAL lets the per-thread connections read in parallel.
+        # A bumped generation (see ``invalidate``) makes each thread reopen its own.
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.generation != self._generation:
+            with self._connections_lock:
+                if conn in self._connections:
+                    self._connections.remove(conn)
+            conn.close()
+            conn = None
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, check_same_thread=False, cached_statements=64)
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+            self._local.generation = self._generation
+            with self._connections_lock:
+                self._connections.append(conn)
+            if self._schema_generation != self._generation:
+                # Reopened after ``invalidate``: a restored file may predate the schema.
+                self._schema_generation = self._generation
+                migrate(conn)
+        return conn
+
     def _ensure_tables(self) -> None:
         Path(self.db_path).parent.mkdir(parents=True, exist_ok=True)
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                """
-                CREATE TABLE IF NOT EXISTS messages (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    session_id TEXT NOT NULL,
-                    role TEXT NOT NULL,
-                    content BLOB NOT NULL,
-                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP
-                )
-                """
-            )
-            conn.commit()
+        conn = self._conn()
+        # Only takes effect on a new file; older stores switch with ``enable_incremental_vacuum``.
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("PRAGMA journal_mode = WAL")
+        migrate(conn)
+
+    def _restore_stamp(self) -> Optional[int]:
+        try:
+            return self._restore_marker.stat().st_mtime_ns
+        except OSError:
+            return None
+
+    def _check_restored(self) -> None:
+        # One stat() per read; cheap next to a query and keeps cross-process restores safe.
+        stamp = self._restore_stamp()
+        if stamp != self._restore_seen:
+            self._restore_seen = stamp
+            self.invalidate()
+
+    def invalidate(self) -> None:
+        """Forget cached history and reopen connections, e.g. after a restore."""
+        self._generation += 1
+        if self.cache is not None:
+            self.cache.invalidate()
+
+    def schema_version(self) -> int:
+        return int(self._conn().execute("PRAGMA user_version").fetchone()[0])
 
     def append(self, session_id: str, role: str, content: str) -> None:
-        with sqlite3.connect(self.db_path) as conn:
-            conn.execute(
-                "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
-                (session_id, role, self._encode(content)),
-            )
-            conn.commit()
+        self.append_many([(session_id, role, content, None)])
+
+    def append_many(
+        self,
+        rows: Sequence[Tuple[str, str, str, Optional[int]]],
+        before_commit: Optional[Callable[[List[int]], None]] = None,
+    ) -> List[int]:
+        """Insert ``(session_id, role, content, tokens)`` rows in one transaction.
+
+        ``tokens`` may be None to have it counted here. ``before_commit`` receives the
+        new row ids while the transaction is still open.
+        """
+        self._check_restored()
+        counted = [
+            (session_id, role, content, count_tokens(content) if tokens is None else tokens)
+            for session_id, role, content, tokens in rows
+        ]
+        conn = self._conn()
+        with conn:
+            ids = [
+                conn.execute(
+                    INSERT_MESSAGE, (session_id, role, self._encode(content), tokens)
+                ).lastrowid
+                for session_id, role, content, tokens in counted
+            ]
+            if before_commit is not None:
+                before_commit(ids)
+        if self.cache is not None:
+            self.cache.extend((s, i, r, c, t) for i, (s, r, c, t) in zip(ids, counted))
+        return ids
+
+    def fetch_rows(self, session_id: str, limit: int = 50) -> List[Row]:
+        """Return the latest ``(id, role, content, tokens)`` rows of a session, oldest first."""
+        self._check_restored()
+        if self.cache is None:
+            return self._read_rows(session_id, limit)
+        cached = self.cache.get(session_id, limit)
+        if cached is not None:
+            return cached
+        if not self.cache.begin_load(session_id):
+            return self._read_rows(session_id, limit)
+        try:
+            rows = self._read_rows(session_id, limit)
+        except BaseException:
+            self.cache.abort_load(session_id)
+            raise
+        self.cache.finish_load(session_id, rows, complete=len(rows) < limit)
+        return rows
+
+    def _read_rows(self, session_id: str, limit: int) -> List[Row]:
+        rows: List[Tuple[Any, ...]] = (
+            self._conn().execute(SELECT_RECENT, (session_id, limit)).fetchall()
+        )
+        return self._decode_rows(reversed(rows))
+
+    def fetch_rows_between(
+        self, session_id: str, after_id: int, before_id: int, limit: int = 50
+    ) -> List[Row]:
+        """Rows with ``after_id < id < before_id``, oldest first, at most ``limit`` of them."""
+        self._check_restored()
+        params = (session_id, after_id, before_id, limit)
+        return self._decode_rows(self._conn().execute(SELECT_BETWEEN, params).fetchall())
+
+    def _decode_rows(self, rows: Iterable[Tuple[Any, ...]]) -> List[Row]:
+        decoded = []
+        for row_id, role, content, tokens in rows:
+            text = self._decode(content)
+            # Rows written before token counts were stored are counted on read.
+            decoded.append((row_id, role, text, count_tokens(text) if tokens is None else tokens))
+        return decoded
 
     def fetch(self, session_id: str, limit: int = 50) -> List[Dict[str, Any]]:
-        with sqlite3.connect(self.db_path) as conn:
-            rows: List[Tuple[Any, ...]] = conn.execute(
-                "SELECT role, content FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?",
-                (session_id, limit),
-            ).fetchall()
-        messages = [{"role": role, "content": self._decode(content)} for role, content in reversed(rows)]
-        return messages
\ No newline at end of file
+        return [
+            {"role": role, "content": content}
+            for _id, role, content, _tokens in self.fetch_rows(session_id, limit)
+        ]
+
+    def get_summary(self, session_id: str) -> Optional[Tuple[int, str, int]]:
+        """Return ``(upto_id, content, tokens)`` of the session's rolling summary."""
+        self._check_restored()
+        row = self._conn().execute(SELECT_SUMMARY, (session_id,)).fetchone()
+        if row is None:
+            return None
+        upto_id, content, tokens = row
+        return upto_id, self._decode(content), tokens
+
+    def put_summary(self, session_id: str, upto_id: int, content: str, tokens: int) -> None:
+        conn = self._conn()
+        with conn:
+            conn.execute(UPSERT_SUMMARY, (session_id, upto_id, self._encode(content), tokens))
+
+    def get_completion(self, key: str, now: float) -> Optional[str]:
+        self._check_restored()
+        row = self._conn().execute(SELECT_COMPLETION, (key, now)).fetchone()
+        return self._decode(row[0]) if row else None
+
+    def put_completion(self, key: str, value: str, expires_at: float, now: float) -> None:
+        self._check_restored()
+        conn = self._conn()
+        with conn:
+            conn.execute(UPSERT_COMPLETION, (key, self._encode(value), expires_at, now))
+
+    def prune_completions(self, max_entries: int, now: float) -> int:
+        """Drop expired cached completions and all but the newest ``max_entries``."""
+        conn = self._conn()
+        with conn:
+            return conn.execute(PRUNE_COMPLETIONS, (now, now, max_entries)).rowcount
+
+    def sample_messages(self, limit: int) -> List[str]:
+        """Text of the newest ``limit`` messages of any session, e.g. to train a dictionary."""
+        rows = self._conn().execute(SELECT_NEWEST, (limit,)).fetchall()
+        return [self._decode(content) for (content,) in rows]
+
+    def reencrypt(
+        self,
+        batch_size: int = 500,
+        pause: float = 0.0,
+        stop: Optional[threading.Event] = None,
+    ) -> int:
+        """Rewrite rows not encrypted under the active key (older keys, Fernet, plaintext).
+
+        Walks each table in ``batch_size`` rowid ranges, one short transaction
+        per batch with ``pause`` seconds between batches, so the write lock is
+        never held for long. A row changed concurrently is left to its writer.
+        Returns the number of rows rewritten.
+        """
+        if not self.cipher.enabled:
+            return 0
+        rewritten = 0
+        conn = self._conn()
+        for table, column in ENCRYPTED_COLUMNS:
+            select = f"SELECT rowid, {column} FROM {table} WHERE rowid > ? ORDER BY rowid LIMIT ?"
+            update = f"UPDATE {table} SET {column} = ? WHERE rowid = ? AND {column} = ?"
+            last = 0
+            while not (stop is not None and stop.is_set()):
+                rows = conn.execute(select, (last, batch_size)).fetchall()
+                if not rows:
+                    break
+                last = rows[-1][0]
+                updates = []
+                for rowid, blob in rows:
+                    if self.cipher.is_current(blob):
+                        continue
+                    try:
+                        data = self.cipher.decrypt(blob)
+                    except DecryptionError as exc:
+                        MEMORY_DECRYPT_FAILURES.labels(reason=exc.reason).inc()
+                        continue
+                    updates.append((self.cipher.encrypt(data), rowid, blob))
+                if updates:
+                    with conn:
+                        count = sum(conn.execute(update, row).rowcount for row in updates)
+                    MEMORY_REENCRYPTED.labels(table=table).inc(count)
+                    rewritten += count
+                if pause:
+                    time.sleep(pause)
+        return rewritten
+
+    def iter_message_batches(
+        self,
+        session_id: Optional[str] = None,
+        after_id: int = 0,
+        batch_size: int = 500,
+        limit: Optional[int] = None,
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Decoded messages with ids above ``after_id``, oldest first, a batch at a time.
+
+        Covers one session, or all of them when ``session_id`` is None, and stops
+        after ``limit`` messages. One query per batch, so memory use doesn't grow
+        with the number of messages.
+        """
+        self._check_restored()
+        remaining = limit
+        while remaining is None or remaining > 0:
+            size = batch_size if remaining is None else min(batch_size, remaining)
+            # The connection of whichever thread resumes the generator.
+            conn = self._conn()
+            if session_id is None:
+                rows = conn.execute(SELECT_PAGE, (after_id, size)).fetchall()
+            else:
+                rows = conn.execute(SELECT_SESSION_PAGE, (session_id, after_id, size)).fetchall()
+            if rows:
+                yield [self._message(row) for row in rows]
+            if len(rows) < size:
+                return
+            after_id = rows[-1][0]
+            if remaining is not None:
+                remaining -= len(rows)
+
+    def _message(self, row: Tuple[Any, ...]) -> Dict[str, Any]:
+        row_id, session_id, role, content, tokens, created_at = row
+        return {
+            "id": row_id,
+            "session_id": session_id,
+            "role": role,
+            "content": self._decode(content),
+            "tokens": tokens,
+            "created_at": created_at,
+        }
+
+    def iter_messages(
+        self, session_id: Optional[str] = None, after_id: int = 0, batch_size: int = 500
+    ) -> Iterator[Dict[str, Any]]:
+        for batch in self.iter_message_batches(session_id, after_id, batch_size):
+            yield from batch
+
+    def _last_id_before(self, cutoff: float) -> int:
+        # Binary search over ids for the newest message created before ``cutoff``
+        # (a Unix time): a few primary-key lookups instead of a table scan.
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(cutoff))
+        conn = self._conn()
+        low, high = conn.execute("SELECT MIN(id), MAX(id) FROM messages").fetchone()
+        found = 0
+        while low is not None and low <= high:
+            middle = (low + high) // 2
+            row = conn.execute(SELECT_MESSAGE_FROM, (middle,)).fetchone()
+            if row is None or row[1] >= stamp:
+                high = middle - 1
+            else:
+                found, low = row[0], row[0] + 1
+        return found
+
+    def _delete_batches(
+        self,
+        select: str,
+        params: Tuple[Any, ...],
+        reason: str,
+        batch_size: int,
+        pause: float,
+        stop: Optional[threading.Event],
+        archive: Optional[Callable[[Iterable[Dict[str, Any]]], None]] = None,
+    ) -> int:
+        # One short transaction per batch, so the write lock is never held for long.
+        # Rows are archived (a write and fsync) before it is taken; ``prune`` runs
+        # one pruner at a time, so nobody else deletes them in between.
+        conn = self._conn()
+        deleted = 0
+        while not (stop is not None and stop.is_set()):
+            rows = conn.execute(select, (*params, batch_size)).fetchall()
+            if archive is not None and rows:
+                archive([self._message(row) for row in rows])
+            with conn:
+                conn.executemany(DELETE_MESSAGE, [(row[0],) for row in rows])
+            if self.cache is not None:
+                for session_id in {row[1] for row in rows}:
+                    self.cache.invalidate(session_id)
+            MEMORY_PRUNED.labels(reason=reason).inc(len(rows))
+            deleted += len(rows)
+            if len(rows) < batch_size:
+                break
+            if pause:
+                time.sleep(pause)
+        return deleted
+
+    def prune(
+        self,
+        session_ttl: Optional[float] = None,
+        message_ttl: Optional[float] = None,
+        max_messages: Optional[int] = None,
+        batch_size: int = 500,
+        pause: float = 0.0,
+        stop: Optional[threading.Event] = None,
+        archive: Optional[Callable[[Iterable[Dict[str, Any]]], None]] = None,
+        now: Optional[float] = None,
+    ) -> Dict[str, int]:
+        """Delete messages past the retention limits; returns counts by reason.
+
+        Sessions idle for ``session_ttl`` seconds go entirely, summary included;
+        each batch is passed to ``archive`` before it is deleted. Messages older
+        than ``message_ttl`` seconds go from any session, and sessions keep at
+        most ``max_messages`` messages. Deletes run in ``batch_size`` batches as
+        in ``reencrypt``. Concurrent calls, from any process, run one at a time.
+        """
+        now = time.time() if now is None else now
+        counts = {"session_ttl": 0, "message_ttl": 0, "max_messages": 0}
+        with self._prune_lock(stop) as locked:
+            if not locked:
+                return counts
+            conn = self._conn()
+            if session_ttl is not None:
+                upto = self._last_id_before(now - session_ttl)
+                while upto and not (stop is not None and stop.is_set()):
+                    sessions = [
+                        row[0] for row in conn.execute(SELECT_IDLE_SESSIONS, (upto, batch_size))
+                    ]
+                    if not sessions:
+                        break
+                    select = ARCHIVE_SESSION_UPTO if archive is not None else SELECT_SESSION_UPTO
+                    for session_id in sessions:
+                        counts["session_ttl"] += self._delete_batches(
+                            select,
+                            (session_id, upto),
+                            "session_ttl",
+                            batch_size,
+                            pause,
+                            stop,
+                            archive,
+                        )
+                        with conn:
+                            conn.execute(DELETE_ORPHAN_SUMMARY, (session_id, session_id))
+            if message_ttl is not None:
+                upto = self._last_id_before(now - message_ttl)
+                counts["message_ttl"] = self._delete_batches(
+                    SELECT_UPTO, (upto,), "message_ttl", batch_size, pause, stop
+                )
+            if max_messages is not None:
+                long_sessions = conn.execute(SELECT_LONG_SESSIONS, (max_messages,)).fetchall()
+                for (session_id,) in long_sessions:
+                    row = conn.execute(SELECT_NTH_NEWEST, (session_id, max_messages)).fetchone()
+                    if row is not None:
+                        counts["max_messages"] += self._delete_batches(
+                            SELECT_SESSION_UPTO,
+                            (session_id, row[0]),
+                            "max_messages",
+                            batch_size,
+                            pause,
+                            stop,
+                        )
+        return counts
+
+    @contextmanager
+    def _prune_lock(self, stop: Optional[threading.Event]) -> Iterator[bool]:
+        # A lock file next to the database: the CLI and the server's retention task
+        # must not archive the same rows. Yields False if ``stop`` is set while waiting.
+        if fcntl is None:
+            yield True
+            return
+        with open(f"{self.db_path}-prune.lock", "a") as lock:
+            while True:
+                try:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if stop is None:
+                        time.sleep(0.1)
+                    elif stop.wait(0.1):
+                        yield False
+                        return
+            yield True
+
+    def incremental_vacuum(
+        self, pages: int = 1000, pause: float = 0.0, stop: Optional[threading.Event] = None
+    ) -> int:
+        """Return free pages to the filesystem ``pages`` at a time; returns bytes reclaimed.
+
+        Needs ``auto_vacuum = INCREMENTAL``, the default for stores created by
+        this version; on others it does nothing.
+        """
+        conn = self._conn()
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            return 0
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        reclaimed = 0
+        while not (stop is not None and stop.is_set()):
+            free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if not free:
+                break
+            # executescript steps the pragma to completion; execute frees a single page.
+            conn.executescript(f"PRAGMA incremental_vacuum({min(free, int(pages))})")
+            freed = free - conn.execute("PRAGMA freelist_count").fetchone()[0]
+            MEMORY_RECLAIMED_BYTES.inc(freed * page_size)
+            reclaimed += freed * page_size
+            if freed <= 0:
+                break
+            if pause:
+                time.sleep(pause)
+        return reclaimed
+
+    def enable_incremental_vacuum(self) -> int:
+        """Switch a store created before incremental vacuum to it with a full VACUUM.
+
+        Rewrites the whole file while holding the write lock: meant for the CLI,
+        not a running server. Returns bytes reclaimed.
+        """
+        conn = self._conn()
+        page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+        before = conn.execute("PRAGMA page_count").fetchone()[0]
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        reclaimed = (before - conn.execute("PRAGMA page_count").fetchone()[0]) * page_size
+        MEMORY_RECLAIMED_BYTES.inc(max(reclaimed, 0))
+        return reclaimed
+
+    async def aappend(self, session_id: str, role: str, content: str) -> None:
+        await asyncio.to_thread(self.append, session_id, role, content)
+
+    async def afetch(self, session_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.fetch, session_id, limit)
+
+    def close(self) -> None:
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+        self._local = threading.local()
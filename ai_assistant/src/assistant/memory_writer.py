@@ -0,0 +1,217 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import threading
+import time
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from .history_cache import Row
+from .memory import ConversationMemory
+from .tokens import count_tokens
+from .metrics import MEMORY_WRITE_BATCH_SIZE, MEMORY_WRITE_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class _PendingWrite:
+    __slots__ = ("session_id", "role", "content", "tokens", "row_id")
+
+    def __init__(self, session_id: str, role: str, content: str) -> None:
+        self.session_id = session_id
+        self.role = role
+        self.content = content
+        self.tokens = count_tokens(content)
+        # Set by the writer thread before the batch commits.
+        self.row_id: Optional[int] = None
+
+
+class WriteBehindMemory:
+    """Batches ``ConversationMemory`` appends on a background writer thread.
+
+    Appends return as soon as they are queued; the writer commits them in one
+    transaction per batch, flushing when ``batch_size`` rows are waiting or
+    ``flush_interval`` seconds after the first one. A full queue makes ``aappend``
+    wait (backpressure) without blocking the event loop. ``afetch`` overlays writes
+    that are not committed yet, so a session always reads its own appends.
+
+    A failed commit is retried after each of ``retry_delays``. If it still fails,
+    the rows are kept and retried with the next batch, and the next ``append``,
+    ``aappend``, ``flush`` or ``aflush`` raises, so the failure is not silent.
+    """
+
+    def __init__(
+        self,
+        memory: ConversationMemory,
+        max_queue: int = 10_000,
+        batch_size: int = 256,
+        flush_interval: float = 0.005,
+        retry_delays: Sequence[float] = (0.05, 0.25, 1.0),
+    ) -> None:
+        self.memory = memory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.retry_delays = tuple(retry_delays)
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_queue)
+        self._pending: Dict[str, List[_PendingWrite]] = {}
+        self._pending_lock = threading.Lock()
+        # Writes whose commit failed on every retry; only the writer thread uses it.
+        self._failed: List[_PendingWrite] = []
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="memory-writer", daemon=True)
+        self._thread.start()
+
+    def _raise_error(self) -> None:
+        error, self._error = self._error, None
+        if error is not None:
+            raise RuntimeError("memory writes failed to commit; they will be retried") from error
+
+    async def aappend(self, session_id: str, role: str, content: str) -> None:
+        if self._closed:
+            raise RuntimeError("memory writer is closed")
+        self._raise_error()
+        entry = _PendingWrite(session_id, role, content)
+        with self._pending_lock:
+            self._pending.setdefault(session_id, []).append(entry)
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            await asyncio.get_running_loop().run_in_executor(None, self._queue.put, entry)
+        MEMORY_WRITE_QUEUE_DEPTH.set(self._queue.qsize())
+
+    def append(self, session_id: str, role: str, content: str) -> None:
+        """Synchronous append that blocks while the queue is full."""
+        if self._closed:
+            raise RuntimeError("memory writer is closed")
+        self._raise_error()
+        entry = _PendingWrite(session_id, role, content)
+        with self._pending_lock:
+            self._pending.setdefault(session_id, []).append(entry)
+        self._queue.put(entry)
+
+    def fetch_rows(self, session_id: str, limit: int = 50) -> List[Row]:
+        """Committed rows plus queued ones; queued rows have id 0 until they commit."""
+        with self._pending_lock:
+            pending = list(self._pending.get(session_id, ()))
+        rows = self.memory.fetch_rows(session_id, limit)
+        if pending:
+            # A pending write shows up in ``rows`` only if its batch committed after the
+            # snapshot above; its id was assigned before that commit, so skip it here.
+            committed = {row[0] for row in rows}
+            rows = rows + [
+                (0, e.role, e.content, e.tokens)
+                for e in pending
+                if e.row_id is None or e.row_id not in committed
+            ]
+        return rows[-limit:]
+
+    def fetch_rows_between(
+        self, session_id: str, after_id: int, before_id: int, limit: int = 50
+    ) -> List[Row]:
+        return self.memory.fetch_rows_between(session_id, after_id, before_id, limit)
+
+    def fetch(self, session_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        return [
+            {"role": role, "content": content}
+            for _id, role, content, _tokens in self.fetch_rows(session_id, limit)
+        ]
+
+    async def afetch(self, session_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+        return await asyncio.to_thread(self.fetch, session_id, limit)
+
+    def get_summary(self, session_id: str) -> Optional[Tuple[int, str, int]]:
+        return self.memory.get_summary(session_id)
+
+    def put_summary(self, session_id: str, upto_id: int, content: str, tokens: int) -> None:
+        self.memory.put_summary(session_id, upto_id, content, tokens)
+
+    def flush(self) -> None:
+        """Block until everything queued so far is committed."""
+        self._queue.join()
+        self._raise_error()
+
+    async def aflush(self) -> None:
+        await asyncio.get_running_loop().run_in_executor(None, self._queue.join)
+        self._raise_error()
+
+    def close(self) -> None:
+        """Drain the queue, commit the remaining writes and stop the writer."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _take_batch(self) -> List[Any]:
+        # With failed writes waiting, come back to them even if nothing new arrives.
+        try:
+            batch = [self._queue.get(timeout=1.0 if self._failed else None)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and batch[-1] is not _STOP:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            stopping = _STOP in batch
+            entries = self._failed + [item for item in batch if item is not _STOP]
+            self._failed = []
+            if entries and not self._commit(entries):
+                if stopping:
+                    logger.error("dropping %d memory writes on close", len(entries))
+                    self._forget(entries)
+                else:
+                    self._failed = entries
+            for _ in batch:
+                self._queue.task_done()
+            MEMORY_WRITE_QUEUE_DEPTH.set(self._queue.qsize())
+            if stopping:
+                return
+
+    def _commit(self, entries: List[_PendingWrite]) -> bool:
+        def assign_ids(ids: List[int]) -> None:
+            for entry, row_id in zip(entries, ids):
+                entry.row_id = row_id
+
+        rows = [(e.session_id, e.role, e.content, e.tokens) for e in entries]
+        error: Optional[BaseException] = None
+        for delay in (0.0,) + self.retry_delays:
+            time.sleep(delay)
+            try:
+                self.memory.append_many(rows, before_commit=assign_ids)
+            except Exception as exc:
+                logger.warning("commit of %d memory writes failed: %r", len(entries), exc)
+                for entry in entries:
+                    entry.row_id = None  # rolled back
+                error = exc
+                continue
+            MEMORY_WRITE_BATCH_SIZE.observe(len(entries))
+            self._error = None
+            self._forget(entries)
+            return True
+        logger.error("keeping %d memory writes for the next batch", len(entries))
+        self._error = error
+        return False
+
+    def _forget(self, entries: List[_PendingWrite]) -> None:
+        with self._pending_lock:
+            for entry in entries:
+                session = self._pending.get(entry.session_id)
+                if session is not None:
+                    session.remove(entry)
+                    if not session:
+                        del self._pending[entry.session_id]
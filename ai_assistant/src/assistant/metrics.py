@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+from typing import Any, Dict
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Multi-second LLM calls and streams; the default buckets stop at 10s.
+LLM_LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30, 60, 120)
+
+# ``path`` is the route template ("/chat", "/static/{path}") or "unmatched".
+REQUEST_COUNT = Counter(
+    "assistant_requests_total", "Total HTTP requests", ["path", "method", "status"]
+)
+REQUEST_LATENCY = Histogram(
+    "assistant_request_latency_seconds", "Latency", ["path", "method"], buckets=LLM_LATENCY_BUCKETS
+)
+REQUESTS_IN_FLIGHT = Gauge("assistant_requests_in_flight", "HTTP requests being served", ["path"])
+
+PROVIDER_LATENCY = Histogram(
+    "assistant_provider_latency_seconds",
+    "Upstream provider call duration; streams until the last chunk",
+    ["provider", "model", "kind"],
+    buckets=LLM_LATENCY_BUCKETS,
+)
+PROVIDER_TIME_TO_FIRST_TOKEN = Histogram(
+    "assistant_provider_time_to_first_token_seconds",
+    "Time from starting a provider stream to its first chunk",
+    ["provider", "model"],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 15, 30),
+)
+PROVIDER_CALLS = Counter(
+    "assistant_provider_calls_total",
+    "Upstream provider calls by outcome (ok, error, cancelled)",
+    ["provider", "model", "kind", "outcome"],
+)
+PROVIDER_TOKENS = Counter(
+    "assistant_provider_tokens_total",
+    "Prompt and completion tokens; as reported by the provider, else estimated",
+    ["provider", "model", "type"],
+)
+PROVIDER_IN_FLIGHT = Gauge(
+    "assistant_provider_calls_in_flight", "Upstream provider calls in progress", ["provider"]
+)
+
+MEMORY_LATENCY = Histogram(
+    "assistant_memory_latency_seconds",
+    "Engine memory operations (fetch: assembling context, append: queueing a message)",
+    ["op"],
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1),
+)
+
+MEMORY_DECRYPT_FAILURES = Counter(
+    "assistant_memory_decrypt_failures_total",
+    "Stored rows that could not be read back (unknown_key, invalid, decompress)",
+    ["reason"],
+)
+MEMORY_COMPRESSION_BYTES = Counter(
+    "assistant_memory_compression_bytes_total",
+    "Message bytes written, before (raw) and after (stored) compression, excluding encryption",
+    ["stage"],
+)
+MEMORY_REENCRYPTED = Counter(
+    "assistant_memory_reencrypted_total",
+    "Rows rewritten under the active encryption key",
+    ["table"],
+)
+MEMORY_PRUNED = Counter(
+    "assistant_memory_pruned_total",
+    "Messages deleted by retention (session_ttl, message_ttl, max_messages)",
+    ["reason"],
+)
+MEMORY_RECLAIMED_BYTES = Counter(
+    "assistant_memory_reclaimed_bytes_total",
+    "Database file bytes returned to the filesystem by vacuuming",
+)
+
+RATE_LIMIT_DECISIONS = Counter(
+    "assistant_rate_limit_decisions_total",
+    "Distributed rate limit decisions by where they were made (lease, redis, local fallback)",
+    ["source", "outcome"],
+)
+RATE_LIMIT_REDIS_LATENCY = Histogram(
+    "assistant_rate_limit_redis_seconds",
+    "Round trip of the rate limit script",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25),
+)
+RATE_LIMIT_REDIS_ERRORS = Counter(
+    "assistant_rate_limit_redis_errors_total", "Failed rate limit script calls", ["error"]
+)
+
+ENGINE_HANDLES = Counter(
+    "assistant_engine_handles_total", "Per-session engine handles issued by the registry"
+)
+HTTP_POOL_CONNECTIONS = Gauge(
+    "assistant_http_pool_connections",
+    "Pooled upstream HTTP connections by state",
+    ["client", "state"],
+)
+HTTP_POOL_MAX_CONNECTIONS = Gauge(
+    "assistant_http_pool_max_connections", "Configured connection limit per pool", ["client"]
+)
+
+MEMORY_WRITE_QUEUE_DEPTH = Gauge(
+    "assistant_memory_write_queue_depth", "Memory appends waiting for the write-behind writer"
+)
+MEMORY_WRITE_BATCH_SIZE = Histogram(
+    "assistant_memory_write_batch_size",
+    "Rows committed per write-behind transaction",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512),
+)
+
+HISTORY_CACHE_HITS = Counter(
+    "assistant_history_cache_hits_total", "History reads served from cache"
+)
+HISTORY_CACHE_MISSES = Counter(
+    "assistant_history_cache_misses_total", "History reads that went to the database"
+)
+HISTORY_CACHE_EVICTIONS = Counter(
+    "assistant_history_cache_evictions_total", "History cache entries evicted", ["reason"]
+)
+HISTORY_CACHE_ENTRIES = Gauge("assistant_history_cache_sessions", "Sessions held in the cache")
+HISTORY_CACHE_BYTES = Gauge("assistant_history_cache_bytes", "Approximate history cache size")
+
+TOOL_LATENCY = Histogram(
+    "assistant_tool_latency_seconds",
+    "Tool call latency",
+    ["tool"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30),
+)
+TOOL_CALLS = Counter("assistant_tool_calls_total", "Tool calls by outcome", ["tool", "outcome"])
+
+WEB_FETCH_REQUESTS = Counter(
+    "assistant_web_fetch_requests_total",
+    "fetch_url_text calls by cache result (hit, revalidated, miss, coalesced)",
+    ["result"],
+)
+
+COMPLETION_CACHE_REQUESTS = Counter(
+    "assistant_completion_cache_requests_total",
+    "Provider calls by completion cache result (hit, miss, bypass)",
+    ["result"],
+)
+
+SINGLE_FLIGHT_COALESCED = Counter(
+    "assistant_single_flight_coalesced_total",
+    "Provider calls that joined an identical in-flight call instead of starting one",
+    ["kind"],
+)
+
+
+def http_pool_stats(client: Any) -> Dict[str, int]:
+    """Count active/idle connections of an httpx client's connection pool.
+
+    httpx does not expose pool state publicly, so this reads the httpcore pool
+    behind the default transport and returns zeros when it is not available.
+    """
+    transport = getattr(client, "_transport", None)
+    pool = getattr(transport, "_pool", None)
+    connections = list(getattr(pool, "connections", None) or [])
+    idle = sum(1 for conn in connections if conn.is_idle())
+    return {"active": len(connections) - idle, "idle": idle}
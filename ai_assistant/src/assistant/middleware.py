@@ -1,74 +1,254 @@
 from __future__ import annotations
 
 import time
-from typing import Callable, Dict, Optional
+from typing import Any, Dict, Iterable, Optional, Sequence, Tuple
 
-from starlette.middleware.base import BaseHTTPMiddleware
-from starlette.requests import Request
-from starlette.responses import Response, JSONResponse
+from starlette.datastructures import MutableHeaders
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse
+from starlette.routing import BaseRoute, Match
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 
 from .logging_utils import get_request_id
+from .metrics import REQUEST_COUNT, REQUEST_LATENCY, REQUESTS_IN_FLIGHT
+from .ratelimit import (
+    RateLimit,
+    RateLimitDecision,
+    RateLimitPolicy,
+    RedisRateLimiter,
+    TokenBucketLimiter,
+)
 
+# Pure ASGI middleware: each layer is one extra coroutine call and, where it
+# touches the response, a wrapped ``send``. Unlike BaseHTTPMiddleware there is no
+# task or queue per request and streaming responses pass straight through.
+
+
+def _header(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope["headers"]:
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+def _client_ip(scope: Scope) -> str:
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class RequestIdMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        req_id = _header(scope, b"x-request-id") or get_request_id()
+        scope.setdefault("state", {})["request_id"] = req_id
+
+        async def send_with_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Request-ID"] = req_id
+            await send(message)
+
+        await self.app(scope, receive, send_with_id)
+
+
+class SecurityHeadersMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        https = scope.get("scheme") == "https"
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers.setdefault("X-Content-Type-Options", "nosniff")
+                headers.setdefault("X-Frame-Options", "DENY")
+                headers.setdefault("Referrer-Policy", "no-referrer")
+                headers.setdefault("X-XSS-Protection", "0")
+                # Note: Set HSTS only behind HTTPS
+                if https:
+                    headers.setdefault(
+                        "Strict-Transport-Security", "max-age=31536000; includeSubDomains"
+                    )
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class RequestTooLarge(HTTPException):
+    def __init__(self) -> None:
+        super().__init__(status_code=413, detail="request too large")
+
+
+class BodySizeLimitMiddleware:
+    """Rejects request bodies over ``max_bytes`` without buffering them.
+
+    A declared ``Content-Length`` over the limit is refused before any of the
+    body is read. Otherwise the body is counted as it streams in, and the
+    chunk that crosses the limit raises ``RequestTooLarge`` (a 413) from
+    ``receive``, so the app stops reading there.
+    """
+
+    methods = {"POST", "PUT", "PATCH"}
+
+    def __init__(self, app: ASGIApp, max_bytes: int) -> None:
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] not in self.methods:
+            return await self.app(scope, receive, send)
+        declared = _header(scope, b"content-length")
+        if declared is not None and declared.isdigit() and int(declared) > self.max_bytes:
+            return await self._reject(scope, receive, send)
+
+        received = 0
+        started = False
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise RequestTooLarge()
+            return message
+
+        async def tracking_send(message: Message) -> None:
+            nonlocal started
+            started = started or message["type"] == "http.response.start"
+            await send(message)
 
-class RequestIdMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:  # type: ignore[override]
-        req_id = request.headers.get("X-Request-ID") or get_request_id()
-        request.state.request_id = req_id
-        response = await call_next(request)
-        response.headers["X-Request-ID"] = req_id
-        return response
-
-
-class SecurityHeadersMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:  # type: ignore[override]
-        response = await call_next(request)
-        response.headers.setdefault("X-Content-Type-Options", "nosniff")
-        response.headers.setdefault("X-Frame-Options", "DENY")
-        response.headers.setdefault("Referrer-Policy", "no-referrer")
-        response.headers.setdefault("X-XSS-Protection", "0")
-        # Note: Set HSTS only behind HTTPS
-        if request.url.scheme == "https":
-            response.headers.setdefault("Strict-Transport-Security", "max-age=31536000; includeSubDomains")
-        return response
-
-
-class RateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, rate: int = 60, per_seconds: int = 60):
-        super().__init__(app)
-        self.rate = rate
-        self.per = per_seconds
-        self.bucket: Dict[str, list[float]] = {}
-
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:  # type: ignore[override]
-        client_ip = request.client.host if request.client else "unknown"
-        now = time.time()
-        window_start = now - self.per
-        timestamps = self.bucket.get(client_ip, [])
-        timestamps = [t for t in timestamps if t >= window_start]
-        if len(timestamps) >= self.rate:
-            return JSONResponse({"detail": "rate limit exceeded"}, status_code=429)
-        timestamps.append(now)
-        self.bucket[client_ip] = timestamps
-        return await call_next(request)
-
-
-class RedisRateLimitMiddleware(BaseHTTPMiddleware):
-    def __init__(self, app, redis_client, rate: int = 120, per_seconds: int = 60):
-        super().__init__(app)
-        self.redis = redis_client
-        self.rate = rate
-        self.per = per_seconds
-
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:  # type: ignore[override]
-        client_ip = request.client.host if request.client else "unknown"
-        key = f"ratelimit:{client_ip}:{int(time.time() // self.per)}"
         try:
-            pipe = self.redis.pipeline()
-            pipe.incr(key, 1)
-            pipe.expire(key, self.per + 1)
-            count, _ = pipe.execute()
-            if int(count) > self.rate:
-                return JSONResponse({"detail": "rate limit exceeded"}, status_code=429)
-        except Exception:
-            pass
-        return await call_next(request)
\ No newline at end of file
+            await self.app(scope, limited_receive, tracking_send)
+        except RequestTooLarge:
+            # Apps without an HTTPException handler let it through to here.
+            if started:
+                raise
+            await self._reject(scope, receive, send)
+
+    @staticmethod
+    async def _reject(scope: Scope, receive: Receive, send: Send) -> None:
+        response = JSONResponse({"detail": "request too large"}, status_code=413)
+        await response(scope, receive, send)
+
+
+def route_template(routes: Sequence[BaseRoute], scope: Scope) -> str:
+    """The matching route's path template, or ``"unmatched"``.
+
+    Labelling metrics with templates rather than raw paths keeps one series per
+    route however many distinct URLs (IDs, scanner probes) come in.
+    """
+    partial = None
+    for route in routes:
+        match, _ = route.matches(scope)
+        if match is Match.FULL:
+            return getattr(route, "path_format", "unmatched")
+        if match is Match.PARTIAL and partial is None:
+            partial = route  # e.g. wrong method: still that route's 405
+    return getattr(partial, "path_format", "unmatched")
+
+
+class MetricsMiddleware:
+    """Request count, latency and in-flight requests per route template.
+
+    ``routes`` is the app's live route list (``app.routes``). Routes are matched
+    up front, so requests rejected before routing (413, 429) still get their
+    route's label. Latency covers the whole response body.
+    """
+
+    def __init__(self, app: ASGIApp, routes: Sequence[BaseRoute]) -> None:
+        self.app = app
+        self.routes = routes
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        path = route_template(self.routes, scope)
+        method = scope["method"]
+        in_flight = REQUESTS_IN_FLIGHT.labels(path=path)
+        in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            in_flight.dec()
+            REQUEST_LATENCY.labels(path=path, method=method).observe(elapsed)
+            REQUEST_COUNT.labels(path=path, method=method, status=str(status)).inc()
+
+
+class RateLimitMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        rate: int = 60,
+        per_seconds: int = 60,
+        route_limits: Optional[Dict[str, RateLimit]] = None,
+        key_limits: Optional[Dict[str, RateLimit]] = None,
+        known_keys: Optional[Iterable[str]] = None,
+        max_keys: int = 100_000,
+    ) -> None:
+        self.app = app
+        self.policy = RateLimitPolicy(
+            RateLimit(rate, per_seconds), route_limits, key_limits, known_keys
+        )
+        self.limiter = TokenBucketLimiter(max_keys=max_keys)
+
+    async def acquire(self, checks: Sequence[Tuple[str, RateLimit]]) -> RateLimitDecision:
+        return self.limiter.acquire(checks)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        checks = self.policy.checks(_client_ip(scope), _header(scope, b"x-api-key"), scope["path"])
+        decision = await self.acquire(checks)
+        if not decision.allowed:
+            response = JSONResponse(
+                {"detail": "rate limit exceeded"}, status_code=429, headers=decision.headers()
+            )
+            return await response(scope, receive, send)
+
+        async def send_with_limits(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message).update(decision.headers())
+            await send(message)
+
+        await self.app(scope, receive, send_with_limits)
+
+
+class RedisRateLimitMiddleware(RateLimitMiddleware):
+    """The same limits, shared across instances through an async Redis client."""
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        redis_client: Any,
+        rate: int = 120,
+        per_seconds: int = 60,
+        max_lease: int = 16,
+        **options: Any,
+    ) -> None:
+        super().__init__(app, rate, per_seconds, **options)
+        self.redis = RedisRateLimiter(
+            redis_client,
+            fallback=self.limiter,
+            max_lease=max_lease,
+            max_keys=options.get("max_keys", 100_000),
+        )
+
+    async def acquire(self, checks: Sequence[Tuple[str, RateLimit]]) -> RateLimitDecision:
+        return await self.redis.acquire(checks)
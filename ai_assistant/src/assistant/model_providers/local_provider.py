@@ -1,15 +1,21 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+import re
+from typing import Any, AsyncIterator, Dict, List, Optional
 
+from ..provider_base import ProviderBase
+
+
+class LocalEchoProvider(ProviderBase):
+    name = "local"
 
-class LocalEchoProvider:
     async def generate(
         self,
         messages: List[Dict[str, Any]],
         tools: Optional[List[Dict[str, Any]]] = None,
         tool_choice: str | None = None,
         temperature: float = 0.0,
+        timeout: float | None = None,
     ) -> Dict[str, Any]:
         # Minimal heuristic: if last user message contains 'time', request time tool.
         last = messages[-1] if messages else {"role": "user", "content": ""}
@@ -26,4 +32,19 @@ class LocalEchoProvider:
             return {"content": "", "tool_calls": tool_calls}
         # Otherwise respond with a simple acknowledgment
         reply = f"[Local Assistant] You said: {content}"
-        return {"content": reply, "tool_calls": None}
\ No newline at end of file
+        return {"content": reply, "tool_calls": None}
+
+    async def stream(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: str | None = None,
+        temperature: float = 0.0,
+        timeout: float | None = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        response = await self.generate(messages, tools=tools, tool_choice=tool_choice)
+        # Emit word-sized deltas (whitespace kept) so callers see real chunking.
+        for piece in re.findall(r"\S+\s*|\s+", response["content"]):
+            yield {"content": piece, "tool_calls": None}
+        if response["tool_calls"]:
+            yield {"content": "", "tool_calls": response["tool_calls"]}
@@ -1,16 +1,26 @@
 from __future__ import annotations
 
 import json
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 import httpx
 
+from ..provider_base import ProviderBase
 
-class OllamaProvider:
-    def __init__(self, host: str, model: str) -> None:
+
+class OllamaProvider(ProviderBase):
+    name = "ollama"
+
+    def __init__(self, host: str, model: str, client: Optional[httpx.AsyncClient] = None) -> None:
         self.host = host.rstrip("/")
         self.model = model
-        self.client = httpx.AsyncClient(timeout=60)
+        # A shared client is owned (and closed) by whoever passed it in.
+        self._owns_client = client is None
+        self.client = client or httpx.AsyncClient(timeout=60)
+
+    async def aclose(self) -> None:
+        if self._owns_client:
+            await self.client.aclose()
 
     async def generate(
         self,
@@ -18,6 +28,7 @@ class OllamaProvider:
         tools: Optional[List[Dict[str, Any]]] = None,
         tool_choice: str | None = None,
         temperature: float = 0.2,
+        timeout: float | None = None,
     ) -> Dict[str, Any]:
         # Ollama doesn't natively support tool-calling across all models.
         # We provide messages verbatim; if model emits JSON tool call, the engine can parse.
@@ -27,8 +38,57 @@ class OllamaProvider:
             "options": {"temperature": temperature},
             "stream": False,
         }
-        resp = await self.client.post(f"{self.host}/api/chat", json=payload)
+        resp = await self.client.post(
+            f"{self.host}/api/chat",
+            json=payload,
+            timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+        )
         resp.raise_for_status()
         data = resp.json()
         content = data.get("message", {}).get("content", "")
-        return {"content": content, "tool_calls": None}
\ No newline at end of file
+        return {"content": content, "tool_calls": None, "usage": _usage(data)}
+
+    async def stream(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: str | None = None,
+        temperature: float = 0.2,
+        timeout: float | None = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "options": {"temperature": temperature},
+            "stream": True,
+        }
+        # Ollama streams one JSON object per line until an object with "done": true.
+        async with self.client.stream(
+            "POST",
+            f"{self.host}/api/chat",
+            json=payload,
+            timeout=timeout if timeout is not None else httpx.USE_CLIENT_DEFAULT,
+        ) as resp:
+            resp.raise_for_status()
+            async for line in resp.aiter_lines():
+                if not line.strip():
+                    continue
+                data = json.loads(line)
+                content = data.get("message", {}).get("content", "")
+                if content:
+                    yield {"content": content, "tool_calls": None}
+                if data.get("done"):
+                    usage = _usage(data)
+                    if usage:
+                        yield {"content": "", "tool_calls": None, "usage": usage}
+                    break
+
+
+def _usage(data: Dict[str, Any]) -> Optional[Dict[str, int]]:
+    # Token counts come with the final ("done") object.
+    if "prompt_eval_count" not in data and "eval_count" not in data:
+        return None
+    return {
+        "prompt_tokens": data.get("prompt_eval_count", 0),
+        "completion_tokens": data.get("eval_count", 0),
+    }
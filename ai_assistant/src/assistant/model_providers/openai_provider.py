@@ -1,21 +1,48 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from openai import OpenAI
+import httpx
+from openai import AsyncOpenAI
 
+from ..provider_base import ProviderBase
 
-class OpenAIProvider:
-    def __init__(self, api_key: str, model: str) -> None:
-        self.client = OpenAI(api_key=api_key)
+
+class OpenAIProvider(ProviderBase):
+    name = "openai"
+
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        http_client: Optional[httpx.AsyncClient] = None,
+        base_url: Optional[str] = None,
+        timeout: float = 60.0,
+        max_retries: int = 2,
+    ) -> None:
+        # A shared client is owned (and closed) by whoever passed it in.
+        self._owns_client = http_client is None
+        self.http_client = http_client or httpx.AsyncClient()
+        self.client = AsyncOpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=timeout,
+            max_retries=max_retries,
+            http_client=self.http_client,
+        )
         self.model = model
 
-    async def generate(
+    async def aclose(self) -> None:
+        if self._owns_client:
+            await self.http_client.aclose()
+
+    def _params(
         self,
         messages: List[Dict[str, Any]],
-        tools: Optional[List[Dict[str, Any]]] = None,
-        tool_choice: str | None = None,
-        temperature: float = 0.2,
+        tools: Optional[List[Dict[str, Any]]],
+        tool_choice: str | None,
+        temperature: float,
+        timeout: float | None,
     ) -> Dict[str, Any]:
         params: Dict[str, Any] = {
             "model": self.model,
@@ -26,7 +53,22 @@ class OpenAIProvider:
             params["tools"] = tools
             if tool_choice:
                 params["tool_choice"] = tool_choice
-        chat = self.client.chat.completions.create(**params)
+        if timeout is not None:
+            params["timeout"] = timeout
+        return params
+
+    async def generate(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: str | None = None,
+        temperature: float = 0.2,
+        timeout: float | None = None,
+    ) -> Dict[str, Any]:
+        params = self._params(messages, tools, tool_choice, temperature, timeout)
+        # Awaiting the native async client keeps the event loop free; cancelling
+        # the awaiting task aborts the in-flight HTTP request.
+        chat = await self.client.chat.completions.create(**params)
         choice = chat.choices[0]
         message = choice.message
         content = message.content or ""
@@ -40,4 +82,49 @@ class OpenAIProvider:
                         "arguments": call.function.arguments,
                     }
                 )
-        return {"content": content, "tool_calls": tool_calls or None}
\ No newline at end of file
+        return {"content": content, "tool_calls": tool_calls or None, "usage": _usage(chat.usage)}
+
+    async def stream(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: str | None = None,
+        temperature: float = 0.2,
+        timeout: float | None = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        params = self._params(messages, tools, tool_choice, temperature, timeout)
+        chunks = await self.client.chat.completions.create(
+            stream=True, stream_options={"include_usage": True}, **params
+        )
+        # Tool calls arrive as fragments keyed by index; assemble them for the last chunk.
+        calls: Dict[int, Dict[str, Any]] = {}
+        usage = None
+        try:
+            async for chunk in chunks:
+                if getattr(chunk, "usage", None) is not None:
+                    usage = _usage(chunk.usage)  # sent last, with no choices
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                for frag in delta.tool_calls or []:
+                    call = calls.setdefault(frag.index, {"id": None, "name": "", "arguments": ""})
+                    if frag.id:
+                        call["id"] = frag.id
+                    if frag.function and frag.function.name:
+                        call["name"] += frag.function.name
+                    if frag.function and frag.function.arguments:
+                        call["arguments"] += frag.function.arguments
+                if delta.content:
+                    yield {"content": delta.content, "tool_calls": None}
+        finally:
+            # Releases the HTTP connection when the consumer stops early or is cancelled.
+            await chunks.close()
+        if calls or usage:
+            tool_calls = [calls[i] for i in sorted(calls)] or None
+            yield {"content": "", "tool_calls": tool_calls, "usage": usage}
+
+
+def _usage(usage: Any) -> Optional[Dict[str, int]]:
+    if usage is None:
+        return None
+    return {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens}
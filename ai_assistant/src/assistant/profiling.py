@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+class StackSampler:
+    """Samples one thread's Python stack every ``interval`` seconds.
+
+    Meant for the event loop thread while an engine call runs. The result is
+    in folded form (``outer;inner;leaf count`` per line), which flame graph
+    tools read directly. Other requests running on the same loop show up in
+    the samples too. Sampling stops when ``max_seconds`` is reached.
+    """
+
+    def __init__(
+        self,
+        thread_id: Optional[int] = None,
+        interval: float = 0.005,
+        max_depth: int = 64,
+        max_seconds: float = 60.0,
+    ) -> None:
+        self.thread_id = thread_id if thread_id is not None else threading.get_ident()
+        self.interval = interval
+        self.max_depth = max_depth
+        self.max_seconds = max_seconds
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "StackSampler":
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> str:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        return self.folded()
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+    def _run(self) -> None:
+        deadline = time.monotonic() + self.max_seconds
+        while not self._stop.wait(self.interval) and time.monotonic() < deadline:
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            names: List[str] = []
+            while frame is not None and len(names) < self.max_depth:
+                code = frame.f_code
+                names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                frame = frame.f_back
+            del frame
+            self.samples[";".join(reversed(names))] += 1
+
+
+class Profiler:
+    """Decides which engine calls get profiled and where profiles go.
+
+    A call is profiled when it asks to be (the ``X-Profile`` header, if
+    ``PROFILE_HEADER`` allows it) or at random with ``PROFILE_SAMPLE_RATE``.
+    Profiles are attached to the call's trace span by the engine, and are also
+    written to ``directory`` as ``<id>.folded`` when one is set.
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 0.0,
+        allow_requests: bool = False,
+        interval: float = 0.005,
+        directory: Optional[str] = None,
+    ) -> None:
+        self.sample_rate = sample_rate
+        self.allow_requests = allow_requests
+        self.interval = interval
+        self.directory = Path(directory) if directory else None
+
+    def wanted(self, requested: Optional[bool]) -> bool:
+        if requested is False:
+            return False
+        if requested and self.allow_requests:
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self) -> StackSampler:
+        return StackSampler(interval=self.interval).start()
+
+    def export(self, profile_id: str, folded: str) -> Optional[Path]:
+        if self.directory is None:
+            return None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{profile_id}.folded"
+        path.write_text(folded + "\n", encoding="utf-8")
+        return path
+
+
+def summarize(folded: str, top: int = 10) -> Dict[str, int]:
+    """Self-sample counts of the ``top`` hottest leaf frames of a folded profile."""
+    leaves: Counter = Counter()
+    for line in folded.splitlines():
+        stack, _, count = line.rpartition(" ")
+        leaves[stack.rsplit(";", 1)[-1]] += int(count)
+    return dict(leaves.most_common(top))
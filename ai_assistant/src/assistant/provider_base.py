@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
 
 class ProviderBase(ABC):
@@ -12,8 +12,29 @@ class ProviderBase(ABC):
         tools: Optional[List[Dict[str, Any]]] = None,
         tool_choice: str | None = None,
         temperature: float = 0.2,
+        timeout: float | None = None,
     ) -> Dict[str, Any]:
         """Return a response dict with potential tool calls.
-        Expected keys: {"content": str, "tool_calls": list|None}
+        Expected keys: {"content": str, "tool_calls": list|None}; optionally
+        "usage": {"prompt_tokens": int, "completion_tokens": int}.
+        ``timeout`` (seconds) overrides the provider's default for this call.
         """
-        raise NotImplementedError
\ No newline at end of file
+        raise NotImplementedError
+
+    async def stream(
+        self,
+        messages: List[Dict[str, Any]],
+        tools: Optional[List[Dict[str, Any]]] = None,
+        tool_choice: str | None = None,
+        temperature: float = 0.2,
+        timeout: float | None = None,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Yield response chunks as they arrive.
+        Each chunk is {"content": str, "tool_calls": list|None}; content is a delta and
+        tool_calls is only set (fully assembled) on the last chunk, as is "usage" when
+        the provider reports it.
+        The default falls back to a single chunk from ``generate``.
+        """
+        yield await self.generate(
+            messages, tools=tools, tool_choice=tool_choice, temperature=temperature, timeout=timeout
+        )
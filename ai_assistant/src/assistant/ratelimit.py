@@ -0,0 +1,347 @@
+from __future__ import annotations
+
+import hmac
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, NamedTuple, Optional, Sequence, Tuple
+
+from .config import get_settings, hash_api_key
+from .metrics import RATE_LIMIT_DECISIONS, RATE_LIMIT_REDIS_ERRORS, RATE_LIMIT_REDIS_LATENCY
+
+
+class RateLimit(NamedTuple):
+    requests: int
+    window: float  # seconds
+
+    @classmethod
+    def parse(cls, text: str) -> "RateLimit":
+        """``"120/60"`` is 120 requests per 60 seconds."""
+        requests, _, window = text.strip().partition("/")
+        return cls(int(requests), float(window or 60))
+
+    def policy(self) -> str:
+        return f"{self.requests};w={int(self.window)}"
+
+
+class RateLimitDecision(NamedTuple):
+    allowed: bool
+    limit: RateLimit
+    remaining: int
+    reset: float  # seconds until the bucket is full again
+    retry_after: float  # seconds until the next request would be allowed; 0 if allowed
+
+    def headers(self) -> Dict[str, str]:
+        headers = {
+            "RateLimit-Limit": str(self.limit.requests),
+            "RateLimit-Remaining": str(self.remaining),
+            "RateLimit-Reset": str(math.ceil(self.reset)),
+            "RateLimit-Policy": self.limit.policy(),
+        }
+        if not self.allowed:
+            headers["Retry-After"] = str(max(1, math.ceil(self.retry_after)))
+        return headers
+
+
+class _Bucket:
+    __slots__ = ("tokens", "stamp")
+
+    def __init__(self, tokens: float, stamp: float) -> None:
+        self.tokens = tokens
+        self.stamp = stamp
+
+
+class TokenBucketLimiter:
+    """Token buckets per key with constant work per request.
+
+    Each key holds two floats. Buckets are kept in least-recently-used order:
+    a bucket idle for longer than the largest window has refilled completely, so
+    dropping it loses nothing, and the oldest buckets are dropped first once
+    ``max_keys`` is exceeded. Both checks only look at the head of the order.
+    """
+
+    def __init__(self, max_keys: int = 100_000) -> None:
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, _Bucket]" = OrderedDict()
+        self._max_window = 0.0
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+    def acquire(
+        self, checks: Sequence[Tuple[str, RateLimit]], now: Optional[float] = None
+    ) -> RateLimitDecision:
+        """Take one token from every ``(key, limit)`` bucket, or from none if any is empty.
+
+        The decision describes the bucket with the fewest tokens left.
+        """
+        now = time.monotonic() if now is None else now
+        buckets = self._buckets
+        self._expire(now)
+        charged = []
+        allowed = True
+        for key, limit in checks:
+            if limit.window > self._max_window:
+                self._max_window = limit.window
+            bucket = buckets.get(key)
+            if bucket is None:
+                bucket = buckets[key] = _Bucket(float(limit.requests), now)
+                if len(buckets) > self.max_keys:
+                    buckets.popitem(last=False)
+            else:
+                buckets.move_to_end(key)
+                tokens = bucket.tokens + (now - bucket.stamp) * limit.requests / limit.window
+                bucket.tokens = tokens if tokens < limit.requests else float(limit.requests)
+                bucket.stamp = now
+            if bucket.tokens < 1:
+                allowed = False
+            charged.append((bucket, limit))
+
+        tightest, tightest_limit = charged[0]
+        for bucket, limit in charged:
+            if allowed:
+                bucket.tokens -= 1
+            if bucket.tokens < tightest.tokens:
+                tightest, tightest_limit = bucket, limit
+        rate = tightest_limit.requests / tightest_limit.window
+        tokens = tightest.tokens
+        return RateLimitDecision(
+            allowed,
+            tightest_limit,
+            int(tokens),
+            (tightest_limit.requests - tokens) / rate,
+            0.0 if allowed else (1 - tokens) / rate,
+        )
+
+    def _expire(self, now: float) -> None:
+        buckets = self._buckets
+        horizon = now - self._max_window
+        while buckets:
+            key = next(iter(buckets))
+            if buckets[key].stamp >= horizon:
+                break
+            del buckets[key]
+
+
+# GCRA over every bucket in KEYS at once, granting the same number of tokens
+# (at most ARGV[1]) from each, or none. A bucket is stored as its "theoretical
+# arrival time": the millisecond at which it is full again; a missing key is a
+# full bucket. Redis's clock is used so app instances need not agree on time.
+# ARGV[2 * i], ARGV[2 * i + 1] are the requests and window (ms) of KEYS[i].
+# Returns {granted, remaining, reset_ms, retry_ms, index of the tightest bucket}.
+GCRA_SCRIPT = """
+if redis.replicate_commands then redis.replicate_commands() end
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local grant = tonumber(ARGV[1])
+local tats, intervals, windows = {}, {}, {}
+local tightest, fewest = 1, nil
+for i, key in ipairs(KEYS) do
+  local requests = tonumber(ARGV[2 * i])
+  local window = tonumber(ARGV[2 * i + 1])
+  local interval = window / requests
+  local tat = tonumber(redis.call('GET', key)) or now
+  if tat < now then tat = now end
+  local available = math.floor((now + window - tat) / interval)
+  tats[i], intervals[i], windows[i] = tat, interval, window
+  if fewest == nil or available < fewest then tightest, fewest = i, available end
+end
+if fewest < grant then grant = fewest end
+local i = tightest
+if grant < 1 then
+  local retry = tats[i] - windows[i] + intervals[i] - now
+  return {0, 0, math.ceil(tats[i] - now), math.ceil(retry), i}
+end
+for j, key in ipairs(KEYS) do
+  tats[j] = tats[j] + grant * intervals[j]
+  redis.call('SET', key, tostring(tats[j]), 'PX', math.ceil(tats[j] - now) + 1)
+end
+return {grant, fewest - grant, math.ceil(tats[i] - now), 0, i}
+"""
+
+
+class _Lease:
+    __slots__ = ("tokens", "expires", "size", "limit", "remaining", "reset_at", "retry_at")
+
+    def __init__(self) -> None:
+        self.tokens = 0
+        self.expires = 0.0
+        self.size = 1
+        self.limit: Optional[RateLimit] = None
+        self.remaining = 0
+        self.reset_at = 0.0
+        self.retry_at = 0.0
+
+
+class RedisRateLimiter:
+    """Token buckets shared across app instances through one Redis script call.
+
+    Each set of buckets a request is charged to holds a short local lease of
+    tokens taken from Redis in advance, so a busy client mostly skips the round
+    trip. Leases start at one token and double each time one is used up before
+    it expires, up to ``max_lease`` and a tenth of the limit; leftover tokens
+    are dropped, which only ever makes the limit stricter. A denial is also
+    kept locally until its ``Retry-After``.
+
+    When Redis fails, requests fall back to the in-process ``fallback`` limiter
+    (per instance, so the effective limit is multiplied by the instance count)
+    and Redis is retried after ``retry_seconds``.
+    """
+
+    def __init__(
+        self,
+        client: Any,
+        fallback: Optional[TokenBucketLimiter] = None,
+        max_lease: int = 16,
+        lease_seconds: float = 1.0,
+        retry_seconds: float = 5.0,
+        prefix: str = "ratelimit:",
+        max_keys: int = 100_000,
+    ) -> None:
+        self.client = client
+        self.fallback = fallback or TokenBucketLimiter(max_keys=max_keys)
+        self.max_lease = max_lease
+        self.lease_seconds = lease_seconds
+        self.retry_seconds = retry_seconds
+        self.prefix = prefix
+        self.max_keys = max_keys
+        self._script = client.register_script(GCRA_SCRIPT)
+        self._leases: "OrderedDict[Tuple[str, ...], _Lease]" = OrderedDict()
+        self._down_until = 0.0
+
+    async def acquire(
+        self, checks: Sequence[Tuple[str, RateLimit]], now: Optional[float] = None
+    ) -> RateLimitDecision:
+        now = time.monotonic() if now is None else now
+        if now < self._down_until:
+            return self._local(checks, now)
+        leases = self._leases
+        key = tuple(name for name, _ in checks)
+        lease = leases.get(key)
+        if lease is None:
+            self._evict(now)
+            lease = leases[key] = _Lease()
+        else:
+            leases.move_to_end(key)
+        if now < lease.retry_at:
+            RATE_LIMIT_DECISIONS.labels(source="lease", outcome="limited").inc()
+            return self._decision(lease, False, now)
+        if lease.tokens and now < lease.expires:
+            lease.tokens -= 1
+            RATE_LIMIT_DECISIONS.labels(source="lease", outcome="allowed").inc()
+            return self._decision(lease, True, now)
+
+        if lease.limit is not None and now < lease.expires:
+            lease.size = min(lease.size * 2, self.max_lease)  # used up in time: grow
+        else:
+            lease.size = 1
+        want = min(lease.size, *(max(1, limit.requests // 10) for _, limit in checks))
+        args: list = [want]
+        for _, limit in checks:
+            args += [limit.requests, int(limit.window * 1000)]
+        started = time.perf_counter()
+        try:
+            granted, remaining, reset_ms, retry_ms, tightest = await self._script(
+                keys=[self.prefix + name for name in key], args=args
+            )
+        except Exception as exc:
+            RATE_LIMIT_REDIS_ERRORS.labels(error=type(exc).__name__).inc()
+            self._down_until = now + self.retry_seconds
+            return self._local(checks, now)
+        finally:
+            RATE_LIMIT_REDIS_LATENCY.observe(time.perf_counter() - started)
+
+        lease.limit = checks[int(tightest) - 1][1]
+        lease.reset_at = now + int(reset_ms) / 1000
+        allowed = int(granted) > 0
+        if allowed:
+            lease.tokens = int(granted) - 1
+            lease.remaining = int(remaining)
+            lease.expires = now + self.lease_seconds
+        else:
+            lease.tokens = lease.remaining = 0
+            lease.retry_at = now + int(retry_ms) / 1000
+        RATE_LIMIT_DECISIONS.labels(
+            source="redis", outcome="allowed" if allowed else "limited"
+        ).inc()
+        return self._decision(lease, allowed, now)
+
+    @staticmethod
+    def _decision(lease: _Lease, allowed: bool, now: float) -> RateLimitDecision:
+        return RateLimitDecision(
+            allowed,
+            lease.limit,  # type: ignore[arg-type]
+            lease.remaining + lease.tokens,
+            max(0.0, lease.reset_at - now),
+            0.0 if allowed else max(0.0, lease.retry_at - now),
+        )
+
+    def _local(self, checks: Sequence[Tuple[str, RateLimit]], now: float) -> RateLimitDecision:
+        decision = self.fallback.acquire(checks, now)
+        RATE_LIMIT_DECISIONS.labels(
+            source="local", outcome="allowed" if decision.allowed else "limited"
+        ).inc()
+        return decision
+
+    def _evict(self, now: float) -> None:
+        leases = self._leases
+        while leases:
+            key = next(iter(leases))
+            head = leases[key]
+            if len(leases) < self.max_keys and (now < head.expires or now < head.retry_at):
+                break
+            del leases[key]
+
+
+class RateLimitPolicy:
+    """Picks the buckets a request is charged to.
+
+    Every client has one bucket for all its requests, limited by ``default`` or
+    by its API key's entry in ``key_limits``. Routes listed in ``route_limits``
+    add a second bucket per client and route. Clients are identified by a known
+    API key (so unknown keys cannot be used to mint fresh buckets), else by IP.
+    Keys are known from ``known_keys``, or by default from the current settings'
+    ``API_KEYS``, so a reload applies. Buckets are named by a digest of the key,
+    never the key itself.
+    """
+
+    def __init__(
+        self,
+        default: RateLimit,
+        route_limits: Optional[Dict[str, RateLimit]] = None,
+        key_limits: Optional[Dict[str, RateLimit]] = None,
+        known_keys: Optional[Iterable[str]] = None,
+    ) -> None:
+        self.default = default
+        self.route_limits = route_limits or {}
+        self.key_limits = {hash_api_key(key): limit for key, limit in (key_limits or {}).items()}
+        self.known_keys: Optional[Dict[bytes, bytes]] = None
+        if known_keys is not None:
+            digests = (hash_api_key(key) for key in known_keys)
+            self.known_keys = {d[:8]: d for d in digests}
+
+    def _known(self, digest: bytes) -> bool:
+        if digest in self.key_limits:
+            return True
+        known = self.known_keys if self.known_keys is not None else get_settings().api_key_digests
+        candidate = known.get(digest[:8])
+        return candidate is not None and hmac.compare_digest(candidate, digest)
+
+    def checks(
+        self, client_ip: str, api_key: Optional[str], path: str
+    ) -> Sequence[Tuple[str, RateLimit]]:
+        digest = hash_api_key(api_key) if api_key else None
+        if digest is not None and self._known(digest):
+            identity = f"key:{digest[:16].hex()}"
+            limit = self.key_limits.get(digest, self.default)
+        else:
+            identity = f"ip:{client_ip}"
+            limit = self.default
+        route_limit = self.route_limits.get(path)
+        if route_limit is None:
+            return ((identity, limit),)
+        return ((identity, limit), (f"{identity}|{path}", route_limit))
+
+
+def parse_limits(values: Optional[Dict[str, str]]) -> Dict[str, RateLimit]:
+    return {key: RateLimit.parse(value) for key, value in (values or {}).items()}
@@ -0,0 +1,310 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+import httpx
+
+from .cassette import Cassette, RecordingProvider, ReplayProvider
+from .compression import Compressor, load_dictionaries
+from .completion_cache import CachingProvider, MemoryCompletionBackend, SQLiteCompletionBackend
+from .config import Settings, get_settings
+from .context import ContextAssembler, ExtractiveSummarizer, ProviderSummarizer, budget_for_model
+from .engine import AssistantEngine
+from .history_cache import HistoryCache
+from .memory import ConversationMemory
+from .memory_writer import WriteBehindMemory
+from .metrics import (
+    ENGINE_HANDLES,
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAX_CONNECTIONS,
+    http_pool_stats,
+)
+from .profiling import Profiler
+from .retention import retention_enabled, run_retention
+from .single_flight import SingleFlight
+from .tools import ToolRunner, export_tool_schemas_for_openai, web_fetch
+from .tools.http_cache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+
+def http_limits(settings: Settings) -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry,
+    )
+
+
+def build_provider(settings: Settings, http_client: Optional[httpx.AsyncClient] = None):
+    # A replayed cassette stands in for any upstream
+    if settings.provider_replay:
+        return ReplayProvider(
+            Cassette(settings.provider_replay, strict=settings.provider_replay_strict),
+            speed=settings.provider_replay_speed,
+            ttft=_seconds(settings.provider_replay_ttft_ms),
+            interval=_seconds(settings.provider_replay_interval_ms),
+        )
+    # Prefer OpenAI if configured
+    if settings.openai_api_key:
+        from .model_providers.openai_provider import OpenAIProvider
+
+        return OpenAIProvider(
+            settings.openai_api_key,
+            settings.openai_model,
+            http_client=http_client,
+            base_url=settings.openai_base_url,
+            timeout=settings.provider_timeout_seconds,
+            max_retries=settings.provider_max_retries,
+        )
+    # Then Ollama if configured
+    if settings.ollama_host:
+        from .model_providers.ollama_provider import OllamaProvider
+
+        return OllamaProvider(settings.ollama_host, settings.ollama_model, client=http_client)
+    # Fallback to local provider that runs without external deps
+    from .model_providers.local_provider import LocalEchoProvider
+
+    return LocalEchoProvider()
+
+
+def _seconds(ms: Optional[float]) -> Optional[float]:
+    return ms / 1000 if ms is not None else None
+
+
+def build_recorder(settings: Settings, provider: Any) -> Any:
+    """Record upstream calls to ``PROVIDER_RECORD`` (replayed calls are not re-recorded)."""
+    if not settings.provider_record or settings.provider_replay:
+        return provider
+    return RecordingProvider(provider, Cassette(settings.provider_record))
+
+
+def build_compressor(settings: Settings) -> Compressor:
+    return Compressor(
+        codec=settings.memory_compression,
+        level=settings.memory_compression_level,
+        min_bytes=settings.memory_compression_min_bytes,
+        dictionaries=load_dictionaries(settings.memory_compression_dicts),
+    )
+
+
+def build_history_cache(settings: Settings) -> Optional[HistoryCache]:
+    if settings.history_cache_sessions <= 0:
+        return None
+    return HistoryCache(
+        max_sessions=settings.history_cache_sessions,
+        max_bytes=settings.history_cache_bytes,
+        ttl=settings.history_cache_ttl_seconds,
+        rows_per_session=settings.context_max_messages,
+    )
+
+
+def build_context(settings: Settings, store: Any, provider: Any) -> ContextAssembler:
+    if settings.context_summarizer == "provider":
+        summarizer: Any = ProviderSummarizer(provider, max_tokens=settings.context_summary_tokens)
+    else:
+        summarizer = ExtractiveSummarizer(max_tokens=settings.context_summary_tokens)
+    budget = budget_for_model(
+        getattr(provider, "model", None),
+        settings.context_token_budget,
+        settings.context_token_budgets or {},
+    )
+    return ContextAssembler(
+        store,
+        budget_tokens=budget,
+        summary_tokens=settings.context_summary_tokens,
+        max_messages=settings.context_max_messages,
+        summarizer=summarizer,
+    )
+
+
+def build_profiler(settings: Settings) -> Optional[Profiler]:
+    if settings.profile_sample_rate <= 0 and not settings.profile_header:
+        return None
+    return Profiler(
+        sample_rate=settings.profile_sample_rate,
+        allow_requests=settings.profile_header,
+        interval=settings.profile_interval_ms / 1000,
+        directory=settings.profile_dir,
+    )
+
+
+def build_tool_runner(settings: Settings) -> ToolRunner:
+    return ToolRunner(
+        max_workers=settings.tool_max_workers,
+        timeout=settings.tool_timeout_seconds,
+        timeouts=settings.tool_timeouts,
+    )
+
+
+def build_web_fetcher(settings: Settings, client: httpx.AsyncClient) -> web_fetch.WebFetcher:
+    cache = ResponseCache(
+        max_entries=settings.web_cache_entries,
+        max_bytes=settings.web_cache_bytes,
+        directory=settings.web_cache_dir,
+    )
+    return web_fetch.WebFetcher(client=client, cache=cache)
+
+
+def build_completion_cache(settings: Settings, provider: Any, memory: ConversationMemory) -> Any:
+    """Wrap ``provider`` in the configured completion cache (``COMPLETION_CACHE``)."""
+    if settings.completion_cache == "memory":
+        backend: Any = MemoryCompletionBackend(
+            max_entries=settings.completion_cache_entries,
+            max_bytes=settings.completion_cache_bytes,
+        )
+    elif settings.completion_cache == "sqlite":
+        backend = SQLiteCompletionBackend(memory, max_entries=settings.completion_cache_entries)
+    else:
+        return provider
+    return CachingProvider(provider, backend, ttl=settings.completion_cache_ttl_seconds)
+
+
+class AssistantRegistry:
+    """App-scoped provider, memory store and tool schemas shared by all sessions.
+
+    Built once per process (from the FastAPI lifespan) so settings, the SQLite
+    schema check and upstream HTTP connection pools are not recreated per request.
+    """
+
+    def __init__(self, settings: Optional[Settings] = None) -> None:
+        self.settings = settings or get_settings()
+        self.http_client = httpx.AsyncClient(timeout=60, limits=http_limits(self.settings))
+        self.memory = ConversationMemory(
+            self.settings.assistant_db_path,
+            cache=build_history_cache(self.settings),
+            compressor=build_compressor(self.settings),
+        )
+        self.memory_writer = WriteBehindMemory(
+            self.memory,
+            max_queue=self.settings.memory_write_queue_size,
+            batch_size=self.settings.memory_write_batch_size,
+            flush_interval=self.settings.memory_write_flush_ms / 1000,
+        )
+        self.tool_schemas: List[Dict[str, Any]] = export_tool_schemas_for_openai()
+        self.tool_runner = build_tool_runner(self.settings)
+        self.web_fetcher = build_web_fetcher(self.settings, self.http_client)
+        web_fetch.configure(self.web_fetcher)
+        self.provider = build_completion_cache(
+            self.settings,
+            build_recorder(
+                self.settings, build_provider(self.settings, http_client=self.http_client)
+            ),
+            self.memory,
+        )
+        self.context = build_context(self.settings, self.memory_writer, self.provider)
+        self.single_flight = SingleFlight() if self.settings.single_flight else None
+        self.profiler = build_profiler(self.settings)
+        self._reencrypt_stop = threading.Event()
+        self._reencrypt_thread: Optional[threading.Thread] = None
+        self._retention_stop = threading.Event()
+        self._retention_thread: Optional[threading.Thread] = None
+
+    def engine(self, session_id: str = "default") -> AssistantEngine:
+        ENGINE_HANDLES.inc()
+        return AssistantEngine(
+            session_id=session_id,
+            settings=self.settings,
+            memory=self.memory_writer,
+            provider=self.provider,
+            tool_schemas=self.tool_schemas,
+            context=self.context,
+            tool_runner=self.tool_runner,
+            single_flight=self.single_flight,
+            profiler=self.profiler,
+        )
+
+    def start_reencrypt(self) -> None:
+        """Rewrite stored rows under the active key in the background (``MEMORY_REENCRYPT``)."""
+        if not self.settings.memory_reencrypt or not self.memory.cipher.enabled:
+            return
+        self._reencrypt_thread = threading.Thread(
+            target=self._reencrypt, name="memory-reencrypt", daemon=True
+        )
+        self._reencrypt_thread.start()
+
+    def _reencrypt(self) -> None:
+        try:
+            rewritten = self.memory.reencrypt(
+                batch_size=self.settings.memory_reencrypt_batch,
+                pause=self.settings.memory_reencrypt_pause_ms / 1000,
+                stop=self._reencrypt_stop,
+            )
+        except Exception:
+            logger.exception("background re-encryption failed")
+            return
+        logger.info("re-encrypted %d stored rows under the active key", rewritten)
+
+    def start_retention(self) -> None:
+        """Prune history now and every ``MEMORY_RETENTION_INTERVAL_S`` in the background."""
+        if not retention_enabled(self.settings):
+            return
+        self._retention_thread = threading.Thread(
+            target=self._retention, name="memory-retention", daemon=True
+        )
+        self._retention_thread.start()
+
+    def _retention(self) -> None:
+        while not self._retention_stop.is_set():
+            try:
+                counts = run_retention(self.memory, self.settings, stop=self._retention_stop)
+            except Exception:
+                logger.exception("memory retention failed")
+            else:
+                logger.info("memory retention: %s", counts)
+            self._retention_stop.wait(self.settings.memory_retention_interval_s)
+
+    def pools(self) -> Dict[str, Any]:
+        pools: Dict[str, Any] = {"shared": self.http_client}
+        provider_client = getattr(self.provider, "http_client", None)
+        if provider_client is not None and provider_client is not self.http_client:
+            pools["provider"] = provider_client
+        return pools
+
+    def update_metrics(self) -> None:
+        for name, client in self.pools().items():
+            for state, count in http_pool_stats(client).items():
+                HTTP_POOL_CONNECTIONS.labels(client=name, state=state).set(count)
+            HTTP_POOL_MAX_CONNECTIONS.labels(client=name).set(self.settings.http_max_connections)
+
+    def _stop_background(self) -> None:
+        self._reencrypt_stop.set()
+        self._retention_stop.set()
+        for thread in (self._reencrypt_thread, self._retention_thread):
+            if thread is not None:
+                thread.join()
+
+    async def _close_provider(self) -> None:
+        close = getattr(self.provider, "aclose", None)
+        if close is not None:
+            await close()
+
+    async def aclose(self) -> None:
+        """Stop background work and release everything; raises the first failure, if any.
+
+        Every step runs even if an earlier one fails, and blocking joins and
+        drains run in worker threads, off the event loop.
+        """
+        if web_fetch.configured() is self.web_fetcher:
+            web_fetch.configure(None)
+        steps: List[Callable[[], Awaitable[Any]]] = [
+            lambda: asyncio.to_thread(self._stop_background),
+            # Drain queued appends before closing the connections they need.
+            lambda: asyncio.to_thread(self.memory_writer.close),
+            lambda: asyncio.to_thread(self.memory.close),
+            lambda: asyncio.to_thread(self.tool_runner.close),
+            self._close_provider,
+            self.http_client.aclose,
+        ]
+        error: Optional[BaseException] = None
+        for step in steps:
+            try:
+                await step()
+            except Exception as exc:
+                logger.exception("error while closing the registry")
+                error = error or exc
+        if error is not None:
+            raise error
@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import gzip
+import json
+import logging
+import os
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional
+
+from .config import Settings
+from .memory import ConversationMemory
+
+logger = logging.getLogger(__name__)
+
+DAY = 86400.0
+
+
+class SessionArchive:
+    """Expired sessions as gzipped NDJSON, one message per line, written before deletion.
+
+    Each batch is appended as its own gzip member and synced to disk before
+    the rows go, so a crash loses no history; gzip readers see one stream.
+    Messages are archived decrypted.
+    """
+
+    def __init__(self, directory: str) -> None:
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        self.path = Path(directory) / f"sessions_{stamp}.ndjson.gz"
+        self.messages = 0
+
+    def __call__(self, messages: Iterable[Dict[str, Any]]) -> None:
+        with open(self.path, "ab") as raw:
+            with gzip.GzipFile(fileobj=raw, mode="wb") as out:
+                for message in messages:
+                    out.write(json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n")
+                    self.messages += 1
+            raw.flush()
+            os.fsync(raw.fileno())
+
+
+def retention_enabled(settings: Settings) -> bool:
+    return any(
+        value is not None
+        for value in (
+            settings.memory_session_ttl_days,
+            settings.memory_message_ttl_days,
+            settings.memory_max_messages,
+        )
+    )
+
+
+def run_retention(
+    memory: ConversationMemory, settings: Settings, stop: Optional[threading.Event] = None
+) -> Dict[str, int]:
+    """Prune ``memory`` to the ``MEMORY_*`` retention settings, then vacuum what was freed."""
+    archive = SessionArchive(settings.memory_archive_dir) if settings.memory_archive_dir else None
+    pause = settings.memory_retention_pause_ms / 1000
+    session_ttl, message_ttl = settings.memory_session_ttl_days, settings.memory_message_ttl_days
+    counts = memory.prune(
+        session_ttl=session_ttl * DAY if session_ttl is not None else None,
+        message_ttl=message_ttl * DAY if message_ttl is not None else None,
+        max_messages=settings.memory_max_messages,
+        batch_size=settings.memory_retention_batch,
+        pause=pause,
+        stop=stop,
+        archive=archive,
+    )
+    counts["archived"] = archive.messages if archive is not None else 0
+    counts["reclaimed_bytes"] = memory.incremental_vacuum(
+        settings.memory_retention_batch, pause=pause, stop=stop
+    )
+    return counts
@@ -1,24 +1,35 @@
 from __future__ import annotations
 
 import asyncio
-from typing import Any, Dict, Iterable
+import json
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Iterable, Iterator, List, Optional
 from pathlib import Path
 
-from fastapi import Depends, FastAPI, Request, WebSocket, WebSocketDisconnect
+from fastapi import Depends, FastAPI, Header, Query, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import FileResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
 from starlette.responses import Response, StreamingResponse
 
-from .engine import AssistantEngine
-from .config import load_settings
+from .config import SETTINGS, get_settings
 from .logging_utils import configure_json_logging
-from .middleware import RequestIdMiddleware, RateLimitMiddleware, SecurityHeadersMiddleware, RedisRateLimitMiddleware
-from .auth import api_key_auth
+from .middleware import (
+    BodySizeLimitMiddleware,
+    MetricsMiddleware,
+    RateLimitMiddleware,
+    RedisRateLimitMiddleware,
+    RequestIdMiddleware,
+    SecurityHeadersMiddleware,
+)
+from . import tracing
+from .auth import api_key_auth, history_auth
+from .ratelimit import RateLimit, parse_limits
+from .registry import AssistantRegistry
 
-settings = load_settings()
+settings = get_settings()
 configure_json_logging(settings.log_level)
 
 # Optional Sentry
@@ -31,54 +42,90 @@ try:  # pragma: no cover
 except Exception:
     pass
 
-# Optional OTLP tracing
+# Optional tracing (OTLP, console, or in-memory for offline inspection)
 try:  # pragma: no cover
-    if settings.otlp_endpoint:
-        from opentelemetry import trace
-        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
-        from opentelemetry.sdk.resources import SERVICE_NAME, Resource
-        from opentelemetry.sdk.trace import TracerProvider
-        from opentelemetry.sdk.trace.export import BatchSpanProcessor
-        from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
-
-        resource = Resource(attributes={SERVICE_NAME: "open-assistant-safe"})
-        provider = TracerProvider(resource=resource)
-        exporter = OTLPSpanExporter(endpoint=settings.otlp_endpoint)
-        provider.add_span_processor(BatchSpanProcessor(exporter))
-        trace.set_tracer_provider(provider)
-        # Instrument FastAPI after app created
+    tracing.configure(settings.trace_exporter, settings.otlp_endpoint)
 except Exception:
     pass
 
-REQUEST_COUNT = Counter("assistant_requests_total", "Total HTTP requests", ["path", "method", "status"])
-REQUEST_LATENCY = Histogram("assistant_request_latency_seconds", "Latency", ["path", "method"])
-
 
 class ChatRequest(BaseModel):
     session_id: str = "default"
     message: str
+    temperature: Optional[float] = None
+    # Completion cache opt-in/out; by default only temperature-0 requests are cached.
+    cache: Optional[bool] = None
 
 
 class ChatResponse(BaseModel):
     content: str
 
 
-app = FastAPI(title="Open Assistant", version="0.4.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    registry = AssistantRegistry(settings)
+    app.state.registry = registry
+    registry.start_reencrypt()
+    registry.start_retention()
+    # Per-request settings (API keys) follow SIGHUP and .env edits; the rest
+    # is read once at startup.
+    SETTINGS.install_sighup()
+    SETTINGS.start_watching()
+    try:
+        yield
+    finally:
+        SETTINGS.stop_watching()
+        app.state.registry = None
+        await registry.aclose()
+
+
+app = FastAPI(title="Open Assistant", version="0.4.0", lifespan=lifespan)
+
+
+def get_registry() -> AssistantRegistry:
+    # Set by the lifespan, which also starts the registry's background work and
+    # closes it on shutdown.
+    registry = getattr(app.state, "registry", None)
+    if registry is None:
+        raise RuntimeError(
+            "the app's lifespan has not run; serve it with an ASGI server "
+            "or use `with TestClient(app)`"
+        )
+    return registry
 
 app.add_middleware(RequestIdMiddleware)
 app.add_middleware(SecurityHeadersMiddleware)
 
 # Rate limit: Redis if configured, else in-memory
+default_limit = RateLimit.parse(settings.rate_limit)
+rate_limit_options: Dict[str, Any] = {
+    "rate": default_limit.requests,
+    "per_seconds": default_limit.window,
+    "route_limits": parse_limits(settings.rate_limit_routes),
+    "key_limits": parse_limits(settings.rate_limit_keys),
+    "max_keys": settings.rate_limit_max_keys,
+}
 try:
     if settings.redis_url:
-        import redis  # type: ignore
-
-        redis_client = redis.from_url(settings.redis_url)
-        app.add_middleware(RedisRateLimitMiddleware, redis_client=redis_client, rate=120, per_seconds=60)
+        import redis.asyncio as aioredis  # type: ignore
+
+        # Short timeouts: a slow Redis falls back to the local limiter instead
+        # of holding up every request.
+        redis_client = aioredis.from_url(
+            settings.redis_url,
+            socket_timeout=settings.rate_limit_redis_timeout,
+            socket_connect_timeout=settings.rate_limit_redis_timeout,
+        )
+        app.add_middleware(
+            RedisRateLimitMiddleware,
+            redis_client=redis_client,
+            max_lease=settings.rate_limit_lease,
+            **rate_limit_options,
+        )
     else:
-        app.add_middleware(RateLimitMiddleware, rate=120, per_seconds=60)
+        app.add_middleware(RateLimitMiddleware, **rate_limit_options)
 except Exception:
-    app.add_middleware(RateLimitMiddleware, rate=120, per_seconds=60)
+    app.add_middleware(RateLimitMiddleware, **rate_limit_options)
 
 allow_origins = settings.allowed_origins if settings.allowed_origins else ["*"]
 app.add_middleware(
@@ -89,9 +136,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Instrument FastAPI for OTLP if available
+# Outermost layers: added last. Bodies are limited before anything reads them.
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=settings.request_max_bytes)
+app.add_middleware(MetricsMiddleware, routes=app.routes)
+
+# Instrument FastAPI for tracing if available
 try:  # pragma: no cover
-    if settings.otlp_endpoint:
+    if settings.trace_exporter != "off":
         from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
 
         FastAPIInstrumentor.instrument_app(app)
@@ -107,26 +158,6 @@ async def index() -> FileResponse:
     return FileResponse(static_dir / "index.html")
 
 
-@app.middleware("http")
-async def enforce_body_size(request: Request, call_next):
-    if request.method in {"POST", "PUT", "PATCH"}:
-        body = await request.body()
-        if len(body) > settings.request_max_bytes:
-            return Response("request too large", status_code=413)
-        request._body = body  # type: ignore[attr-defined]
-    return await call_next(request)
-
-
-@app.middleware("http")
-async def metrics_middleware(request: Request, call_next):
-    path = request.url.path
-    method = request.method
-    with REQUEST_LATENCY.labels(path=path, method=method).time():
-        response = await call_next(request)
-    REQUEST_COUNT.labels(path=path, method=method, status=str(response.status_code)).inc()
-    return response
-
-
 @app.get("/health")
 async def health() -> Dict[str, str]:
     return {"status": "ok"}
@@ -134,41 +165,130 @@ async def health() -> Dict[str, str]:
 
 @app.get("/metrics")
 async def metrics() -> Response:
+    registry = getattr(app.state, "registry", None)
+    if registry is not None:
+        registry.update_metrics()
     return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
+def _wants_profile(header: Optional[str]) -> Optional[bool]:
+    # Honoured only with PROFILE_HEADER=1; otherwise PROFILE_SAMPLE_RATE decides.
+    if header is None:
+        return None
+    return header.strip().lower() in {"1", "true", "yes", "on"}
+
+
 @app.post("/chat", response_model=ChatResponse, dependencies=[Depends(api_key_auth)])
-async def chat(req: ChatRequest) -> ChatResponse:
-    engine = AssistantEngine(session_id=req.session_id)
-    content = await engine.chat_once(req.message)
+async def chat(
+    req: ChatRequest,
+    response: Response,
+    registry: AssistantRegistry = Depends(get_registry),
+    x_profile: Optional[str] = Header(default=None),
+) -> ChatResponse:
+    engine = registry.engine(req.session_id)
+    content = await engine.chat_once(
+        req.message, temperature=req.temperature, cache=req.cache, profile=_wants_profile(x_profile)
+    )
+    if engine.cache_status is not None:
+        response.headers["X-Cache"] = engine.cache_status
+    if engine.profile_id is not None:
+        response.headers["X-Profile-Id"] = engine.profile_id
     return ChatResponse(content=content)
 
 
 @app.post("/chat/stream", dependencies=[Depends(api_key_auth)])
-async def chat_stream(req: ChatRequest):
-    engine = AssistantEngine(session_id=req.session_id)
-    content = await engine.chat_once(req.message)
-
-    def event_stream(text: str) -> Iterable[bytes]:
-        words = text.split()
-        for w in words:
-            yield f"data: {w} \n\n".encode("utf-8")
+async def chat_stream(
+    req: ChatRequest,
+    registry: AssistantRegistry = Depends(get_registry),
+    x_profile: Optional[str] = Header(default=None),
+):
+    engine = registry.engine(req.session_id)
+    profile = _wants_profile(x_profile)
+
+    async def event_stream() -> AsyncIterator[bytes]:
+        # Each event carries one JSON-encoded delta so whitespace and newlines survive.
+        try:
+            async for delta in engine.stream_once(
+                req.message, temperature=req.temperature, cache=req.cache, profile=profile
+            ):
+                yield f"data: {json.dumps(delta, ensure_ascii=False)}\n\n".encode("utf-8")
+        except Exception as exc:
+            yield f"event: error\ndata: {json.dumps(str(exc))}\n\n".encode("utf-8")
+        else:
+            # Headers went out before the reply, so the cache status comes as an event.
+            if engine.cache_status is not None:
+                yield f"event: cache\ndata: {json.dumps(engine.cache_status)}\n\n".encode("utf-8")
         yield b"data: [DONE]\n\n"
 
-    return StreamingResponse(event_stream(content), media_type="text/event-stream")
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+# Rows decoded and sent per chunk of an NDJSON export.
+EXPORT_BATCH_SIZE = 500
+
+
+def _ndjson(batches: Iterable[List[Dict[str, Any]]]) -> Iterator[bytes]:
+    # A sync generator: Starlette runs it in the threadpool, one batch (one
+    # SQLite query) per chunk, and pulls the next only once the client took it.
+    for batch in batches:
+        yield b"".join(
+            json.dumps(message, ensure_ascii=False).encode("utf-8") + b"\n" for message in batch
+        )
+
+
+@app.get("/sessions/{session_id}/messages", dependencies=[Depends(history_auth)])
+async def session_messages(
+    session_id: str,
+    after: int = Query(0, ge=0, description="Id of the last message already seen"),
+    limit: Optional[int] = Query(None, ge=1),
+    registry: AssistantRegistry = Depends(get_registry),
+) -> StreamingResponse:
+    """A session's messages as NDJSON, oldest first; page on with ``after`` = the last ``id``."""
+    await registry.memory_writer.aflush()
+    batches = registry.memory.iter_message_batches(session_id, after, EXPORT_BATCH_SIZE, limit)
+    return StreamingResponse(_ndjson(batches), media_type="application/x-ndjson")
+
+
+@app.get("/export/messages", dependencies=[Depends(history_auth)])
+async def export_messages(
+    after: int = Query(0, ge=0, description="Id of the last message already seen"),
+    limit: Optional[int] = Query(None, ge=1),
+    registry: AssistantRegistry = Depends(get_registry),
+) -> StreamingResponse:
+    """Every stored message as NDJSON in id order, for bulk export."""
+    await registry.memory_writer.aflush()
+    batches = registry.memory.iter_message_batches(None, after, EXPORT_BATCH_SIZE, limit)
+    return StreamingResponse(_ndjson(batches), media_type="application/x-ndjson")
 
 
 @app.websocket("/ws")
-async def ws_endpoint(ws: WebSocket):
+async def ws_endpoint(ws: WebSocket, registry: AssistantRegistry = Depends(get_registry)):
     await ws.accept()
+    engine = registry.engine("ws")
     try:
         while True:
             data = await ws.receive_text()
-            engine = AssistantEngine(session_id="ws")
-            reply = await engine.chat_once(data)
-            await ws.send_text(reply)
+            # Plain text gets a single reply frame; {"message": ..., "stream": true}
+            # gets {"delta": ...} frames followed by {"done": true, "content": ...}.
+            # Any other text, JSON or not, is the user's message as typed.
+            try:
+                request = json.loads(data)
+            except ValueError:
+                request = None
+            if not (isinstance(request, dict) and "message" in request):
+                await ws.send_text(await engine.chat_once(data))
+                continue
+            message = str(request["message"])
+            if not request.get("stream"):
+                await ws.send_text(await engine.chat_once(message))
+                continue
+            parts = []
+            async for delta in engine.stream_once(message):
+                parts.append(delta)
+                await ws.send_json({"delta": delta})
+            await ws.send_json({"done": True, "content": "".join(parts)})
     except WebSocketDisconnect:
-        await ws.close()
+        return  # already closed by the client
 
 
 if __name__ == "__main__":
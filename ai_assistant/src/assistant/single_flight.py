@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+from .metrics import SINGLE_FLIGHT_COALESCED
+
+
+class _Call:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: "asyncio.Task[Any]") -> None:
+        self.task = task
+        self.waiters = 0
+
+
+class _Broadcast:
+    """Chunks of one upstream stream, replayed to every subscriber from the start."""
+
+    __slots__ = ("chunks", "done", "error", "changed", "task", "subscribers")
+
+    def __init__(self) -> None:
+        self.chunks: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.changed = asyncio.Event()
+        self.task: Optional["asyncio.Task[None]"] = None
+        self.subscribers = 0
+
+
+class SingleFlight:
+    """Shares one upstream call among concurrent identical requests.
+
+    The first caller for a key starts the call as its own task; callers arriving
+    while it runs wait on the same task (or, for streams, replay its chunks from
+    the start). Results and errors reach every waiter. A caller that is
+    cancelled only detaches; the upstream call is cancelled when no waiter is
+    left. Keys are dropped as soon as the call finishes, so nothing is cached.
+    """
+
+    def __init__(self) -> None:
+        self._calls: Dict[str, _Call] = {}
+        self._streams: Dict[str, _Broadcast] = {}
+
+    def __len__(self) -> int:
+        return len(self._calls) + len(self._streams)
+
+    async def do(self, key: str, call: Callable[[], Awaitable[Any]]) -> Any:
+        entry = self._calls.get(key)
+        if entry is None:
+            entry = _Call(asyncio.ensure_future(call()))
+            self._calls[key] = entry
+            entry.task.add_done_callback(lambda _t: self._forget(self._calls, key, entry))
+        else:
+            SINGLE_FLIGHT_COALESCED.labels(kind="generate").inc()
+        entry.waiters += 1
+        try:
+            return await asyncio.shield(entry.task)
+        except asyncio.CancelledError:
+            if not entry.task.done() and entry.waiters == 1:
+                # Last waiter gone: later callers must start afresh, not join a dying call.
+                self._forget(self._calls, key, entry)
+                entry.task.cancel()
+            raise
+        finally:
+            entry.waiters -= 1
+
+    async def stream(self, key: str, call: Callable[[], AsyncIterator[Any]]) -> AsyncIterator[Any]:
+        broadcast = self._streams.get(key)
+        if broadcast is None:
+            broadcast = _Broadcast()
+            self._streams[key] = broadcast
+            broadcast.task = asyncio.ensure_future(self._pump(key, broadcast, call()))
+        else:
+            SINGLE_FLIGHT_COALESCED.labels(kind="stream").inc()
+        broadcast.subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(broadcast.chunks):
+                    yield broadcast.chunks[index]
+                    index += 1
+                if broadcast.done:
+                    if broadcast.error is not None:
+                        raise broadcast.error
+                    return
+                broadcast.changed.clear()
+                await broadcast.changed.wait()
+        finally:
+            broadcast.subscribers -= 1
+            if broadcast.subscribers == 0 and not broadcast.done and broadcast.task is not None:
+                self._forget(self._streams, key, broadcast)
+                broadcast.task.cancel()
+
+    async def _pump(self, key: str, broadcast: _Broadcast, source: AsyncIterator[Any]) -> None:
+        try:
+            async for chunk in source:
+                broadcast.chunks.append(chunk)
+                broadcast.changed.set()
+        except BaseException as exc:  # includes cancellation, which subscribers must see
+            broadcast.error = exc
+            if not isinstance(exc, Exception):
+                raise
+        finally:
+            broadcast.done = True
+            broadcast.changed.set()
+            self._forget(self._streams, key, broadcast)
+
+    @staticmethod
+    def _forget(table: Dict[str, Any], key: str, entry: Any) -> None:
+        if table.get(key) is entry:
+            del table[key]
@@ -0,0 +1,221 @@
+"""A local HTTP stand-in for OpenAI and Ollama, answering from any provider.
+
+Backed by a ``ReplayProvider`` it serves recorded conversations with their
+recorded (or scaled, or fixed) timing, so the real ``OpenAIProvider`` and
+``OllamaProvider`` code paths can be load tested without a network::
+
+    python -m assistant.standin --cassette calls.jsonl --speed 2 --port 8800
+    OPENAI_API_KEY=x OPENAI_BASE_URL=http://127.0.0.1:8800/v1 make api
+    OLLAMA_HOST=http://127.0.0.1:8800 make api
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from .cassette import Cassette, CassetteMissError, ReplayProvider
+
+
+def _openai_tool_calls(tool_calls: Optional[List[Dict[str, Any]]]) -> Optional[List[Dict]]:
+    if not tool_calls:
+        return None
+    return [
+        {
+            "id": call.get("id") or f"call_{index}",
+            "type": "function",
+            "function": {"name": call["name"], "arguments": call.get("arguments") or "{}"},
+        }
+        for index, call in enumerate(tool_calls)
+    ]
+
+
+def _openai_usage(usage: Optional[Dict[str, int]]) -> Optional[Dict[str, int]]:
+    if not usage:
+        return None
+    prompt, completion = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    return {
+        "prompt_tokens": prompt,
+        "completion_tokens": completion,
+        "total_tokens": prompt + completion,
+    }
+
+
+def _ollama_tool_calls(tool_calls: Optional[List[Dict[str, Any]]]) -> Optional[List[Dict]]:
+    if not tool_calls:
+        return None
+    calls = []
+    for call in tool_calls:
+        try:
+            arguments = json.loads(call.get("arguments") or "{}")
+        except ValueError:
+            arguments = {}
+        calls.append({"function": {"name": call["name"], "arguments": arguments}})
+    return calls
+
+
+def _ollama_usage(usage: Optional[Dict[str, int]]) -> Dict[str, int]:
+    if not usage:
+        return {}
+    return {
+        "prompt_eval_count": usage.get("prompt_tokens", 0),
+        "eval_count": usage.get("completion_tokens", 0),
+    }
+
+
+def _params(body: Dict[str, Any]) -> Dict[str, Any]:
+    temperature = body.get("temperature", (body.get("options") or {}).get("temperature", 0.2))
+    return {
+        "tools": body.get("tools"),
+        "tool_choice": body.get("tool_choice"),
+        "temperature": temperature,
+    }
+
+
+async def _started(chunks: AsyncIterator[Dict[str, Any]]) -> AsyncIterator[Dict[str, Any]]:
+    """``chunks`` with the first one already awaited, so lookup errors become responses."""
+    try:
+        first = await chunks.__anext__()
+    except StopAsyncIteration:
+        first = None
+
+    async def rest() -> AsyncIterator[Dict[str, Any]]:
+        if first is not None:
+            yield first
+        async for chunk in chunks:
+            yield chunk
+
+    return rest()
+
+
+def create_app(provider: Any) -> FastAPI:
+    """Serve ``provider`` at ``/v1/chat/completions`` (OpenAI) and ``/api/chat`` (Ollama)."""
+    app = FastAPI(title="provider stand-in")
+
+    @app.exception_handler(CassetteMissError)
+    async def cassette_miss(_request: Request, exc: CassetteMissError):
+        return JSONResponse({"error": {"message": str(exc), "type": "cassette_miss"}}, 404)
+
+    @app.get("/health")
+    async def health():
+        return {"status": "ok"}
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(request: Request):
+        body = await request.json()
+        messages, params = body["messages"], _params(body)
+        model = body.get("model") or getattr(provider, "model", "stand-in")
+        common = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time())}
+        common["model"] = model
+        if not body.get("stream"):
+            response = await provider.generate(messages, **params)
+            message: Dict[str, Any] = {"role": "assistant", "content": response["content"]}
+            tool_calls = _openai_tool_calls(response.get("tool_calls"))
+            if tool_calls:
+                message["tool_calls"] = tool_calls
+            choice = {
+                "index": 0,
+                "message": message,
+                "finish_reason": "tool_calls" if tool_calls else "stop",
+            }
+            payload = {**common, "object": "chat.completion", "choices": [choice]}
+            payload["usage"] = _openai_usage(response.get("usage"))
+            return JSONResponse(payload)
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        chunks = await _started(provider.stream(messages, **params))
+
+        def event(choices: List[Dict[str, Any]], **extra: Any) -> str:
+            data = {**common, "object": "chat.completion.chunk", "choices": choices, **extra}
+            return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+        async def events() -> AsyncIterator[str]:
+            usage = None
+            tool_calls = None
+            async for chunk in chunks:
+                usage = chunk.get("usage") or usage
+                tool_calls = chunk.get("tool_calls") or tool_calls
+                if chunk.get("content"):
+                    yield event([{"index": 0, "delta": {"content": chunk["content"]}}])
+            delta: Dict[str, Any] = {}
+            if tool_calls:
+                delta["tool_calls"] = [
+                    {"index": index, **call}
+                    for index, call in enumerate(_openai_tool_calls(tool_calls) or [])
+                ]
+            finish = "tool_calls" if tool_calls else "stop"
+            yield event([{"index": 0, "delta": delta, "finish_reason": finish}])
+            if include_usage:
+                yield event([], usage=_openai_usage(usage))
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/api/chat")
+    async def ollama_chat(request: Request):
+        body = await request.json()
+        messages, params = body["messages"], _params(body)
+        model = body.get("model") or getattr(provider, "model", "stand-in")
+
+        def line(content: str, done: bool, **extra: Any) -> Dict[str, Any]:
+            message = {"role": "assistant", "content": content}
+            return {"model": model, "message": message, "done": done, **extra}
+
+        if body.get("stream") is False:
+            response = await provider.generate(messages, **params)
+            payload = line(response["content"], True, **_ollama_usage(response.get("usage")))
+            tool_calls = _ollama_tool_calls(response.get("tool_calls"))
+            if tool_calls:
+                payload["message"]["tool_calls"] = tool_calls
+            return JSONResponse(payload)
+
+        chunks = await _started(provider.stream(messages, **params))
+
+        async def lines() -> AsyncIterator[str]:
+            usage = None
+            tool_calls = None
+            async for chunk in chunks:
+                usage = chunk.get("usage") or usage
+                tool_calls = chunk.get("tool_calls") or tool_calls
+                if chunk.get("content"):
+                    yield json.dumps(line(chunk["content"], False), ensure_ascii=False) + "\n"
+            final = line("", True, **_ollama_usage(usage))
+            if tool_calls:
+                final["message"]["tool_calls"] = _ollama_tool_calls(tool_calls)
+            yield json.dumps(final, ensure_ascii=False) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Serve a cassette over the OpenAI/Ollama APIs")
+    parser.add_argument("--cassette", required=True)
+    parser.add_argument("--strict", action="store_true", help="404 for unrecorded requests")
+    parser.add_argument("--speed", type=float, default=1.0, help="0 replays without waiting")
+    parser.add_argument("--ttft-ms", type=float, help="Fixed time to the first chunk")
+    parser.add_argument("--interval-ms", type=float, help="Fixed time between chunks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8800)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    provider = ReplayProvider(
+        Cassette(args.cassette, strict=args.strict),
+        speed=args.speed,
+        ttft=args.ttft_ms / 1000 if args.ttft_ms is not None else None,
+        interval=args.interval_ms / 1000 if args.interval_ms is not None else None,
+    )
+    uvicorn.run(create_app(provider), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
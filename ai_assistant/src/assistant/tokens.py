@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from typing import Any
+
+try:
+    import tiktoken
+except Exception:  # pragma: no cover
+    tiktoken = None  # type: ignore
+
+# Chat formats wrap every message in a few framing tokens (role, separators).
+MESSAGE_OVERHEAD_TOKENS = 4
+
+
+@lru_cache(maxsize=1)
+def _encoding() -> Any:
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding("o200k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """Token count of ``text``; exact with tiktoken, otherwise ~4 bytes per token."""
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return (len(text.encode("utf-8")) + 3) // 4
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+    encoding = _encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text, disallowed_special=())[:max_tokens])
+    return text.encode("utf-8")[: max_tokens * 4].decode("utf-8", errors="ignore")
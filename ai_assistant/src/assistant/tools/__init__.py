@@ -1,47 +1,104 @@
 from __future__ import annotations
 
+import asyncio
+import inspect
 import json
-from typing import Any, Callable, Dict, List, Tuple
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
 
-from .math_tools import add_numbers, MATH_ADD_SCHEMA
-from .time_tools import get_current_time, TIME_NOW_SCHEMA
-from .web_fetch import fetch_url_text, WEB_FETCH_SCHEMA
+from .. import tracing
+from ..metrics import TOOL_CALLS, TOOL_LATENCY
+from .math_tools import MATH_ADD_SCHEMA, add_numbers  # noqa: F401
+from .registry import REGISTRY, Tool, ToolArgumentError, ToolFunc, ToolRegistry, tool  # noqa: F401
+from .time_tools import TIME_NOW_SCHEMA, get_current_time  # noqa: F401
+from .web_fetch import WEB_FETCH_SCHEMA, fetch_url_text  # noqa: F401
 
-
-ToolFunc = Callable[[Dict[str, Any]], Any]
+# Built once per process; later registrations invalidate the cached schemas.
+REGISTRY.load_entry_points()
 
 
 def get_tools() -> Dict[str, Tuple[ToolFunc, Dict[str, Any]]]:
-    return {
-        "add_numbers": (add_numbers, MATH_ADD_SCHEMA),
-        "get_current_time": (get_current_time, TIME_NOW_SCHEMA),
-        "fetch_url_text": (fetch_url_text, WEB_FETCH_SCHEMA),
-    }
+    return {name: (spec.func, spec.schema) for name, spec in REGISTRY.items()}
 
 
 def export_tool_schemas_for_openai() -> List[Dict[str, Any]]:
-    tools = []
-    for name, (_func, schema) in get_tools().items():
-        tools.append(
-            {
-                "type": "function",
-                "function": {
-                    "name": name,
-                    "description": schema.get("description", ""),
-                    "parameters": schema.get("parameters", {"type": "object", "properties": {}}),
-                },
-            }
-        )
-    return tools
+    return REGISTRY.openai_schemas()
 
 
 def call_tool(name: str, arguments_json: str) -> Any:
-    tools = get_tools()
-    if name not in tools:
+    spec = REGISTRY.get(name)
+    if spec is None:
         raise ValueError(f"Unknown tool: {name}")
-    func, _schema = tools[name]
-    try:
-        args = json.loads(arguments_json) if arguments_json else {}
-    except Exception:
-        args = {}
-    return func(args)
\ No newline at end of file
+    result = spec.func(spec.parse_arguments(arguments_json))
+    if inspect.isawaitable(result):
+        return asyncio.run(result)
+    return result
+
+
+class ToolRunner:
+    """Runs the tool calls of one model turn concurrently.
+
+    Coroutine tools are awaited on the event loop; plain functions run on a
+    bounded thread pool so blocking I/O never stalls it. Each call gets its own
+    timeout (``timeouts`` overrides ``timeout`` per tool name). A timed-out sync
+    tool keeps its worker thread until it returns, so blocking tools should still
+    bound their own I/O.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        timeout: float = 30.0,
+        timeouts: Optional[Dict[str, float]] = None,
+        registry: Optional[ToolRegistry] = None,
+    ) -> None:
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+        self.registry = registry if registry is not None else REGISTRY
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tool")
+
+    async def call(self, name: str, arguments_json: str) -> Any:
+        spec = self.registry.get(name)
+        if spec is None:
+            raise ValueError(f"Unknown tool: {name}")
+        args = spec.parse_arguments(arguments_json)
+        if spec.is_async:
+            pending = spec.func(args)
+        else:
+            pending = asyncio.get_running_loop().run_in_executor(self._executor, spec.func, args)
+        return await asyncio.wait_for(pending, self.timeouts.get(name, self.timeout))
+
+    async def run(self, tool_calls: List[Dict[str, Any]]) -> List[str]:
+        """JSON results (or ``{"error": ...}``) in the order of ``tool_calls``."""
+        return list(await asyncio.gather(*(self._run_one(call) for call in tool_calls)))
+
+    async def _run_one(self, call: Dict[str, Any]) -> str:
+        name = call.get("name") or ""
+        label = name if name in self.registry else "unknown"
+        with tracing.span("tool.call", attributes={"tool.name": label}) as current:
+            result, outcome = await self._outcome(name, label, call)
+            tracing.set_attributes(current, {"tool.outcome": outcome})
+        return result
+
+    async def _outcome(self, name: str, label: str, call: Dict[str, Any]) -> Tuple[str, str]:
+        start = time.perf_counter()
+        try:
+            result = json.dumps(await self.call(name, call.get("arguments") or "{}"))
+            outcome = "ok"
+        except asyncio.TimeoutError:
+            result = json.dumps({"error": f"Tool {name} timed out"})
+            outcome = "timeout"
+        except ToolArgumentError as exc:
+            # Structured so the model can correct the call on its next turn.
+            result = json.dumps({"error": str(exc), "details": exc.errors})
+            outcome = "invalid"
+        except Exception as exc:
+            result = json.dumps({"error": str(exc)})
+            outcome = "error"
+        TOOL_LATENCY.labels(tool=label).observe(time.perf_counter() - start)
+        TOOL_CALLS.labels(tool=label, outcome=outcome).inc()
+        return result, outcome
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import email.utils
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+
+class CachedResponse:
+    __slots__ = ("url", "text", "etag", "last_modified", "stored_at", "max_age")
+
+    def __init__(
+        self,
+        url: str,
+        text: str,
+        etag: Optional[str] = None,
+        last_modified: Optional[str] = None,
+        stored_at: float = 0.0,
+        max_age: float = 0.0,
+    ) -> None:
+        self.url = url
+        self.text = text
+        self.etag = etag
+        self.last_modified = last_modified
+        self.stored_at = stored_at
+        self.max_age = max_age
+
+    def is_fresh(self, now: Optional[float] = None) -> bool:
+        return (now if now is not None else time.time()) - self.stored_at < self.max_age
+
+    def validators(self) -> Dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+def freshness(headers: Mapping[str, str], now: Optional[float] = None) -> Optional[float]:
+    """Seconds a response may be reused without revalidation; None if it must not be stored.
+
+    Follows the private-cache rules of RFC 9111: ``no-store`` forbids storing,
+    ``no-cache`` stores but always revalidates, then ``max-age`` and finally
+    ``Expires`` relative to ``Date``.
+    """
+    directives: Dict[str, str] = {}
+    for part in headers.get("cache-control", "").split(","):
+        key, _, value = part.strip().partition("=")
+        if key:
+            directives[key.lower()] = value.strip('"')
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0.0
+    if "max-age" in directives:
+        try:
+            return max(0.0, float(directives["max-age"]))
+        except ValueError:
+            return 0.0
+    expires = _http_date(headers.get("expires"))
+    if expires is not None:
+        date = _http_date(headers.get("date"))
+        return max(0.0, expires - (date if date is not None else (now or time.time())))
+    return 0.0
+
+
+def _http_date(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return email.utils.parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+class ResponseCache:
+    """LRU of fetched pages, bounded by entry count and text size, with an optional disk tier.
+
+    The disk tier keeps one JSON file per URL under ``directory`` so cached pages
+    and their validators survive restarts; it is consulted on memory misses.
+    Responses without validators or freshness are not worth keeping and are
+    skipped by the fetcher.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 256,
+        max_bytes: int = 16 * 1024 * 1024,
+        directory: Optional[str] = None,
+    ) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.directory = Path(directory) if directory else None
+        self._entries: "OrderedDict[str, CachedResponse]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, url: str) -> Optional[CachedResponse]:
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is not None:
+                self._entries.move_to_end(url)
+                return entry
+        entry = self._read_disk(url)
+        if entry is not None:
+            self._remember(entry)
+        return entry
+
+    def put(self, entry: CachedResponse) -> None:
+        self._remember(entry)
+        self._write_disk(entry)
+
+    def _remember(self, entry: CachedResponse) -> None:
+        with self._lock:
+            previous = self._entries.pop(entry.url, None)
+            if previous is not None:
+                self._bytes -= len(previous.text)
+            self._entries[entry.url] = entry
+            self._bytes += len(entry.text)
+            while self._entries and (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                _url, evicted = self._entries.popitem(last=False)
+                self._bytes -= len(evicted.text)
+
+    def _path(self, url: str) -> Optional[Path]:
+        if self.directory is None:
+            return None
+        return self.directory / (hashlib.sha256(url.encode("utf-8")).hexdigest() + ".json")
+
+    def _read_disk(self, url: str) -> Optional[CachedResponse]:
+        path = self._path(url)
+        if path is None or not path.exists():
+            return None
+        try:
+            data = json.loads(path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        if data.get("url") != url:
+            return None
+        return CachedResponse(**data)
+
+    def _write_disk(self, entry: CachedResponse) -> None:
+        path = self._path(entry.url)
+        if path is None:
+            return
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            tmp.write_text(json.dumps(entry.to_dict()), encoding="utf-8")
+            os.replace(tmp, path)
+        except OSError:
+            tmp.unlink(missing_ok=True)
@@ -2,6 +2,8 @@ from __future__ import annotations
 
 from typing import Any, Dict
 
+from .registry import tool
+
 
 MATH_ADD_SCHEMA: Dict[str, Any] = {
     "description": "Add two numbers and return the sum.",
@@ -17,6 +19,7 @@ MATH_ADD_SCHEMA: Dict[str, Any] = {
 }
 
 
+@tool(schema=MATH_ADD_SCHEMA)
 def add_numbers(arguments: Dict[str, Any]) -> Dict[str, Any]:
     a = float(arguments.get("a"))
     b = float(arguments.get("b"))
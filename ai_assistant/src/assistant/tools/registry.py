@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import inspect
+import json
+import logging
+from importlib.metadata import entry_points
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+ToolFunc = Callable[[Dict[str, Any]], Any]
+# Each error is {"path": "a.b", "message": "..."}; an empty path means the whole arguments object.
+Validator = Callable[[Any, str], List[Dict[str, str]]]
+
+ENTRY_POINT_GROUP = "assistant.tools"
+
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "integer": lambda v: (isinstance(v, int) and not isinstance(v, bool))
+    or (isinstance(v, float) and v.is_integer()),
+}
+
+
+class ToolArgumentError(ValueError):
+    def __init__(self, tool: str, errors: List[Dict[str, str]]) -> None:
+        super().__init__(f"Invalid arguments for {tool}")
+        self.tool = tool
+        self.errors = errors
+
+
+def _join(path: str, key: Any) -> str:
+    return f"{path}.{key}" if path else str(key)
+
+
+def compile_schema(schema: Dict[str, Any]) -> Validator:
+    """Compile the JSON Schema subset used by tool parameters into a validator.
+
+    Supports ``type``, ``enum``, ``properties``, ``required``,
+    ``additionalProperties`` (boolean or schema), ``items`` and the numeric and
+    string length bounds; other keywords are ignored. The schema is walked once
+    here, so validating a call is a handful of closure calls.
+    """
+    checks: List[Validator] = []
+
+    types = schema.get("type")
+    if types is not None:
+        names = [types] if isinstance(types, str) else list(types)
+        predicates = [_TYPE_CHECKS[name] for name in names if name in _TYPE_CHECKS]
+        expected = " or ".join(names)
+
+        def check_type(value: Any, path: str) -> List[Dict[str, str]]:
+            if any(predicate(value) for predicate in predicates):
+                return []
+            return [{"path": path, "message": f"expected {expected}"}]
+
+        checks.append(check_type)
+
+    if "enum" in schema:
+        allowed = list(schema["enum"])
+
+        def check_enum(value: Any, path: str) -> List[Dict[str, str]]:
+            if value in allowed:
+                return []
+            return [{"path": path, "message": f"must be one of {allowed}"}]
+
+        checks.append(check_enum)
+
+    bounds: List[Tuple[str, Any, Callable[[Any, Any], bool]]] = []
+    for keyword, fails in (
+        ("minimum", lambda v, bound: v < bound),
+        ("maximum", lambda v, bound: v > bound),
+        ("minLength", lambda v, bound: len(v) < bound),
+        ("maxLength", lambda v, bound: len(v) > bound),
+    ):
+        if keyword in schema:
+            bounds.append((keyword, schema[keyword], fails))
+    if bounds:
+
+        def check_bounds(value: Any, path: str) -> List[Dict[str, str]]:
+            errors = []
+            for keyword, bound, fails in bounds:
+                numeric = keyword in ("minimum", "maximum")
+                applies = _TYPE_CHECKS["number"](value) if numeric else isinstance(value, str)
+                if applies and fails(value, bound):
+                    errors.append({"path": path, "message": f"violates {keyword} {bound}"})
+            return errors
+
+        checks.append(check_bounds)
+
+    properties = {key: compile_schema(sub) for key, sub in schema.get("properties", {}).items()}
+    required = list(schema.get("required", ()))
+    additional = schema.get("additionalProperties", True)
+    extra = compile_schema(additional) if isinstance(additional, dict) else None
+    if properties or required or additional is not True:
+
+        def check_object(value: Any, path: str) -> List[Dict[str, str]]:
+            if not isinstance(value, dict):
+                return []
+            errors = [
+                {"path": _join(path, key), "message": "is required"}
+                for key in required
+                if key not in value
+            ]
+            for key, item in value.items():
+                validator = properties.get(key, extra)
+                if validator is not None:
+                    errors.extend(validator(item, _join(path, key)))
+                elif additional is False:
+                    errors.append({"path": _join(path, key), "message": "is not allowed"})
+            return errors
+
+        checks.append(check_object)
+
+    if isinstance(schema.get("items"), dict):
+        item_validator = compile_schema(schema["items"])
+
+        def check_items(value: Any, path: str) -> List[Dict[str, str]]:
+            if not isinstance(value, list):
+                return []
+            errors: List[Dict[str, str]] = []
+            for index, item in enumerate(value):
+                errors.extend(item_validator(item, _join(path, index)))
+            return errors
+
+        checks.append(check_items)
+
+    def validate(value: Any, path: str = "") -> List[Dict[str, str]]:
+        errors: List[Dict[str, str]] = []
+        for check in checks:
+            errors.extend(check(value, path))
+            if errors:
+                break  # later checks assume the earlier ones (e.g. the type) passed
+        return errors
+
+    return validate
+
+
+class Tool:
+    __slots__ = ("name", "func", "schema", "is_async", "validator")
+
+    def __init__(self, name: str, func: ToolFunc, schema: Dict[str, Any]) -> None:
+        self.name = name
+        self.func = func
+        self.schema = schema
+        self.is_async = inspect.iscoroutinefunction(func)
+        parameters = schema.get("parameters", {"type": "object", "properties": {}})
+        self.validator = compile_schema(parameters)
+
+    def parse_arguments(self, arguments_json: str) -> Dict[str, Any]:
+        """Decode and validate model-supplied arguments or raise ``ToolArgumentError``."""
+        try:
+            args = json.loads(arguments_json) if arguments_json else {}
+        except ValueError as exc:
+            raise ToolArgumentError(
+                self.name, [{"path": "", "message": f"arguments are not valid JSON: {exc}"}]
+            ) from None
+        errors = self.validator(args, "")
+        if errors:
+            raise ToolArgumentError(self.name, errors)
+        return args
+
+    def openai_schema(self) -> Dict[str, Any]:
+        return {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": self.schema.get("description", ""),
+                "parameters": self.schema.get("parameters", {"type": "object", "properties": {}}),
+            },
+        }
+
+
+class ToolRegistry:
+    """Tools by name, with their validators and provider schema payloads built once.
+
+    Tools are added with ``register`` or the ``tool`` decorator, and third-party
+    packages can contribute them through the ``assistant.tools`` entry point group
+    (each entry point loads a ``Tool`` or a zero-argument callable returning a list
+    of them). The exported schema list is cached until the next registration.
+    """
+
+    def __init__(self) -> None:
+        self._tools: Dict[str, Tool] = {}
+        self._openai_schemas: Optional[List[Dict[str, Any]]] = None
+
+    def __contains__(self, name: object) -> bool:
+        return name in self._tools
+
+    def __iter__(self):
+        return iter(self._tools)
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def items(self):
+        return self._tools.items()
+
+    def get(self, name: str) -> Optional[Tool]:
+        return self._tools.get(name)
+
+    def register(self, name: str, func: ToolFunc, schema: Dict[str, Any]) -> Tool:
+        tool = Tool(name, func, schema)
+        self._tools[name] = tool
+        self._openai_schemas = None
+        return tool
+
+    def tool(self, name: Optional[str] = None, *, schema: Dict[str, Any]):
+        def decorator(func: ToolFunc) -> ToolFunc:
+            self.register(name or func.__name__, func, schema)
+            return func
+
+        return decorator
+
+    def load_entry_points(self, group: str = ENTRY_POINT_GROUP) -> None:
+        for entry_point in entry_points(group=group):
+            try:
+                loaded = entry_point.load()
+                tools = [loaded] if isinstance(loaded, Tool) else list(loaded())
+            except Exception:
+                logger.exception("failed to load tool entry point %s", entry_point.name)
+                continue
+            for tool in tools:
+                self._tools[tool.name] = tool
+            self._openai_schemas = None
+
+    def openai_schemas(self) -> List[Dict[str, Any]]:
+        """Shared, pre-built OpenAI ``tools`` payload; callers must not mutate it."""
+        if self._openai_schemas is None:
+            self._openai_schemas = [tool.openai_schema() for tool in self._tools.values()]
+        return self._openai_schemas
+
+
+REGISTRY = ToolRegistry()
+tool = REGISTRY.tool
@@ -3,6 +3,8 @@ from __future__ import annotations
 from datetime import datetime, timezone
 from typing import Any, Dict
 
+from .registry import tool
+
 
 TIME_NOW_SCHEMA: Dict[str, Any] = {
     "description": "Get the current UTC time in ISO 8601 format.",
@@ -14,6 +16,7 @@ TIME_NOW_SCHEMA: Dict[str, Any] = {
 }
 
 
+@tool(schema=TIME_NOW_SCHEMA)
 def get_current_time(_arguments: Dict[str, Any]) -> Dict[str, Any]:
     now = datetime.now(timezone.utc).isoformat()
     return {"utc": now}
\ No newline at end of file
@@ -1,9 +1,18 @@
 from __future__ import annotations
 
-from typing import Any, Dict
+import asyncio
+import time
+from typing import Any, Dict, Optional
 
-from urllib.request import Request, urlopen
-from urllib.error import URLError, HTTPError
+import httpx
+
+from ..metrics import WEB_FETCH_REQUESTS
+from .http_cache import CachedResponse, ResponseCache, freshness
+from .registry import tool
+
+MAX_BYTES = 100_000
+TIMEOUT_SECONDS = 10.0
+USER_AGENT = "OpenAssistant/1.0"
 
 
 WEB_FETCH_SCHEMA: Dict[str, Any] = {
@@ -22,20 +31,135 @@ WEB_FETCH_SCHEMA: Dict[str, Any] = {
 }
 
 
-def fetch_url_text(arguments: Dict[str, Any]) -> Dict[str, Any]:
+class WebFetcher:
+    """Fetches pages over a pooled client, caching them by HTTP semantics.
+
+    Fresh cache entries are served without a request, stale ones are revalidated
+    with ``If-None-Match``/``If-Modified-Since``, and concurrent fetches of the
+    same URL share one request. Bodies are streamed and reading stops at
+    ``max_bytes``.
+    """
+
+    def __init__(
+        self,
+        client: Optional[httpx.AsyncClient] = None,
+        cache: Optional[ResponseCache] = None,
+        max_bytes: int = MAX_BYTES,
+        timeout: float = TIMEOUT_SECONDS,
+    ) -> None:
+        self._owns_client = client is None
+        self.client = client or httpx.AsyncClient(follow_redirects=True)
+        self.cache = cache if cache is not None else ResponseCache()
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self._inflight: Dict[str, "asyncio.Task[str]"] = {}
+
+    async def fetch(self, url: str) -> str:
+        task = self._inflight.get(url)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(url))
+            self._inflight[url] = task
+            task.add_done_callback(lambda _t: self._inflight.pop(url, None))
+        else:
+            WEB_FETCH_REQUESTS.labels(result="coalesced").inc()
+        # Shielded so one caller giving up does not cancel the fetch for the others.
+        return await asyncio.shield(task)
+
+    async def _fetch(self, url: str) -> str:
+        cached = await self._cache_call(self.cache.get, url)
+        if cached is not None and cached.is_fresh():
+            WEB_FETCH_REQUESTS.labels(result="hit").inc()
+            return cached.text
+
+        headers = {"User-Agent": USER_AGENT}
+        if cached is not None:
+            headers.update(cached.validators())
+        try:
+            async with self.client.stream(
+                "GET", url, headers=headers, timeout=self.timeout, follow_redirects=True
+            ) as resp:
+                if resp.status_code == 304 and cached is not None:
+                    WEB_FETCH_REQUESTS.labels(result="revalidated").inc()
+                    cached.etag = resp.headers.get("etag", cached.etag)
+                    await self._store(cached, resp.headers)
+                    return cached.text
+                if resp.status_code >= 400:
+                    raise ValueError(f"HTTP error: {resp.status_code}")
+                text = await self._read_capped(resp)
+        except httpx.HTTPError as exc:
+            raise ValueError(f"Network error: {exc}") from None
+
+        WEB_FETCH_REQUESTS.labels(result="miss").inc()
+        if resp.status_code == 200:
+            entry = CachedResponse(
+                url,
+                text,
+                etag=resp.headers.get("etag"),
+                last_modified=resp.headers.get("last-modified"),
+            )
+            await self._store(entry, resp.headers)
+        return text
+
+    async def _read_capped(self, resp: httpx.Response) -> str:
+        chunks = []
+        size = 0
+        async for chunk in resp.aiter_bytes():
+            chunks.append(chunk)
+            size += len(chunk)
+            if size >= self.max_bytes:
+                break  # the rest of the body is never downloaded
+        data = b"".join(chunks)[: self.max_bytes]
+        return data.decode(resp.charset_encoding or "utf-8", errors="replace")
+
+    async def _store(self, entry: CachedResponse, headers: httpx.Headers) -> None:
+        max_age = freshness(headers)
+        if max_age is None:
+            return
+        if max_age <= 0 and not (entry.etag or entry.last_modified):
+            return  # could never be reused
+        entry.stored_at = time.time()
+        entry.max_age = max_age
+        await self._cache_call(self.cache.put, entry)
+
+    async def _cache_call(self, func: Any, arg: Any) -> Any:
+        if self.cache.directory is not None:
+            return await asyncio.to_thread(func, arg)
+        return func(arg)
+
+    async def aclose(self) -> None:
+        if self._owns_client:
+            await self.client.aclose()
+
+
+_fetcher: Optional[WebFetcher] = None
+# Kept across standalone calls, which each have their own client.
+_standalone_cache = ResponseCache()
+
+
+def configure(fetcher: Optional[WebFetcher]) -> None:
+    """Use ``fetcher`` (sharing the app's client and cache) for the ``fetch_url_text`` tool."""
+    global _fetcher
+    _fetcher = fetcher
+
+
+def configured() -> Optional[WebFetcher]:
+    """The fetcher set with ``configure``, if any."""
+    return _fetcher
+
+
+async def _fetch(url: str) -> str:
+    if _fetcher is not None:
+        return await _fetcher.fetch(url)
+    # Standalone use: a client per call, closed here, as its connections belong to
+    # the event loop that opened them.
+    async with httpx.AsyncClient(follow_redirects=True) as client:
+        return await WebFetcher(client=client, cache=_standalone_cache).fetch(url)
+
+
+@tool(schema=WEB_FETCH_SCHEMA)
+async def fetch_url_text(arguments: Dict[str, Any]) -> Dict[str, Any]:
     url = str(arguments.get("url", ""))
     if not (url.startswith("http://") or url.startswith("https://")):
         raise ValueError("Only http(s) URLs are allowed")
-    req = Request(url, headers={"User-Agent": "OpenAssistant/1.0"})
-    try:
-        with urlopen(req, timeout=10) as resp:
-            charset = resp.headers.get_content_charset() or "utf-8"
-            data = resp.read(100_000 + 1)
-            if len(data) > 100_000:
-                data = data[:100_000]
-            text = data.decode(charset, errors="replace")
-    except HTTPError as e:
-        raise ValueError(f"HTTP error: {e.code}")
-    except URLError as e:
-        raise ValueError(f"Network error: {e.reason}")
-    return {"url": url, "text": text}
\ No newline at end of file
+    text = await _fetch(url)
+    return {"url": url, "text": text}
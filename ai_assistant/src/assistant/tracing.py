@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import logging
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
+try:
+    from opentelemetry import trace
+    from opentelemetry.trace import Status, StatusCode
+except ImportError:  # pragma: no cover
+    trace = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+
+# Spans go to this tracer once ``configure`` ran, else to the global one (a
+# no-op unless something else installed a provider).
+_tracer: Any = None
+_memory_exporter: Any = None
+
+
+def configure(exporter: Optional[str], endpoint: Optional[str] = None) -> Any:
+    """Install a tracer provider exporting to ``otlp``, ``console`` or ``memory``.
+
+    ``memory`` keeps finished spans in process (``memory_exporter()``) so traces
+    and attached profiles can be inspected offline. Returns the provider, or
+    None when tracing is off or OpenTelemetry's SDK is missing.
+    """
+    global _tracer, _memory_exporter
+    if trace is None or not exporter or exporter == "off":
+        return None
+    try:
+        from opentelemetry.sdk.resources import SERVICE_NAME, Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import (
+            BatchSpanProcessor,
+            ConsoleSpanExporter,
+            SimpleSpanProcessor,
+        )
+        from opentelemetry.sdk.trace.export.in_memory_span_exporter import InMemorySpanExporter
+    except ImportError:  # pragma: no cover
+        logger.warning("tracing requested but opentelemetry-sdk is not installed")
+        return None
+
+    provider = TracerProvider(resource=Resource(attributes={SERVICE_NAME: "open-assistant-safe"}))
+    if exporter == "memory":
+        _memory_exporter = InMemorySpanExporter()
+        provider.add_span_processor(SimpleSpanProcessor(_memory_exporter))
+    elif exporter == "console":
+        provider.add_span_processor(SimpleSpanProcessor(ConsoleSpanExporter()))
+    elif exporter == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint)))
+    else:
+        raise ValueError(f"unknown trace exporter: {exporter}")
+    trace.set_tracer_provider(provider)  # ignored (with a warning) if one is already set
+    _tracer = provider.get_tracer("assistant")
+    return provider
+
+
+def memory_exporter() -> Any:
+    return _memory_exporter
+
+
+def _get_tracer() -> Any:
+    return _tracer or trace.get_tracer("assistant")
+
+
+def start_span(name: str, parent: Any = None, attributes: Optional[Dict[str, Any]] = None) -> Any:
+    """A started span, child of ``parent`` (a span) or else of the current span.
+
+    The span is not made current: engine streams yield across stages, and an
+    explicit parent keeps the tree right wherever the generator is resumed.
+    """
+    if trace is None:
+        return None
+    context = trace.set_span_in_context(parent) if parent is not None else None
+    return _get_tracer().start_span(name, context=context, attributes=_clean(attributes))
+
+
+@contextmanager
+def span(
+    name: str, parent: Any = None, attributes: Optional[Dict[str, Any]] = None
+) -> Iterator[Any]:
+    current = start_span(name, parent, attributes)
+    try:
+        yield current
+    except BaseException as exc:
+        record_error(current, exc)
+        raise
+    finally:
+        if current is not None:
+            current.end()
+
+
+@contextmanager
+def use(current: Any) -> Iterator[None]:
+    """Make ``current`` the parent of spans started (e.g. by tools) inside the block."""
+    if trace is None or current is None:
+        yield
+        return
+    with trace.use_span(current, end_on_exit=False):
+        yield
+
+
+def set_attributes(current: Any, attributes: Dict[str, Any]) -> None:
+    if current is not None and current.is_recording():
+        current.set_attributes(_clean(attributes))
+
+
+def record_error(current: Any, exc: BaseException) -> None:
+    if current is None or not current.is_recording():
+        return
+    if isinstance(exc, Exception):
+        current.record_exception(exc)
+        current.set_status(Status(StatusCode.ERROR, str(exc)))
+    else:  # cancelled or closed early
+        current.set_attribute("assistant.cancelled", True)
+
+
+def _clean(attributes: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    # OpenTelemetry drops None values with a warning; leave them out instead.
+    return {key: value for key, value in (attributes or {}).items() if value is not None}
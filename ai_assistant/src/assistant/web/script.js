@@ -47,9 +47,9 @@ async function send(){
         acc = chunks.pop();
         for(const chunk of chunks){
           if(chunk.startsWith('data: ')){
-            const payload = chunk.slice(6).trim();
+            const payload = chunk.slice(6);
             if(payload === '[DONE]') break;
-            contentSpan.textContent += payload;
+            contentSpan.textContent += JSON.parse(payload);
             chatEl.scrollTop = chatEl.scrollHeight;
           }
         }
@@ -16,9 +16,9 @@ def test_health():
 
 
 def test_chat():
-    client = TestClient(app)
-    r = client.post("/chat", json={"session_id": "t1", "message": "Hello"})
-    assert r.status_code == 200
-    data = r.json()
-    assert "content" in data
-    assert isinstance(data["content"], str)
\ No newline at end of file
+    with TestClient(app) as client:
+        r = client.post("/chat", json={"session_id": "t1", "message": "Hello"})
+        assert r.status_code == 200
+        data = r.json()
+        assert "content" in data
+        assert isinstance(data["content"], str)
\ No newline at end of file
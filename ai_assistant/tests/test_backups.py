@@ -0,0 +1,137 @@
+from __future__ import annotations
+
+import gzip
+import sqlite3
+import threading
+
+import pytest
+
+from assistant import backup_cli, backups
+from assistant.backups import BackupError, create_backup, read_manifest, verify_backup
+from assistant.memory import MIGRATIONS, ConversationMemory, mark_restored
+
+
+def _fill(memory, start, stop, size=2000):
+    memory.append_many([("s", "user", f"{i}:" + "x" * size, 1) for i in range(start, stop)])
+
+
+def _ids(path):
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return [row[0] for row in conn.execute("SELECT id FROM messages ORDER BY id")]
+    finally:
+        conn.close()
+
+
+def test_backup_is_a_snapshot_taken_without_blocking_writers(tmp_path, monkeypatch):
+    path = str(tmp_path / "mem.sqlite3")
+    _fill(ConversationMemory(path), 0, 300)
+    written = []
+
+    def writer():
+        conn = sqlite3.connect(path, timeout=0.2)  # fails if the backup holds a lock
+        for _ in range(20):
+            with conn:
+                conn.execute(
+                    "INSERT INTO messages (session_id, role, content) VALUES ('w', 'u', 'w')"
+                )
+            written.append(1)
+        conn.close()
+
+    def progress(pause):
+        def step(status, remaining, total):
+            if not written:
+                thread = threading.Thread(target=writer)
+                thread.start()
+                thread.join()
+
+        return step
+
+    monkeypatch.setattr(backups, "_progress", progress)
+    backup = create_backup(path, str(tmp_path / "backups"), step_pages=4)
+    assert len(written) == 20
+    assert _ids(str(backup)) == list(range(1, 301))
+    assert len(_ids(path)) == 320
+    assert verify_backup(backup) == []
+
+
+def test_incremental_and_differential_backups_store_changed_pages(tmp_path):
+    path = str(tmp_path / "mem.sqlite3")
+    dest = str(tmp_path / "backups")
+    memory = ConversationMemory(path)
+    _fill(memory, 0, 200)
+    full = create_backup(path, dest, compress=True)
+    _fill(memory, 200, 210)
+    first = create_backup(path, dest, mode="incremental")
+    _fill(memory, 210, 220)
+    second = create_backup(path, dest, mode="incremental", compress=True)
+    differential = create_backup(path, dest, mode="differential")
+
+    assert full.name.endswith(".sqlite3.gz") and second.name.endswith(".delta.gz")
+    assert read_manifest(first)["base"] == full.name
+    assert read_manifest(second)["base"] == first.name
+    assert read_manifest(differential)["base"] == full.name
+    pages = read_manifest(full)["page_count"]
+    assert read_manifest(first)["changed_pages"] < pages // 4
+    for backup in (full, first, second, differential):
+        assert verify_backup(backup) == []
+
+    restored = str(tmp_path / "restored.sqlite3")
+    backups.materialize(second, restored)
+    assert _ids(restored) == list(range(1, 221))
+
+
+def test_verify_and_restore_reject_a_damaged_chain(tmp_path):
+    path = str(tmp_path / "mem.sqlite3")
+    dest = str(tmp_path / "backups")
+    memory = ConversationMemory(path)
+    _fill(memory, 0, 50)
+    create_backup(path, dest)
+    _fill(memory, 50, 60)
+    delta = create_backup(path, dest, mode="incremental", compress=True)
+    data = gzip.decompress(delta.read_bytes())
+    delta.write_bytes(gzip.compress(data[:-100] + b"\xff" * 100))
+
+    assert verify_backup(delta)
+    with pytest.raises(BackupError):
+        backups.restore_backup(delta, path)
+    assert _ids(path) == list(range(1, 61))
+
+
+def test_restore_replaces_a_live_store(tmp_path, monkeypatch):
+    path = str(tmp_path / "mem.sqlite3")
+    monkeypatch.setenv("ASSISTANT_DB_PATH", path)
+    memory = ConversationMemory(path)
+    memory.append("s", "user", "kept")
+    backup = backup_cli.backup(str(tmp_path / "backups"), compress=True)
+    memory.append("s", "user", "lost")
+
+    backup_cli.restore(backup)
+    assert memory.fetch("s") == [{"role": "user", "content": "kept"}]
+    memory.append("s", "user", "after")
+    assert [m["content"] for m in ConversationMemory(path).fetch("s")] == ["kept", "after"]
+    assert backup_cli.verify(backup) == []
+
+
+def test_restoring_an_older_schema_migrates_it(tmp_path):
+    path = str(tmp_path / "mem.sqlite3")
+    memory = ConversationMemory(path)
+    memory.append("s", "user", "current")
+    assert memory.fetch("s")
+
+    # A store from before token counts, summaries and the completion cache.
+    old = tmp_path / "old.sqlite3"
+    conn = sqlite3.connect(old)
+    conn.execute(MIGRATIONS[0])
+    conn.execute(
+        "INSERT INTO messages (session_id, role, content) VALUES ('s', 'user', ?)", (b"old",)
+    )
+    conn.commit()
+    conn.close()
+
+    backups.restore_backup(old, path)
+    mark_restored(path)
+    assert memory.fetch("s") == [{"role": "user", "content": "old"}]
+    memory.append("s", "user", "new")
+    assert memory.schema_version() == len(MIGRATIONS)
+    assert [m["content"] for m in ConversationMemory(path).fetch("s")] == ["old", "new"]
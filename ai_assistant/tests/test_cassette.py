@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from assistant.cassette import Cassette, CassetteMissError, RecordingProvider, ReplayProvider
+from assistant.config import Settings
+from assistant.model_providers.ollama_provider import OllamaProvider
+from assistant.model_providers.openai_provider import OpenAIProvider
+from assistant.registry import AssistantRegistry
+from assistant.standin import create_app
+
+TOOLS = [{"type": "function", "function": {"name": "get_current_time", "parameters": {}}}]
+USAGE = {"prompt_tokens": 12, "completion_tokens": 3}
+
+
+class _Upstream:
+    name = "fake"
+    model = "fake-1"
+
+    async def generate(self, messages, tools=None, tool_choice=None, temperature=0.2, timeout=None):
+        await asyncio.sleep(0.05)
+        return {"content": "hi there", "tool_calls": None, "usage": USAGE}
+
+    async def stream(self, messages, tools=None, tool_choice=None, temperature=0.2, timeout=None):
+        await asyncio.sleep(0.05)
+        yield {"content": "hi ", "tool_calls": None}
+        await asyncio.sleep(0.05)
+        yield {"content": "there", "tool_calls": None}
+        call = {"id": "call_1", "name": "get_current_time", "arguments": "{}"}
+        yield {"content": "", "tool_calls": [call], "usage": USAGE}
+
+
+async def _collect(chunks):
+    return [chunk async for chunk in chunks]
+
+
+def _record(path):
+    recorder = RecordingProvider(_Upstream(), Cassette(str(path)))
+    messages = [{"role": "user", "content": "hello"}]
+
+    async def main():
+        await recorder.generate(messages)
+        return await _collect(recorder.stream(messages, tools=TOOLS))
+
+    return messages, asyncio.run(main())
+
+
+@pytest.mark.parametrize("name", ["calls.jsonl", "calls.jsonl.gz"])
+def test_replay_reproduces_recorded_chunks_and_timing(tmp_path, name):
+    messages, recorded = _record(tmp_path / name)
+    cassette = Cassette(str(tmp_path / name), strict=True)
+    assert [interaction["kind"] for interaction in cassette.interactions] == ["generate", "stream"]
+    assert cassette.interactions[1]["request"]["tools"] == ["get_current_time"]
+
+    async def main():
+        replay = ReplayProvider(cassette)
+        start = time.perf_counter()
+        response = await replay.generate(messages)
+        generate_s = time.perf_counter() - start
+        start = time.perf_counter()
+        chunks = await _collect(replay.stream(messages, tools=TOOLS))
+        return response, generate_s, chunks, time.perf_counter() - start
+
+    response, generate_s, chunks, stream_s = asyncio.run(main())
+    assert response == {"content": "hi there", "tool_calls": None, "usage": USAGE}
+    assert chunks == recorded
+    assert 0.05 <= generate_s < 0.5
+    assert 0.1 <= stream_s < 0.5
+
+
+def test_replay_speed_and_fixed_latency(tmp_path):
+    messages, _recorded = _record(tmp_path / "calls.jsonl")
+    cassette = Cassette(str(tmp_path / "calls.jsonl"))
+
+    async def timed(replay):
+        start = time.perf_counter()
+        await _collect(replay.stream(messages, tools=TOOLS))
+        return time.perf_counter() - start
+
+    assert asyncio.run(timed(ReplayProvider(cassette, speed=0))) < 0.05
+    assert asyncio.run(timed(ReplayProvider(cassette, speed=10))) < 0.05
+    fixed = asyncio.run(timed(ReplayProvider(cassette, ttft=0.1, interval=0.05)))
+    assert 0.2 <= fixed < 0.5  # 0.1 to the first of three chunks, then two intervals
+
+
+def test_unrecorded_requests_cycle_unless_strict(tmp_path):
+    _record(tmp_path / "calls.jsonl")
+    other = [{"role": "user", "content": "something else"}]
+    loose = ReplayProvider(Cassette(str(tmp_path / "calls.jsonl")), speed=0)
+    assert asyncio.run(loose.generate(other))["content"] == "hi there"
+    assert asyncio.run(loose.generate(other))["tool_calls"][0]["name"] == "get_current_time"
+    strict = ReplayProvider(Cassette(str(tmp_path / "calls.jsonl"), strict=True), speed=0)
+    with pytest.raises(CassetteMissError):
+        asyncio.run(strict.generate(other))
+
+
+def test_replay_matches_each_recorded_model(tmp_path):
+    messages, _recorded = _record(tmp_path / "calls.jsonl")
+    upstream = _Upstream()
+    upstream.model = "fake-2"
+    recorder = RecordingProvider(upstream, Cassette(str(tmp_path / "calls.jsonl")))
+    other = [{"role": "user", "content": "something else"}]
+    asyncio.run(recorder.generate(other))
+
+    cassette = Cassette(str(tmp_path / "calls.jsonl"), strict=True)
+    assert cassette.models == ["fake-1", "fake-2"]
+    replay = ReplayProvider(cassette, speed=0)
+    assert replay.model == "fake-1"
+    assert asyncio.run(replay.generate(other))["content"] == "hi there"
+    assert asyncio.run(replay.generate(messages))["content"] == "hi there"
+
+    pinned = ReplayProvider(cassette, speed=0, model="fake-2")
+    assert pinned.model == "fake-2"
+    assert asyncio.run(pinned.generate(other))["content"] == "hi there"
+    with pytest.raises(CassetteMissError):
+        asyncio.run(pinned.generate(messages))
+
+
+def _standin_client(tmp_path, strict=False):
+    _record(tmp_path / "calls.jsonl")
+    replay = ReplayProvider(Cassette(str(tmp_path / "calls.jsonl"), strict=strict), speed=0)
+    transport = httpx.ASGITransport(app=create_app(replay))
+    return httpx.AsyncClient(transport=transport, base_url="http://standin")
+
+
+def test_standin_speaks_openai_to_the_real_provider(tmp_path):
+    messages = [{"role": "user", "content": "hello"}]
+    standin = _standin_client(tmp_path)
+
+    async def main():
+        async with standin as client:
+            provider = OpenAIProvider(
+                "x", "fake-1", http_client=client, base_url="http://standin/v1"
+            )
+            return (
+                await provider.generate(messages),
+                await _collect(provider.stream(messages, tools=TOOLS)),
+            )
+
+    response, chunks = asyncio.run(main())
+    assert response == {"content": "hi there", "tool_calls": None, "usage": USAGE}
+    assert "".join(chunk["content"] for chunk in chunks) == "hi there"
+    assert chunks[-1]["tool_calls"] == [
+        {"id": "call_1", "name": "get_current_time", "arguments": "{}"}
+    ]
+    assert chunks[-1]["usage"] == USAGE
+
+
+def test_standin_speaks_ollama_and_rejects_strict_misses(tmp_path):
+    messages = [{"role": "user", "content": "hello"}]
+    standin = _standin_client(tmp_path, strict=True)
+
+    async def main():
+        async with standin as client:
+            provider = OllamaProvider("http://standin", "fake-1", client=client)
+            response = await provider.generate(messages)
+            other = await client.post("/api/chat", json={"messages": [], "stream": True})
+            return response, other
+
+    response, other = asyncio.run(main())
+    assert response == {"content": "hi there", "tool_calls": None, "usage": USAGE}
+    assert other.status_code == 404
+
+
+def test_registry_replays_and_records_from_settings(tmp_path):
+    _record(tmp_path / "calls.jsonl")
+    settings = Settings(
+        assistant_db_path=str(tmp_path / "mem.sqlite3"),
+        provider_replay=str(tmp_path / "calls.jsonl"),
+        provider_replay_speed=0,
+    )
+    registry = AssistantRegistry(settings)
+    assert isinstance(registry.provider, ReplayProvider)
+    assert registry.provider.model == "fake-1"
+
+    async def main():
+        try:
+            return await registry.engine("s").chat_once("hello")
+        finally:
+            await registry.aclose()
+
+    assert asyncio.run(main()) == "hi there"
+
+    recorded = tmp_path / "recorded.jsonl"
+    settings = Settings(
+        assistant_db_path=str(tmp_path / "mem2.sqlite3"), provider_record=str(recorded)
+    )
+    registry = AssistantRegistry(settings)
+    assert isinstance(registry.provider, RecordingProvider)
+    asyncio.run(main())
+    assert Cassette(str(recorded)).interactions[0]["provider"] == "local"
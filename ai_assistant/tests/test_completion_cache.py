@@ -0,0 +1,176 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+
+from fastapi.testclient import TestClient
+from prometheus_client import generate_latest
+
+from assistant.backups import create_backup, restore_backup
+from assistant.completion_cache import (
+    CachingProvider,
+    MemoryCompletionBackend,
+    SQLiteCompletionBackend,
+    fingerprint,
+)
+from assistant.config import Settings
+from assistant.memory import ConversationMemory, mark_restored
+from assistant.registry import AssistantRegistry
+from assistant.server import app, get_registry
+
+
+class _CountingProvider:
+    model = "test-model"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def generate(self, messages, tools=None, tool_choice=None, temperature=0.2, timeout=None):
+        self.calls += 1
+        return {"content": f"reply {self.calls}", "tool_calls": None}
+
+    async def stream(self, messages, tools=None, tool_choice=None, temperature=0.2, timeout=None):
+        self.calls += 1
+        for piece in ("str", "eamed"):
+            yield {"content": piece, "tool_calls": None}
+
+
+def _ask(provider, text, **kwargs):
+    return asyncio.run(provider.generate([{"role": "user", "content": text}], **kwargs))
+
+
+def test_fingerprint_normalizes_messages():
+    base = fingerprint("m", [{"role": "user", "content": "Hi"}], temperature=0)
+    assert fingerprint("m", [{"role": "user", "content": "  Hi\n", "id": 7}], temperature=0) == base
+    assert fingerprint("m", [{"role": "user", "content": "Hi"}], temperature=0.5) != base
+    assert fingerprint("other", [{"role": "user", "content": "Hi"}], temperature=0) != base
+    tools = [{"type": "function", "function": {"name": "t"}}]
+    assert fingerprint("m", [{"role": "user", "content": "Hi"}], tools, temperature=0) != base
+
+
+def test_only_deterministic_or_opted_in_requests_are_cached():
+    inner = _CountingProvider()
+    provider = CachingProvider(inner, MemoryCompletionBackend())
+    first = _ask(provider, "ping", temperature=0)
+    second = _ask(provider, "ping", temperature=0)
+    assert (first["cache"], second["cache"]) == ("MISS", "HIT")
+    assert second["content"] == first["content"] and inner.calls == 1
+
+    assert _ask(provider, "ping", temperature=0.7)["cache"] == "BYPASS"
+    assert _ask(provider, "ping", temperature=0.7, cache=True)["cache"] == "MISS"
+    assert _ask(provider, "ping", temperature=0.7, cache=True)["cache"] == "HIT"
+    assert _ask(provider, "ping", temperature=0, cache=False)["cache"] == "BYPASS"
+    assert inner.calls == 4
+    assert provider.model == "test-model"
+    assert 'assistant_completion_cache_requests_total{result="hit"}' in generate_latest().decode()
+
+
+def test_entries_expire_and_memory_backend_is_bounded():
+    provider = CachingProvider(_CountingProvider(), MemoryCompletionBackend(), ttl=60)
+    _ask(provider, "short", temperature=0, cache_ttl=0.05)
+    time.sleep(0.1)
+    assert _ask(provider, "short", temperature=0)["cache"] == "MISS"
+
+    backend = MemoryCompletionBackend(max_entries=2, max_bytes=1_000)
+    for key in ("a", "b", "c"):
+        backend.set(key, "x" * 10, ttl=60)
+    assert backend.get("a") is None and len(backend) == 2
+    backend.set("big", "x" * 995, ttl=60)
+    assert len(backend) == 1
+
+
+def test_streamed_replies_are_cached_once_complete():
+    inner = _CountingProvider()
+    provider = CachingProvider(inner, MemoryCompletionBackend())
+
+    async def collect():
+        messages = [{"role": "user", "content": "stream"}]
+        return [chunk async for chunk in provider.stream(messages, temperature=0)]
+
+    first = asyncio.run(collect())
+    second = asyncio.run(collect())
+    assert [c["content"] for c in first] == ["str", "eamed"]
+    assert second == [{"content": "streamed", "tool_calls": None, "cache": "HIT"}]
+    assert inner.calls == 1
+
+
+def test_sqlite_backend_persists_and_prunes(tmp_path):
+    path = str(tmp_path / "mem.sqlite3")
+    backend = SQLiteCompletionBackend(ConversationMemory(path), max_entries=2, prune_every=3)
+    backend.set("k1", "v1", ttl=60)
+    backend.set("gone", "v", ttl=-1)
+    assert SQLiteCompletionBackend(ConversationMemory(path)).get("k1") == "v1"
+    assert backend.get("gone") is None
+
+    backend.set("k2", "v2", ttl=60)  # third write prunes expired rows
+    conn = ConversationMemory(path)._conn()
+    assert conn.execute("SELECT COUNT(*) FROM completion_cache").fetchone()[0] == 2
+
+
+def test_sqlite_backend_runs_off_the_loop_and_forgets_restored_entries(tmp_path):
+    path = str(tmp_path / "mem.sqlite3")
+    memory = ConversationMemory(path)
+    threads = []
+
+    class _Recording(SQLiteCompletionBackend):
+        def get(self, key):
+            threads.append(threading.current_thread())
+            return super().get(key)
+
+    inner = _CountingProvider()
+    provider = CachingProvider(inner, _Recording(memory))
+    backup = create_backup(path, str(tmp_path / "backups"))
+    assert _ask(provider, "hi", temperature=0)["cache"] == "MISS"
+    assert _ask(provider, "hi", temperature=0)["cache"] == "HIT"
+    assert threading.main_thread() not in threads
+
+    restore_backup(backup, path)
+    mark_restored(path)
+    assert _ask(provider, "hi", temperature=0)["cache"] == "MISS"
+    assert inner.calls == 2
+
+
+def test_chat_reports_cache_status_header(tmp_path):
+    settings = Settings(assistant_db_path=str(tmp_path / "mem.sqlite3"), completion_cache="memory")
+    registry = AssistantRegistry(settings)
+    app.dependency_overrides[get_registry] = lambda: registry
+    try:
+        client = TestClient(app)
+        body = {"session_id": "fresh-1", "message": "status?", "temperature": 0}
+        first = client.post("/chat", json=body)
+        body["session_id"] = "fresh-2"
+        second = client.post("/chat", json=body)
+        default = client.post("/chat", json={"session_id": "fresh-3", "message": "status?"})
+    finally:
+        app.dependency_overrides.clear()
+    assert first.headers["X-Cache"] == "MISS"
+    assert second.headers["X-Cache"] == "HIT"
+    assert second.json() == first.json()
+    assert default.headers["X-Cache"] == "BYPASS"
+
+
+def test_chat_stream_reports_cache_status_event(tmp_path):
+    settings = Settings(assistant_db_path=str(tmp_path / "mem.sqlite3"), completion_cache="memory")
+    registry = AssistantRegistry(settings)
+    app.dependency_overrides[get_registry] = lambda: registry
+    try:
+        client = TestClient(app)
+        streams = []
+        for session_id in ("stream-1", "stream-2"):
+            body = {"session_id": session_id, "message": "streamed?", "temperature": 0}
+            streams.append(client.post("/chat/stream", json=body).text.split("\n\n"))
+    finally:
+        app.dependency_overrides.clear()
+        asyncio.run(registry.aclose())
+    first, second = streams
+    assert first[-3:] == ['event: cache\ndata: "MISS"', "data: [DONE]", ""]
+    assert second[-3:] == ['event: cache\ndata: "HIT"', "data: [DONE]", ""]
+
+    def text(events):
+        return "".join(
+            json.loads(e[len("data: ") :]) for e in events[:-3] if e.startswith("data: ")
+        )
+
+    assert text(second) == text(first) != ""
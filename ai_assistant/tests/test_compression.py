@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from cryptography.fernet import Fernet
+
+from assistant.compression import RAW, ZLIB, ZLIB_DICT, Compressor, train_dictionary
+from assistant.encryption import MemoryCipher
+from assistant.memory import ConversationMemory
+
+PAGE = " ".join(f"Section {i}: the quick brown fox jumps over the lazy dog." for i in range(200))
+TURNS = [
+    f"Sure! Here is what I found about topic {i}. Let me know if you need anything else."
+    for i in range(50)
+]
+
+
+def test_threshold_and_header_byte():
+    compressor = Compressor("zlib", min_bytes=512)
+    assert compressor.compress(b"short message") == b"short message"
+    frame = compressor.compress(PAGE.encode())
+    assert frame[0] == ZLIB and len(frame) < len(PAGE) // 5
+    assert compressor.decompress(frame) == PAGE.encode()
+    # Text that could be mistaken for a header is escaped, and any codec reads back.
+    assert compressor.compress(b"\x02odd") == bytes([RAW]) + b"\x02odd"
+    assert Compressor("off").decompress(compressor.compress(b"\x02odd")) == b"\x02odd"
+    assert Compressor("off").decompress(frame) == PAGE.encode()
+
+
+def test_dictionary_compresses_short_turns():
+    dictionary = train_dictionary([turn.encode() for turn in TURNS], size=4096)
+    plain = Compressor("zlib", min_bytes=0)
+    shared = Compressor("zlib", dictionaries=[dictionary])
+    turn = b"Sure! Here is what I found about topic 99. Let me know if you need anything else."
+    frame = shared.compress(turn)
+    assert frame[0] == ZLIB_DICT
+    assert len(frame) < len(turn) // 2
+    assert plain.compress(turn) == turn  # too short to gain anything on its own
+    # Older dictionaries stay readable after a new one takes over writing.
+    rotated = Compressor("zlib", dictionaries=[b"a newer dictionary", dictionary])
+    assert rotated.decompress(frame) == turn
+
+
+def test_memory_compresses_before_encrypting(tmp_path):
+    path = str(tmp_path / "mem.sqlite3")
+    cipher = MemoryCipher([Fernet.generate_key().decode()])
+    legacy = ConversationMemory(path)
+    legacy.append("s", "user", "written before compression")
+    legacy.close()
+
+    memory = ConversationMemory(path, cipher=cipher, compressor=Compressor("zlib"))
+    memory.append("s", "tool", PAGE)
+    stored = memory._conn().execute("SELECT length(content) FROM messages").fetchall()
+    assert stored[1][0] < len(PAGE) // 5
+    assert [m["content"] for m in memory.fetch("s")] == ["written before compression", PAGE]
+    assert memory.sample_messages(1) == [PAGE]
+
+
+def test_unknown_dictionary_reads_as_empty(tmp_path):
+    path = str(tmp_path / "mem.sqlite3")
+    dictionary = train_dictionary([turn.encode() for turn in TURNS])
+    ConversationMemory(path, compressor=Compressor("zlib", dictionaries=[dictionary])).append(
+        "s", "assistant", TURNS[0]
+    )
+    assert ConversationMemory(path).fetch("s") == [{"role": "assistant", "content": ""}]
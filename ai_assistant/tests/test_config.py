@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import builtins
+import os
+import signal
+import time
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+
+from assistant import auth, config
+from assistant.config import Settings, SettingsStore
+
+
+@pytest.fixture
+def env_file(tmp_path, monkeypatch):
+    # Setting then deleting registers each key, so monkeypatch restores it
+    # after the store has loaded it from the file.
+    for key in ("API_KEYS", "OPENAI_MODEL", "SERVER_PORT"):
+        monkeypatch.setenv(key, "")
+        monkeypatch.delenv(key)
+    path = tmp_path / ".env"
+    path.write_text("API_KEYS=alpha,beta\nOPENAI_MODEL=model-a\n")
+    return path
+
+
+def _rewrite(path: Path, text: str) -> None:
+    path.write_text(text)
+    later = path.stat().st_mtime + 5
+    os.utime(path, (later, later))
+
+
+def test_snapshot_is_cached_and_reloaded_on_mtime_change(env_file):
+    store = SettingsStore(env_file)
+    first = store.get()
+    assert first.api_keys == ["alpha", "beta"] and first.openai_model == "model-a"
+    assert store.get() is first
+    assert not store.check()
+
+    _rewrite(env_file, "API_KEYS=gamma\n")
+    assert store.get() is first  # nothing is read until a reload
+    assert store.check()
+    second = store.get()
+    assert second.api_keys == ["gamma"]
+    # A key dropped from .env is dropped from the environment too.
+    assert second.openai_model == "gpt-4o-mini"
+    with pytest.raises(Exception):
+        second.api_keys = []  # type: ignore[misc]
+
+
+def test_invalid_reload_keeps_previous_snapshot(env_file):
+    store = SettingsStore(env_file)
+    first = store.get()
+    _rewrite(env_file, "API_KEYS=alpha\nSERVER_PORT=not-a-number\n")
+    assert not store.check()
+    assert store.get() is first
+
+
+def test_watcher_and_sighup_reload(env_file):
+    store = SettingsStore(env_file)
+    store.start_watching(interval=0.01)
+    try:
+        _rewrite(env_file, "API_KEYS=watched\n")
+        deadline = time.monotonic() + 2
+        while store.get().api_keys != ["watched"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert store.get().api_keys == ["watched"]
+    finally:
+        store.stop_watching()
+
+    if not store.install_sighup():
+        pytest.skip("SIGHUP not available")
+    previous = signal.getsignal(signal.SIGHUP)
+    try:
+        env_file.write_text("API_KEYS=signalled\n")
+        os.kill(os.getpid(), signal.SIGHUP)
+        deadline = time.monotonic() + 2
+        while store.get().api_keys != ["signalled"] and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert store.get().api_keys == ["signalled"]
+    finally:
+        signal.signal(signal.SIGHUP, previous)
+
+
+def test_auth_checks_hashed_keys_without_touching_the_filesystem(monkeypatch):
+    settings = Settings(api_keys=["secret-1", "secret-2"])
+    assert "secret-1" not in repr(settings.api_key_digests)
+    monkeypatch.setattr(config, "get_settings", lambda: settings)
+    monkeypatch.setattr(auth, "get_settings", lambda: settings)
+
+    def no_io(*args, **kwargs):
+        raise AssertionError("filesystem access on the auth path")
+
+    monkeypatch.setattr(builtins, "open", no_io)
+    monkeypatch.setattr(os, "stat", no_io)
+    monkeypatch.setattr(Path, "stat", no_io)
+
+    auth.api_key_auth("secret-2")
+    for bad in ("secret-3", "", None):
+        with pytest.raises(HTTPException) as exc:
+            auth.api_key_auth(bad)
+        assert exc.value.status_code == 401
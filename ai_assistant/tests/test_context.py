@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import asyncio
+
+from assistant.context import SUMMARY_PREFIX, TRUNCATED_MARK, ContextAssembler
+from assistant.memory import ConversationMemory
+from assistant.tokens import MESSAGE_OVERHEAD_TOKENS, count_tokens
+
+
+def _prompt_tokens(messages):
+    return sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in messages)
+
+
+class _CountingSummarizer:
+    def __init__(self):
+        self.calls = []
+
+    async def fold(self, summary, rows):
+        self.calls.append([row[2] for row in rows])
+        return "\n".join(filter(None, [summary] + [row[2] for row in rows]))
+
+
+def test_window_stays_within_budget_and_summarizes_older_turns(tmp_path):
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"))
+    for i in range(60):
+        memory.append("s", "user" if i % 2 == 0 else "assistant", f"turn {i} " + "word " * 40)
+    context = ContextAssembler(memory, budget_tokens=1000, summary_tokens=200)
+    messages = asyncio.run(context.assemble("s"))
+
+    assert _prompt_tokens(messages) <= 1000
+    assert messages[0]["role"] == "system"
+    assert messages[0]["content"].startswith(SUMMARY_PREFIX)
+    assert messages[-1]["content"].startswith("turn 59 ")
+    assert memory.get_summary("s") is not None
+
+
+def test_short_history_is_sent_unchanged(tmp_path):
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"))
+    memory.append("s", "user", "hi")
+    memory.append("s", "assistant", "hello")
+    messages = asyncio.run(ContextAssembler(memory).assemble("s"))
+    assert messages == [
+        {"role": "user", "content": "hi"},
+        {"role": "assistant", "content": "hello"},
+    ]
+    assert memory.get_summary("s") is None
+
+
+def test_oversized_newest_message_is_truncated(tmp_path):
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"))
+    memory.append("s", "user", "x " * 5000)
+    messages = asyncio.run(ContextAssembler(memory, budget_tokens=500).assemble("s"))
+    assert len(messages) == 1
+    assert messages[0]["content"].endswith(TRUNCATED_MARK)
+    assert _prompt_tokens(messages) <= 500
+
+
+def test_summary_is_extended_not_regenerated(tmp_path):
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"))
+    summarizer = _CountingSummarizer()
+    context = ContextAssembler(memory, budget_tokens=200, summary_tokens=100, summarizer=summarizer)
+    for i in range(6):
+        memory.append("s", "user", f"m{i} " + "pad " * 20)
+    asyncio.run(context.assemble("s"))
+    first = summarizer.calls[-1]
+    assert first and first[0].startswith("m0 ")
+
+    # Re-assembling without new turns does not touch the summary again.
+    asyncio.run(context.assemble("s"))
+    assert len(summarizer.calls) == 1
+
+    memory.append("s", "user", "m6 " + "pad " * 20)
+    asyncio.run(context.assemble("s"))
+    assert len(summarizer.calls) == 2
+    newly_folded = summarizer.calls[-1]
+    assert not set(newly_folded) & set(first)
+
+
+def test_token_counts_are_stored_with_messages(tmp_path):
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"))
+    memory.append("s", "user", "count these tokens please")
+    (row,) = memory.fetch_rows("s", 1)
+    assert row[3] == count_tokens("count these tokens please")
+    stored = memory._conn().execute("SELECT tokens FROM messages").fetchone()[0]
+    assert stored == row[3]
+
+
+def test_history_beyond_max_messages_is_folded_once(tmp_path):
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"))
+    summarizer = _CountingSummarizer()
+    context = ContextAssembler(
+        memory, budget_tokens=400, summary_tokens=100, max_messages=5, summarizer=summarizer
+    )
+    for i in range(12):
+        memory.append("s", "user", f"m{i} " + "pad " * 20)
+    messages = asyncio.run(context.assemble("s"))
+
+    folded = [text.split()[0] for call in summarizer.calls for text in call]
+    window = [m["content"].split()[0] for m in messages[1:]]
+    # Rows older than the fetched window are summarized too, and nothing twice.
+    assert sorted(folded + window, key=lambda t: int(t[1:])) == [f"m{i}" for i in range(12)]
+    assert not set(folded) & set(window)
+    assert memory.get_summary("s")[0] == int(folded[-1][1:]) + 1
+
+    # A bigger budget later does not resend rows already in the summary.
+    wide = ContextAssembler(memory, budget_tokens=4000, max_messages=50, summarizer=summarizer)
+    resent = [m["content"].split()[0] for m in asyncio.run(wide.assemble("s"))[1:]]
+    assert resent == window
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from cryptography.fernet import Fernet
+
+from assistant.config import Settings
+from assistant.encryption import HEADER_BYTES, NONCE_BYTES, DecryptionError, MemoryCipher
+from assistant.memory import ConversationMemory
+from assistant.metrics import MEMORY_DECRYPT_FAILURES
+from assistant.registry import AssistantRegistry
+
+OLD = Fernet.generate_key().decode()
+NEW = Fernet.generate_key().decode()
+
+
+def _blobs(memory):
+    return [row[0] for row in memory._conn().execute("SELECT content FROM messages ORDER BY id")]
+
+
+def test_envelope_is_binary_and_authenticated():
+    cipher = MemoryCipher([NEW])
+    blob = cipher.encrypt(b"hello")
+    assert len(blob) == HEADER_BYTES + NONCE_BYTES + len(b"hello") + 16
+    assert cipher.decrypt(blob) == b"hello"
+    assert cipher.encrypt(b"hello") != blob  # fresh nonce per message
+    with pytest.raises(DecryptionError) as excinfo:
+        cipher.decrypt(blob[:-1] + bytes([blob[-1] ^ 1]))
+    assert excinfo.value.reason == "invalid"
+    with pytest.raises(DecryptionError) as excinfo:
+        MemoryCipher([OLD]).decrypt(blob)
+    assert excinfo.value.reason == "unknown_key"
+    with pytest.raises(ValueError):
+        MemoryCipher(["not-a-key"])
+
+
+def test_fernet_and_plaintext_rows_are_still_read(tmp_path):
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"), cipher=MemoryCipher([NEW]))
+    with memory._conn() as conn:
+        conn.executemany(
+            "INSERT INTO messages (session_id, role, content) VALUES ('s', 'user', ?)",
+            [(b"plain",), (Fernet(NEW.encode()).encrypt(b"fernet"),)],
+        )
+    memory.append("s", "assistant", "aead")
+    assert [m["content"] for m in memory.fetch("s")] == ["plain", "fernet", "aead"]
+
+
+def test_rotation_reads_old_keys_and_reencrypts_in_batches(tmp_path):
+    path = str(tmp_path / "mem.sqlite3")
+    old = ConversationMemory(path, cipher=MemoryCipher([OLD]))
+    for i in range(7):
+        old.append("s", "user", f"m{i}")
+    old.put_summary("s", 3, "summary", 2)
+    old.close()
+
+    rotated = ConversationMemory(path, cipher=MemoryCipher([NEW, OLD]))
+    assert [m["content"] for m in rotated.fetch("s")] == [f"m{i}" for i in range(7)]
+    assert rotated.reencrypt(batch_size=3) == 8
+    assert rotated.reencrypt(batch_size=3) == 0
+    key_id = MemoryCipher([NEW]).key_id
+    assert all(blob[2:HEADER_BYTES] == key_id for blob in _blobs(rotated))
+    rotated.close()
+
+    new_only = ConversationMemory(path, cipher=MemoryCipher([NEW]))
+    assert [m["content"] for m in new_only.fetch("s")] == [f"m{i}" for i in range(7)]
+    assert new_only.get_summary("s") == (3, "summary", 2)
+
+
+def test_undecryptable_rows_are_counted_not_returned_as_ciphertext(tmp_path):
+    path = str(tmp_path / "mem.sqlite3")
+    ConversationMemory(path, cipher=MemoryCipher([OLD])).append("s", "user", "secret")
+    memory = ConversationMemory(path, cipher=MemoryCipher([NEW]))
+    memory.append("s", "user", "visible")
+    before = MEMORY_DECRYPT_FAILURES.labels(reason="unknown_key")._value.get()
+    assert [m["content"] for m in memory.fetch("s")] == ["", "visible"]
+    assert MEMORY_DECRYPT_FAILURES.labels(reason="unknown_key")._value.get() == before + 1
+
+
+def test_registry_reencrypts_in_the_background(tmp_path, monkeypatch):
+    path = str(tmp_path / "mem.sqlite3")
+    monkeypatch.setenv("ASSISTANT_MEMORY_ENCRYPTION_KEY", OLD)
+    old = ConversationMemory(path)
+    old.append("s", "user", "hello")
+    old.close()
+
+    monkeypatch.setenv("ASSISTANT_MEMORY_ENCRYPTION_KEY", NEW)
+    monkeypatch.setenv("ASSISTANT_MEMORY_ENCRYPTION_OLD_KEYS", OLD)
+    registry = AssistantRegistry(Settings(assistant_db_path=path, memory_reencrypt=True))
+    registry.start_reencrypt()
+    registry._reencrypt_thread.join()
+    blobs = _blobs(registry.memory)
+    asyncio.run(registry.aclose())
+    assert blobs[0][2:HEADER_BYTES] == MemoryCipher([NEW]).key_id
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+from fastapi.testclient import TestClient
+
+from assistant import auth, backup_cli, server
+from assistant.config import Settings
+from assistant.memory import ConversationMemory
+from assistant.registry import AssistantRegistry
+from assistant.server import app, get_registry
+
+
+def _fill(memory):
+    memory.append_many([(f"s{i % 2}", "user", f"m{i}", None) for i in range(10)])
+
+
+def test_batches_page_by_id(tmp_path):
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"))
+    _fill(memory)
+    batches = list(memory.iter_message_batches(batch_size=4))
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert [m["content"] for m in batches[1]] == ["m4", "m5", "m6", "m7"]
+    session = list(memory.iter_message_batches("s1", after_id=4, batch_size=2, limit=3))
+    assert [[m["content"] for m in batch] for batch in session] == [["m5", "m7"], ["m9"]]
+    assert set(session[0][0]) == {"id", "session_id", "role", "content", "tokens", "created_at"}
+
+
+def test_endpoints_stream_ndjson_pages(tmp_path, monkeypatch):
+    registry = AssistantRegistry(Settings(assistant_db_path=str(tmp_path / "mem.sqlite3")))
+    _fill(registry.memory)
+    registry.memory_writer.append("s1", "assistant", "queued")
+    monkeypatch.setattr(server, "EXPORT_BATCH_SIZE", 2)
+    monkeypatch.setattr(auth, "get_settings", lambda: Settings(api_keys=["key"]))
+    app.dependency_overrides[get_registry] = lambda: registry
+    try:
+        client = TestClient(app, headers={"X-API-Key": "key"})
+        response = client.get("/sessions/s1/messages")
+        page = client.get("/sessions/s1/messages", params={"limit": 2}).text.splitlines()
+        cursor = json.loads(page[-1])["id"]
+        rest = client.get("/sessions/s1/messages", params={"after": cursor}).text.splitlines()
+        everything = client.get("/export/messages", params={"after": 2}).text.splitlines()
+        chunks = list(server._ndjson(registry.memory.iter_message_batches("s1", batch_size=2)))
+    finally:
+        app.dependency_overrides.clear()
+        asyncio.run(registry.aclose())
+
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [m["content"] for m in lines] == ["m1", "m3", "m5", "m7", "m9", "queued"]
+    assert [json.loads(line)["content"] for line in page + rest] == [m["content"] for m in lines]
+    assert [json.loads(line)["id"] for line in everything] == list(range(3, 12))
+    assert len(chunks) == 3  # one per batch, encoded as it is read
+
+
+def test_endpoints_refuse_without_api_keys_unless_enabled(tmp_path, monkeypatch):
+    registry = AssistantRegistry(Settings(assistant_db_path=str(tmp_path / "mem.sqlite3")))
+    _fill(registry.memory)
+    app.dependency_overrides[get_registry] = lambda: registry
+    try:
+        client = TestClient(app)
+        monkeypatch.setattr(auth, "get_settings", lambda: Settings())
+        open_server = [
+            client.get(path).status_code for path in ("/sessions/s0/messages", "/export/messages")
+        ]
+        monkeypatch.setattr(auth, "get_settings", lambda: Settings(api_keys=["key"]))
+        no_key = client.get("/export/messages").status_code
+        monkeypatch.setattr(auth, "get_settings", lambda: Settings(export_enabled=True))
+        enabled = client.get("/export/messages")
+    finally:
+        app.dependency_overrides.clear()
+        asyncio.run(registry.aclose())
+
+    assert open_server == [403, 403]
+    assert no_key == 401
+    assert enabled.status_code == 200 and len(enabled.text.splitlines()) == 10
+
+
+def test_cli_export_and_import_round_trip(tmp_path, monkeypatch):
+    source = str(tmp_path / "source.sqlite3")
+    _fill(ConversationMemory(source))
+    dump = str(tmp_path / "dump.ndjson.gz")
+    monkeypatch.setenv("ASSISTANT_DB_PATH", source)
+    assert backup_cli.export(dump, batch_size=3) == 10
+
+    target = str(tmp_path / "target.sqlite3")
+    ConversationMemory(target).append("s0", "user", "already here")
+    monkeypatch.setenv("ASSISTANT_DB_PATH", target)
+    assert backup_cli.import_messages(dump, batch_size=3) == 10
+    contents = [m["content"] for m in ConversationMemory(target).fetch("s0")]
+    assert contents == ["already here", "m0", "m2", "m4", "m6", "m8"]
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import time
+
+from prometheus_client import generate_latest
+
+from assistant import backup_cli
+from assistant.history_cache import HistoryCache
+from assistant.memory import ConversationMemory
+
+
+def _contents(rows):
+    return [row[2] for row in rows]
+
+
+def test_hot_session_reads_skip_database_and_decoding(tmp_path):
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"), cache=HistoryCache())
+    memory.append("s", "user", "one")
+    assert memory.fetch("s") == [{"role": "user", "content": "one"}]
+
+    decoded = []
+    decode = memory._decode
+    memory._decode = lambda blob: decoded.append(blob) or decode(blob)  # type: ignore
+    memory.append("s", "assistant", "two")
+    memory.append_many([("s", "user", "three", None), ("other", "user", "x", None)])
+    assert [m["content"] for m in memory.fetch("s")] == ["one", "two", "three"]
+    assert decoded == []
+    assert "assistant_history_cache_hits_total" in generate_latest().decode()
+
+
+def test_partial_entry_misses_when_more_rows_are_requested(tmp_path):
+    cache = HistoryCache(rows_per_session=3)
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"), cache=cache)
+    for i in range(5):
+        memory.append("s", "user", f"m{i}")
+    assert _contents(memory.fetch_rows("s", limit=2)) == ["m3", "m4"]
+    assert cache.get("s", 3) is None
+    assert _contents(memory.fetch_rows("s", limit=3)) == ["m2", "m3", "m4"]
+    memory.append("s", "user", "m5")
+    assert _contents(cache.get("s", 3)) == ["m3", "m4", "m5"]
+
+
+def test_lru_size_and_ttl_eviction():
+    cache = HistoryCache(max_sessions=2, max_bytes=10_000)
+    for session in ("a", "b"):
+        cache.begin_load(session)
+        cache.finish_load(session, [(1, "user", session, 1)], complete=True)
+    cache.get("a", 1)
+    cache.begin_load("c")
+    cache.finish_load("c", [(1, "user", "c", 1)], complete=True)
+    assert cache.get("b", 1) is None
+    assert cache.get("a", 1) and cache.get("c", 1)
+
+    cache.begin_load("big")
+    cache.finish_load("big", [(1, "user", "x" * 9_900, 2475)], complete=True)
+    assert len(cache) == 1 and cache.stats()["bytes"] <= 10_000
+
+    cache = HistoryCache(ttl=0.05)
+    cache.begin_load("s")
+    cache.finish_load("s", [(1, "user", "hi", 1)], complete=True)
+    time.sleep(0.1)
+    assert cache.get("s", 1) is None
+    assert len(cache) == 0
+
+
+def test_rows_committed_during_load_are_merged():
+    cache = HistoryCache()
+    assert cache.begin_load("s")
+    assert not cache.begin_load("s")
+    cache.extend([("s", 3, "assistant", "new", 1)])
+    loaded = [(1, "user", "a", 1), (2, "user", "b", 1), (3, "assistant", "new", 1)]
+    cache.finish_load("s", loaded, complete=True)
+    assert _contents(cache.get("s", 10)) == ["a", "b", "new"]
+
+
+def test_restore_invalidates_cache(tmp_path, monkeypatch):
+    db_path = str(tmp_path / "mem.sqlite3")
+    monkeypatch.setenv("ASSISTANT_DB_PATH", db_path)
+    memory = ConversationMemory(db_path, cache=HistoryCache())
+    memory.append("s", "user", "before backup")
+    memory._conn().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    backup_path = backup_cli.backup(str(tmp_path / "backups"))
+    memory.append("s", "user", "after backup")
+    assert len(memory.fetch("s")) == 2
+
+    memory.close()
+    backup_cli.restore(backup_path)
+    assert memory.fetch("s") == [{"role": "user", "content": "before backup"}]
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import asyncio
+
+from prometheus_client import REGISTRY
+
+from assistant.config import Settings
+from assistant.registry import AssistantRegistry
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+def test_engine_records_provider_tokens_and_memory(tmp_path):
+    registry = AssistantRegistry(Settings(assistant_db_path=str(tmp_path / "mem.sqlite3")))
+    provider = {"provider": "local", "model": "default"}
+    before = {
+        "calls": _sample(
+            "assistant_provider_calls_total", kind="generate", outcome="ok", **provider
+        ),
+        "prompt": _sample("assistant_provider_tokens_total", type="prompt", **provider),
+        "completion": _sample("assistant_provider_tokens_total", type="completion", **provider),
+        "ttft": _sample("assistant_provider_time_to_first_token_seconds_count", **provider),
+        "append": _sample("assistant_memory_latency_seconds_count", op="append"),
+        "fetch": _sample("assistant_memory_latency_seconds_count", op="fetch"),
+    }
+
+    async def main():
+        try:
+            await registry.engine("s").chat_once("hello there")
+            return [part async for part in registry.engine("s").stream_once("again")]
+        finally:
+            await registry.aclose()
+
+    assert asyncio.run(main())
+    calls = _sample("assistant_provider_calls_total", kind="generate", outcome="ok", **provider)
+    assert calls - before["calls"] == 1
+    assert _sample("assistant_provider_tokens_total", type="prompt", **provider) > before["prompt"]
+    completion = _sample("assistant_provider_tokens_total", type="completion", **provider)
+    assert completion > before["completion"]
+    ttft = _sample("assistant_provider_time_to_first_token_seconds_count", **provider)
+    assert ttft - before["ttft"] == 1
+    assert _sample("assistant_memory_latency_seconds_count", op="append") - before["append"] == 4
+    assert _sample("assistant_memory_latency_seconds_count", op="fetch") - before["fetch"] == 2
+    assert _sample("assistant_provider_calls_in_flight", provider="local") == 0
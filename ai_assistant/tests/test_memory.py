@@ -0,0 +1,52 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+
+from assistant.memory import MIGRATIONS, ConversationMemory
+
+
+def test_fresh_db_is_migrated_to_wal_with_index(tmp_path):
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"))
+    assert memory.schema_version() == len(MIGRATIONS)
+    conn = memory._conn()
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    plan = conn.execute(
+        "EXPLAIN QUERY PLAN SELECT role, content FROM messages "
+        "WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+        ("s", 10),
+    ).fetchall()
+    assert any("idx_messages_session_id" in row[-1] for row in plan)
+
+
+def test_legacy_db_is_upgraded_in_place(tmp_path):
+    path = str(tmp_path / "legacy.sqlite3")
+    with sqlite3.connect(path) as conn:
+        conn.execute(MIGRATIONS[0])
+        conn.execute(
+            "INSERT INTO messages (session_id, role, content) VALUES ('s', 'user', ?)", (b"old",)
+        )
+    memory = ConversationMemory(path)
+    assert memory.schema_version() == len(MIGRATIONS)
+    assert memory.fetch("s") == [{"role": "user", "content": "old"}]
+    # Re-opening an up-to-date database is a no-op.
+    assert ConversationMemory(path).schema_version() == len(MIGRATIONS)
+
+
+def test_connections_are_reused_per_thread(tmp_path):
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"))
+    for i in range(5):
+        memory.append("s", "user", f"m{i}")
+    assert [m["content"] for m in memory.fetch("s", limit=3)] == ["m2", "m3", "m4"]
+    assert memory._conn() is memory._conn()
+
+    seen = []
+    thread = threading.Thread(target=lambda: seen.append(memory.fetch("s", limit=1)))
+    thread.start()
+    thread.join()
+    assert seen == [[{"role": "user", "content": "m4"}]]
+    assert len(memory._connections) == 2
+
+    memory.close()
+    assert memory._connections == []
+    assert memory.fetch("s", limit=1)[0]["content"] == "m4"
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from assistant.memory import ConversationMemory
+from assistant.memory_writer import WriteBehindMemory
+
+
+def test_appends_are_batched_and_drained_on_close(tmp_path):
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"))
+    batches = []
+    append_many = memory.append_many
+
+    def recording_append_many(rows, before_commit=None):
+        batches.append(len(rows))
+        return append_many(rows, before_commit)
+
+    memory.append_many = recording_append_many  # type: ignore[method-assign]
+    writer = WriteBehindMemory(memory, batch_size=64, flush_interval=0.05)
+
+    async def run():
+        await asyncio.gather(*(writer.aappend(f"s{i % 4}", "user", f"m{i}") for i in range(200)))
+
+    asyncio.run(run())
+    writer.close()
+    assert sum(batches) == 200
+    assert len(batches) < 200
+    assert [m["content"] for m in memory.fetch("s1", limit=3)] == ["m189", "m193", "m197"]
+
+
+def test_reads_see_uncommitted_writes_of_the_session(tmp_path):
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"))
+    memory.append("s", "user", "committed")
+    release = threading.Event()
+    append_many = memory.append_many
+
+    def slow_append_many(rows, before_commit=None):
+        release.wait(5)
+        return append_many(rows, before_commit)
+
+    memory.append_many = slow_append_many  # type: ignore[method-assign]
+    writer = WriteBehindMemory(memory, flush_interval=0)
+
+    async def run():
+        await writer.aappend("s", "user", "hello")
+        await writer.aappend("s", "assistant", "hi")
+        return await writer.afetch("s")
+
+    expected = ["committed", "hello", "hi"]
+    assert [m["content"] for m in asyncio.run(run())] == expected
+    assert [m["content"] for m in memory.fetch("s")] == ["committed"]
+    assert [m["content"] for m in writer.fetch("s", limit=2)] == ["hello", "hi"]
+    release.set()
+    writer.flush()
+    assert [m["content"] for m in memory.fetch("s")] == expected
+    assert [m["content"] for m in writer.fetch("s")] == expected
+    writer.close()
+
+
+def test_full_queue_applies_backpressure(tmp_path):
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"))
+    release = threading.Event()
+    append_many = memory.append_many
+
+    def blocked_append_many(rows, before_commit=None):
+        release.wait(5)
+        return append_many(rows, before_commit)
+
+    memory.append_many = blocked_append_many  # type: ignore[method-assign]
+    writer = WriteBehindMemory(memory, max_queue=2, batch_size=1, flush_interval=0)
+
+    async def run():
+        # One row is held by the blocked writer, two fill the queue, the fourth waits.
+        await writer.aappend("s", "user", "m0")
+        while writer._queue.qsize():
+            await asyncio.sleep(0.01)
+        for i in (1, 2):
+            await writer.aappend("s", "user", f"m{i}")
+        blocked = asyncio.create_task(writer.aappend("s", "user", "m3"))
+        await asyncio.sleep(0.1)
+        assert not blocked.done()
+        release.set()
+        await asyncio.wait_for(blocked, 5)
+
+    asyncio.run(run())
+    writer.close()
+    assert [m["content"] for m in memory.fetch("s")] == ["m0", "m1", "m2", "m3"]
+
+
+def _failing(memory, failures):
+    append_many = memory.append_many
+
+    def flaky_append_many(rows, before_commit=None):
+        if failures:
+            failures.pop()
+            raise sqlite3.OperationalError("database is locked")
+        return append_many(rows, before_commit)
+
+    memory.append_many = flaky_append_many  # type: ignore[method-assign]
+
+
+def test_failed_commit_is_retried(tmp_path):
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"))
+    _failing(memory, [1])
+    writer = WriteBehindMemory(memory, retry_delays=(0.01,))
+    writer.append("s", "user", "one")
+    writer.append("s", "user", "two")
+    writer.flush()
+    assert [m["content"] for m in memory.fetch("s")] == ["one", "two"]
+    writer.close()
+
+
+def test_persistent_failure_is_surfaced_and_rows_kept(tmp_path):
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"))
+    failures = [1, 1, 1]
+    _failing(memory, failures)
+    writer = WriteBehindMemory(memory, retry_delays=(0.01, 0.01))
+    writer.append("s", "user", "kept")
+    with pytest.raises(RuntimeError):
+        writer.flush()
+    assert not failures
+    assert writer.fetch("s") == [{"role": "user", "content": "kept"}]
+
+    writer.append("s", "user", "next")
+    writer.flush()
+    assert [m["content"] for m in memory.fetch("s")] == ["kept", "next"]
+    writer.close()
+
+
+def test_async_reads_and_writes_run_off_the_event_loop(tmp_path):
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"))
+    writer = WriteBehindMemory(memory, flush_interval=0)
+    threads = []
+    fetch_rows, append = memory.fetch_rows, memory.append
+
+    def recording_fetch_rows(session_id, limit=50):
+        threads.append(threading.get_ident())
+        return fetch_rows(session_id, limit)
+
+    def recording_append(session_id, role, content):
+        threads.append(threading.get_ident())
+        return append(session_id, role, content)
+
+    memory.fetch_rows = recording_fetch_rows  # type: ignore[method-assign]
+    memory.append = recording_append  # type: ignore[method-assign]
+
+    async def run():
+        await memory.aappend("s", "user", "hello")
+        await writer.afetch("s")
+        return await memory.afetch("s")
+
+    try:
+        assert [m["content"] for m in asyncio.run(run())] == ["hello"]
+    finally:
+        writer.close()
+    assert len(threads) == 3
+    assert threading.get_ident() not in threads
@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import asyncio
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+from starlette.responses import StreamingResponse
+
+from assistant.middleware import (
+    BodySizeLimitMiddleware,
+    MetricsMiddleware,
+    RequestIdMiddleware,
+    SecurityHeadersMiddleware,
+)
+
+
+def _app(max_bytes=100):
+    app = FastAPI()
+    seen = {}
+
+    @app.post("/echo")
+    async def echo(request: Request):
+        seen["request_id"] = request.state.request_id
+        return {"size": len(await request.body())}
+
+    @app.get("/events")
+    async def events():
+        async def gen():
+            for i in range(3):
+                yield f"data: {i}\n\n"
+
+        return StreamingResponse(gen(), media_type="text/event-stream")
+
+    app.add_middleware(RequestIdMiddleware)
+    app.add_middleware(SecurityHeadersMiddleware)
+    app.add_middleware(BodySizeLimitMiddleware, max_bytes=max_bytes)
+    app.add_middleware(MetricsMiddleware, routes=app.routes)
+    return app, seen
+
+
+def test_headers_and_request_state():
+    app, seen = _app()
+    response = TestClient(app).post("/echo", content=b"x" * 10, headers={"X-Request-ID": "abc"})
+    assert response.json() == {"size": 10}
+    assert response.headers["X-Request-ID"] == "abc" == seen["request_id"]
+    assert response.headers["X-Content-Type-Options"] == "nosniff"
+    assert "Strict-Transport-Security" not in response.headers
+
+
+def test_declared_length_over_limit_is_rejected_unread():
+    app, _ = _app(max_bytes=100)
+    response = TestClient(app).post("/echo", content=b"x" * 101)
+    assert response.status_code == 413
+    assert response.json() == {"detail": "request too large"}
+
+
+def test_streamed_body_is_counted_per_chunk():
+    app, _ = _app(max_bytes=100)
+    pulled = []
+
+    async def receive():
+        # No Content-Length: chunks keep coming until the limit trips.
+        pulled.append(1)
+        return {"type": "http.request", "body": b"x" * 40, "more_body": True}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "POST",
+        "scheme": "http",
+        "path": "/echo",
+        "raw_path": b"/echo",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [],
+        "client": ("127.0.0.1", 1),
+        "server": ("testserver", 80),
+    }
+    asyncio.run(app(scope, receive, send))
+    assert sent[0]["status"] == 413
+    assert len(pulled) == 3  # stopped at the chunk that crossed 100 bytes
+
+
+def test_streaming_responses_pass_through():
+    app, _ = _app()
+    with TestClient(app).stream("GET", "/events") as response:
+        lines = [line for line in response.iter_lines() if line]
+    assert lines == ["data: 0", "data: 1", "data: 2"]
+    assert response.headers["X-Frame-Options"] == "DENY"
+
+
+def test_metrics_use_route_templates():
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    app.add_middleware(MetricsMiddleware, routes=app.routes)
+    client = TestClient(app)
+
+    def count(path, status):
+        labels = {"path": path, "method": "GET", "status": status}
+        return REGISTRY.get_sample_value("assistant_requests_total", labels) or 0
+
+    before = count("/items/{item_id}", "200"), count("unmatched", "404")
+    for path in ("/items/1", "/items/2", "/wp-login.php", "/.env"):
+        client.get(path)
+    assert count("/items/{item_id}", "200") - before[0] == 2
+    assert count("unmatched", "404") - before[1] == 2
+    assert client.post("/items/1").status_code == 405
+    labels = {"path": "/items/{item_id}", "method": "POST", "status": "405"}
+    assert REGISTRY.get_sample_value("assistant_requests_total", labels) >= 1
+    assert REGISTRY.get_sample_value("assistant_requests_in_flight", {"path": "unmatched"}) == 0
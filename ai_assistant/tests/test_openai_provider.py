@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+import types
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+import pytest
+
+from assistant.model_providers.openai_provider import OpenAIProvider
+
+DELAY = 0.5
+
+
+class _SlowCompletions(BaseHTTPRequestHandler):
+    def do_POST(self):  # noqa: N802
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(DELAY)
+        payload = json.dumps(
+            {
+                "id": "chatcmpl-test",
+                "object": "chat.completion",
+                "created": 0,
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "finish_reason": "stop",
+                        "message": {
+                            "role": "assistant",
+                            "content": body["messages"][-1]["content"],
+                        },
+                    }
+                ],
+            }
+        ).encode("utf-8")
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client timed out or was cancelled
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def stand_in():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _SlowCompletions)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+    server.server_close()
+
+
+def test_slow_completions_overlap(stand_in):
+    n = 8
+
+    async def run():
+        provider = OpenAIProvider("test", "gpt-test", base_url=stand_in, max_retries=0)
+        try:
+            start = time.perf_counter()
+            results = await asyncio.gather(
+                *(provider.generate([{"role": "user", "content": f"m{i}"}]) for i in range(n))
+            )
+            return time.perf_counter() - start, results
+        finally:
+            await provider.aclose()
+
+    elapsed, results = asyncio.run(run())
+    assert [r["content"] for r in results] == [f"m{i}" for i in range(n)]
+    # Sequential execution would take n * DELAY; overlapping calls take about one DELAY.
+    assert elapsed < n * DELAY / 2
+
+
+def test_per_request_timeout_and_cancellation(stand_in):
+    async def run():
+        provider = OpenAIProvider("test", "gpt-test", base_url=stand_in, max_retries=0)
+        try:
+            with pytest.raises(openai.APITimeoutError):
+                await provider.generate([{"role": "user", "content": "x"}], timeout=0.1)
+
+            task = asyncio.create_task(provider.generate([{"role": "user", "content": "y"}]))
+            await asyncio.sleep(0.05)
+            start = time.perf_counter()
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            assert time.perf_counter() - start < DELAY
+        finally:
+            await provider.aclose()
+
+    asyncio.run(run())
+
+
+def test_stream_is_closed_when_the_consumer_stops_early():
+    class _Chunks:
+        closed = False
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            delta = types.SimpleNamespace(content="piece", tool_calls=None)
+            return types.SimpleNamespace(usage=None, choices=[types.SimpleNamespace(delta=delta)])
+
+        async def close(self):
+            self.closed = True
+
+    chunks = _Chunks()
+
+    async def create(**kwargs):
+        return chunks
+
+    async def run():
+        provider = OpenAIProvider("test", "gpt-test")
+        provider.client = types.SimpleNamespace(
+            chat=types.SimpleNamespace(completions=types.SimpleNamespace(create=create))
+        )
+        stream = provider.stream([{"role": "user", "content": "x"}])
+        try:
+            first = await stream.__anext__()
+            await stream.aclose()
+        finally:
+            await provider.aclose()
+        return first
+
+    assert asyncio.run(run())["content"] == "piece"
+    assert chunks.closed
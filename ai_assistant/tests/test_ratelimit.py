@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from assistant import ratelimit
+from assistant.config import Settings, hash_api_key
+from assistant.middleware import RateLimitMiddleware
+from assistant.ratelimit import RateLimit, RateLimitPolicy, TokenBucketLimiter
+
+
+def _key(api_key):
+    return "key:" + hash_api_key(api_key)[:16].hex()
+
+
+def test_bucket_allows_burst_then_refills():
+    limiter = TokenBucketLimiter()
+    limit = RateLimit(3, 3.0)  # one token per second
+    checks = [("ip:a", limit)]
+    results = [limiter.acquire(checks, now=0.0) for _ in range(4)]
+    assert [r.allowed for r in results] == [True, True, True, False]
+    assert [r.remaining for r in results[:3]] == [2, 1, 0]
+    denied = results[-1]
+    assert denied.retry_after == 1.0
+    assert denied.headers()["Retry-After"] == "1"
+    assert denied.headers()["RateLimit-Policy"] == "3;w=3"
+    assert limiter.acquire(checks, now=1.0).allowed
+    assert not limiter.acquire(checks, now=1.5).allowed
+
+
+def test_idle_and_surplus_keys_are_evicted():
+    limiter = TokenBucketLimiter(max_keys=3)
+    limit = RateLimit(10, 60.0)
+    for i in range(5):
+        limiter.acquire([(f"ip:{i}", limit)], now=float(i))
+    assert len(limiter) == 3
+    # Idle for longer than the window means the bucket would be full anyway.
+    limiter.acquire([("ip:new", limit)], now=200.0)
+    assert len(limiter) == 1
+
+
+def test_policy_uses_known_keys_and_route_buckets():
+    policy = RateLimitPolicy(
+        RateLimit(100, 60),
+        route_limits={"/chat": RateLimit(2, 60)},
+        key_limits={"vip": RateLimit(1000, 60)},
+        known_keys=["regular"],
+    )
+    assert policy.checks("1.2.3.4", "made-up", "/health") == (("ip:1.2.3.4", RateLimit(100, 60)),)
+    assert policy.checks("1.2.3.4", "vip", "/health") == ((_key("vip"), RateLimit(1000, 60)),)
+    assert policy.checks("1.2.3.4", "regular", "/chat") == (
+        (_key("regular"), RateLimit(100, 60)),
+        (_key("regular") + "|/chat", RateLimit(2, 60)),
+    )
+
+    limiter = TokenBucketLimiter()
+    chat = policy.checks("ip", None, "/chat")
+    assert [limiter.acquire(chat, now=0).allowed for _ in range(3)] == [True, True, False]
+    # A denied route request does not use up the client's overall quota.
+    assert limiter.acquire(policy.checks("ip", None, "/other"), now=0).remaining == 97
+
+
+def test_policy_follows_reloaded_api_keys(monkeypatch):
+    policy = RateLimitPolicy(RateLimit(100, 60))
+    monkeypatch.setattr(ratelimit, "get_settings", lambda: Settings(api_keys=["old"]))
+    assert policy.checks("ip", "old", "/")[0][0] == _key("old")
+    monkeypatch.setattr(ratelimit, "get_settings", lambda: Settings(api_keys=["new"]))
+    assert policy.checks("ip", "old", "/")[0][0] == "ip:ip"
+    assert policy.checks("ip", "new", "/")[0][0] == _key("new")
+
+
+def test_middleware_sets_standard_headers():
+    app = FastAPI()
+    app.add_middleware(RateLimitMiddleware, rate=2, per_seconds=60)
+
+    @app.get("/ping")
+    async def ping():
+        return {"ok": True}
+
+    client = TestClient(app)
+    first = client.get("/ping")
+    assert first.headers["RateLimit-Limit"] == "2"
+    assert first.headers["RateLimit-Remaining"] == "1"
+    client.get("/ping")
+    limited = client.get("/ping")
+    assert limited.status_code == 429
+    assert int(limited.headers["Retry-After"]) >= 1
+    assert limited.headers["RateLimit-Remaining"] == "0"
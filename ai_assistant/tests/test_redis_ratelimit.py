@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import math
+import time
+
+import pytest
+import redis.asyncio as aioredis
+from prometheus_client import generate_latest
+
+from assistant.ratelimit import GCRA_SCRIPT, RateLimit, RedisRateLimiter
+
+
+class FakeRedis:
+    """A RESP server with just enough of Redis for the rate limit script.
+
+    EVALSHA of ``GCRA_SCRIPT`` runs a Python port of it against a dict, with a
+    fixed clock; ``test_lua_script_shares_limits`` runs the script itself.
+    """
+
+    def __init__(self) -> None:
+        self.sha = hashlib.sha1(GCRA_SCRIPT.encode()).hexdigest()
+        self.loaded = False
+        self.data = {}
+        self.evals = 0
+        self.clock = time.time() * 1000
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _serve(self, reader, writer) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    return
+                args = []
+                for _ in range(int(line[1:])):
+                    size = int((await reader.readline())[1:])
+                    args.append((await reader.readexactly(size + 2))[:-2].decode())
+                writer.write(self._reply(self._command(args)))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    def _command(self, args):
+        name = args[0].upper()
+        if name == "SCRIPT" and args[1].upper() == "LOAD":
+            self.loaded = True
+            return hashlib.sha1(args[2].encode()).hexdigest()
+        if name == "EVALSHA":
+            if not self.loaded or args[1] != self.sha:
+                return Exception("NOSCRIPT No matching script.")
+            numkeys = int(args[2])
+            self.evals += 1
+            return self._gcra(args[3 : 3 + numkeys], args[3 + numkeys :])
+        return "OK"
+
+    def _gcra(self, keys, argv):
+        now = self.clock
+        grant = int(argv[0])
+        state, fewest, tightest = [], None, 0
+        for i, key in enumerate(keys):
+            requests, window = int(argv[1 + 2 * i]), int(argv[2 + 2 * i])
+            interval = window / requests
+            tat = max(self.data.get(key, now), now)
+            available = math.floor((now + window - tat) / interval)
+            state.append((tat, interval, window))
+            if fewest is None or available < fewest:
+                tightest, fewest = i, available
+        grant = min(grant, fewest)
+        tat, interval, window = state[tightest]
+        if grant < 1:
+            return [
+                0,
+                0,
+                math.ceil(tat - now),
+                math.ceil(tat - window + interval - now),
+                tightest + 1,
+            ]
+        for key, (tat, interval, _) in zip(keys, state):
+            self.data[key] = tat + grant * interval
+        reset = self.data[keys[tightest]] - now
+        return [grant, fewest - grant, math.ceil(reset), 0, tightest + 1]
+
+    def _reply(self, value) -> bytes:
+        if isinstance(value, Exception):
+            return f"-{value}\r\n".encode()
+        if isinstance(value, list):
+            return f"*{len(value)}\r\n".encode() + b"".join(self._reply(v) for v in value)
+        if isinstance(value, int):
+            return f":{value}\r\n".encode()
+        return f"${len(value)}\r\n{value}\r\n".encode()
+
+
+def _run(test):
+    async def main():
+        fake = FakeRedis()
+        port = await fake.start()
+        client = aioredis.Redis(port=port, socket_timeout=1)
+        try:
+            return await test(fake, client)
+        finally:
+            await client.aclose()
+            await fake.stop()
+
+    return asyncio.run(main())
+
+
+def test_instances_share_one_limit():
+    limit = RateLimit(5, 60)
+
+    async def test(fake, client):
+        first, second = RedisRateLimiter(client), RedisRateLimiter(client)
+        results = []
+        for i in range(8):
+            limiter = first if i % 2 else second
+            results.append(await limiter.acquire([("ip:a", limit)], now=0.0))
+        return results
+
+    results = _run(test)
+    assert [r.allowed for r in results] == [True] * 5 + [False] * 3
+    assert [r.remaining for r in results[:5]] == [4, 3, 2, 1, 0]
+    assert results[5].retry_after == 12.0  # one token per 12s
+
+
+def test_lua_script_shares_limits():
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    chat = [("ip:a", RateLimit(5, 60)), ("ip:a|/chat", RateLimit(2, 60))]
+
+    async def main():
+        client = fakeredis.aioredis.FakeRedis()
+        first, second = RedisRateLimiter(client), RedisRateLimiter(client)
+        results = [await (first if i % 2 else second).acquire(chat, now=0.0) for i in range(3)]
+        results.append(await first.acquire(chat[:1], now=0.0))
+        return results, sorted(await client.keys())
+
+    results, keys = asyncio.run(main())
+    assert [r.allowed for r in results] == [True, True, False, True]
+    assert results[2].limit == RateLimit(2, 60) and 29 < results[2].retry_after <= 30
+    # The denied route request took nothing from the client's own bucket.
+    assert results[3].remaining == 2
+    assert keys == [b"ratelimit:ip:a", b"ratelimit:ip:a|/chat"]
+
+
+def test_hot_clients_use_local_leases():
+    limit = RateLimit(1000, 60)
+
+    async def test(fake, client):
+        limiter = RedisRateLimiter(client, max_lease=16)
+        results = [await limiter.acquire([("ip:a", limit)], now=i * 0.001) for i in range(100)]
+        return results, fake.evals
+
+    results, evals = _run(test)
+    assert all(r.allowed for r in results)
+    assert evals <= 10  # leases of 1, 2, 4, 8, 16, 16, ...
+    assert results[-1].remaining < 1000 - 100 + 16
+
+
+def test_denials_are_kept_locally_until_retry():
+    limit = RateLimit(1, 60)
+
+    async def test(fake, client):
+        limiter = RedisRateLimiter(client)
+        await limiter.acquire([("ip:a", limit)], now=0.0)
+        denied = [await limiter.acquire([("ip:a", limit)], now=float(i)) for i in range(1, 20)]
+        return denied, fake.evals
+
+    denied, evals = _run(test)
+    assert not any(r.allowed for r in denied)
+    assert evals == 2
+
+
+def test_unreachable_redis_falls_back_to_local_limits():
+    limit = RateLimit(2, 60)
+
+    async def main():
+        client = aioredis.Redis(port=1, socket_connect_timeout=0.2)
+        limiter = RedisRateLimiter(client, retry_seconds=5)
+        try:
+            return [await limiter.acquire([("ip:a", limit)], now=0.0) for _ in range(3)]
+        finally:
+            await client.aclose()
+
+    results = asyncio.run(main())
+    assert [r.allowed for r in results] == [True, True, False]
+    metrics = generate_latest().decode()
+    assert 'assistant_rate_limit_redis_errors_total{error="ConnectionError"}' in metrics
+    assert 'assistant_rate_limit_decisions_total{outcome="limited",source="local"}' in metrics
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from assistant.config import Settings
+from assistant.registry import AssistantRegistry
+from assistant.server import app, get_registry
+from assistant.tools import web_fetch
+
+
+def test_engine_handles_share_components(tmp_path):
+    registry = AssistantRegistry(Settings(assistant_db_path=str(tmp_path / "mem.sqlite3")))
+    a = registry.engine("a")
+    b = registry.engine("b")
+    assert a.provider is b.provider
+    assert a.memory is b.memory
+    assert a.tool_schemas is b.tool_schemas
+    assert asyncio.run(a.chat_once("hi")).endswith("hi")
+    asyncio.run(registry.aclose())
+    assert registry.http_client.is_closed
+
+
+def test_lifespan_registry_and_pool_metrics():
+    with TestClient(app) as client:
+        registry = app.state.registry
+        assert client.post("/chat", json={"session_id": "r1", "message": "one"}).status_code == 200
+        assert client.post("/chat", json={"session_id": "r2", "message": "two"}).status_code == 200
+        assert app.state.registry is registry
+        body = client.get("/metrics").text
+        assert "assistant_engine_handles_total" in body
+        assert 'assistant_http_pool_connections{client="shared",state="idle"}' in body
+    assert registry.http_client.is_closed
+
+
+def test_aclose_runs_every_step_when_one_fails(tmp_path):
+    path = str(tmp_path / "mem.sqlite3")
+    registry = AssistantRegistry(Settings(assistant_db_path=path))
+    registry.memory_writer.append("s", "user", "queued")
+
+    async def broken():
+        raise OSError("provider close failed")
+
+    registry.provider.aclose = broken
+    with pytest.raises(OSError, match="provider close failed"):
+        asyncio.run(registry.aclose())
+    assert registry.http_client.is_closed
+    assert web_fetch.configured() is None
+    registry = AssistantRegistry(Settings(assistant_db_path=path))
+    assert registry.memory.fetch("s") == [{"role": "user", "content": "queued"}]
+    asyncio.run(registry.aclose())
+
+
+def test_get_registry_needs_the_lifespan():
+    assert getattr(app.state, "registry", None) is None
+    with pytest.raises(RuntimeError, match="lifespan"):
+        get_registry()
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import asyncio
+import gzip
+import json
+import sqlite3
+import threading
+import time
+
+from assistant import backup_cli
+from assistant.config import Settings
+from assistant.history_cache import HistoryCache
+from assistant.memory import ConversationMemory
+from assistant.metrics import MEMORY_PRUNED, MEMORY_RECLAIMED_BYTES
+from assistant.registry import AssistantRegistry
+from assistant.retention import SessionArchive
+
+DAY = 86400
+
+
+def _append_aged(memory, session_id, texts, days_ago):
+    ids = memory.append_many([(session_id, "user", text, 1) for text in texts])
+    stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(time.time() - days_ago * DAY))
+    with memory._conn() as conn:
+        conn.executemany(
+            "UPDATE messages SET created_at = ? WHERE id = ?", [(stamp, i) for i in ids]
+        )
+
+
+def _sessions(memory):
+    rows = memory._conn().execute("SELECT DISTINCT session_id FROM messages ORDER BY session_id")
+    return [row[0] for row in rows]
+
+
+def test_idle_sessions_are_archived_then_deleted(tmp_path):
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"))
+    _append_aged(memory, "old-a", ["a1", "a2"], days_ago=40)
+    _append_aged(memory, "old-b", ["b1"], days_ago=35)
+    _append_aged(memory, "active", ["c1"], days_ago=40)
+    _append_aged(memory, "active", ["c2"], days_ago=1)
+    memory.put_summary("old-a", 2, "summary", 1)
+    archive = SessionArchive(str(tmp_path / "archive"))
+
+    counts = memory.prune(session_ttl=30 * DAY, batch_size=1, archive=archive)
+    assert counts == {"session_ttl": 3, "message_ttl": 0, "max_messages": 0}
+    assert _sessions(memory) == ["active"]
+    assert memory.get_summary("old-a") is None
+    with gzip.open(archive.path, "rt", encoding="utf-8") as f:
+        archived = [json.loads(line) for line in f]
+    assert [(m["session_id"], m["content"]) for m in archived] == [
+        ("old-a", "a1"),
+        ("old-a", "a2"),
+        ("old-b", "b1"),
+    ]
+
+
+def test_concurrent_prunes_archive_each_message_once(tmp_path):
+    path = str(tmp_path / "mem.sqlite3")
+    for i in range(10):
+        _append_aged(ConversationMemory(path), f"old-{i}", ["a", "b", "c"], days_ago=40)
+    archived = []
+
+    def slow_archive(messages):
+        messages = list(messages)
+        time.sleep(0.005)  # widens the window between reading and deleting
+        # Archiving happens outside the write lock: chat writers don't wait on it.
+        writer = sqlite3.connect(path, timeout=0)
+        writer.execute("BEGIN IMMEDIATE")
+        writer.rollback()
+        writer.close()
+        archived.extend(m["id"] for m in messages)
+
+    # As the CLI and the server's retention task would, each with its own connections.
+    runners = [
+        threading.Thread(
+            target=ConversationMemory(path).prune,
+            kwargs={"session_ttl": 30 * DAY, "batch_size": 2, "archive": slow_archive},
+        )
+        for _ in range(2)
+    ]
+    for runner in runners:
+        runner.start()
+    for runner in runners:
+        runner.join()
+    assert sorted(archived) == list(range(1, 31))
+    assert _sessions(ConversationMemory(path)) == []
+
+
+def test_message_ttl_and_max_messages_trim_sessions(tmp_path):
+    memory = ConversationMemory(str(tmp_path / "mem.sqlite3"), cache=HistoryCache())
+    _append_aged(memory, "s", ["old"], days_ago=10)
+    _append_aged(memory, "s", [f"m{i}" for i in range(5)], days_ago=0)
+    _append_aged(memory, "t", ["t1", "t2"], days_ago=0)
+    assert len(memory.fetch("s")) == 6
+    before = MEMORY_PRUNED.labels(reason="max_messages")._value.get()
+
+    counts = memory.prune(message_ttl=7 * DAY, max_messages=3, batch_size=2)
+    assert counts == {"session_ttl": 0, "message_ttl": 1, "max_messages": 2}
+    assert [m["content"] for m in memory.fetch("s")] == ["m2", "m3", "m4"]
+    assert [m["content"] for m in memory.fetch("t")] == ["t1", "t2"]
+    assert MEMORY_PRUNED.labels(reason="max_messages")._value.get() == before + 2
+
+
+def test_incremental_vacuum_shrinks_the_file(tmp_path):
+    path = str(tmp_path / "mem.sqlite3")
+    memory = ConversationMemory(path)
+    assert memory._conn().execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+    _append_aged(memory, "s", ["x" * 4000] * 200, days_ago=10)
+    memory.prune(message_ttl=DAY)
+    before = MEMORY_RECLAIMED_BYTES._value.get()
+    reclaimed = memory.incremental_vacuum(pages=50)
+    assert reclaimed > 200 * 4000
+    assert MEMORY_RECLAIMED_BYTES._value.get() == before + reclaimed
+    assert memory._conn().execute("PRAGMA freelist_count").fetchone()[0] == 0
+
+    # Stores created without auto_vacuum switch over with a full VACUUM.
+    legacy_path = str(tmp_path / "legacy.sqlite3")
+    conn = sqlite3.connect(legacy_path)
+    conn.execute("CREATE TABLE filler (x)")
+    conn.executemany("INSERT INTO filler VALUES (?)", [(b"x" * 4000,)] * 100)
+    conn.commit()
+    conn.execute("DELETE FROM filler")
+    conn.commit()
+    conn.close()
+    legacy = ConversationMemory(legacy_path)
+    assert legacy.incremental_vacuum() == 0
+    assert legacy.enable_incremental_vacuum() > 300_000
+    assert legacy._conn().execute("PRAGMA auto_vacuum").fetchone()[0] == 2
+
+
+def test_cli_and_server_task_apply_retention_settings(tmp_path, monkeypatch):
+    path = str(tmp_path / "mem.sqlite3")
+    monkeypatch.setenv("ASSISTANT_DB_PATH", path)
+    memory = ConversationMemory(path)
+    _append_aged(memory, "old", ["o"], days_ago=100)
+    _append_aged(memory, "s", [f"m{i}" for i in range(4)], days_ago=0)
+
+    counts = backup_cli.prune(session_ttl_days=30, archive_dir=str(tmp_path / "archive"))
+    assert counts["session_ttl"] == 1 and counts["archived"] == 1
+    assert _sessions(memory) == ["s"]
+
+    registry = AssistantRegistry(Settings(assistant_db_path=path, memory_max_messages=2))
+    registry.start_retention()
+    deadline = time.monotonic() + 5
+    while len(registry.memory.fetch("s")) > 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    asyncio.run(registry.aclose())
+    assert [m["content"] for m in memory.fetch("s")] == ["m2", "m3"]
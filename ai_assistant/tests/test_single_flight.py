@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+
+import pytest
+from prometheus_client import generate_latest
+
+from assistant.config import Settings
+from assistant.registry import AssistantRegistry
+from assistant.single_flight import SingleFlight
+
+
+class _Upstream:
+    def __init__(self, delay=0.05, fail=False):
+        self.delay = delay
+        self.fail = fail
+        self.calls = 0
+        self.cancelled = 0
+
+    async def call(self):
+        self.calls += 1
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if self.fail:
+            raise RuntimeError("upstream failed")
+        return {"content": f"result {self.calls}"}
+
+    async def chunks(self):
+        self.calls += 1
+        try:
+            for i in range(4):
+                await asyncio.sleep(self.delay)
+                yield {"content": str(i)}
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+
+
+def test_identical_calls_share_one_upstream_call():
+    flight, upstream = SingleFlight(), _Upstream()
+
+    async def main():
+        return await asyncio.gather(*(flight.do("k", upstream.call) for _ in range(5)))
+
+    results = asyncio.run(main())
+    assert results == [{"content": "result 1"}] * 5
+    assert upstream.calls == 1 and len(flight) == 0
+    assert 'assistant_single_flight_coalesced_total{kind="generate"}' in generate_latest().decode()
+
+
+def test_errors_reach_every_waiter():
+    flight, upstream = SingleFlight(), _Upstream(fail=True)
+
+    async def main():
+        calls = [flight.do("k", upstream.call) for _ in range(3)]
+        return await asyncio.gather(*calls, return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert [str(r) for r in results] == ["upstream failed"] * 3
+    assert upstream.calls == 1
+
+
+def test_cancelled_leader_does_not_cancel_followers():
+    flight, upstream = SingleFlight(), _Upstream(delay=0.1)
+
+    async def main():
+        leader = asyncio.create_task(flight.do("k", upstream.call))
+        await asyncio.sleep(0.01)
+        follower = asyncio.create_task(flight.do("k", upstream.call))
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        return await follower
+
+    assert asyncio.run(main()) == {"content": "result 1"}
+    assert upstream.calls == 1 and upstream.cancelled == 0
+
+
+def test_upstream_is_cancelled_when_nobody_waits():
+    flight, upstream = SingleFlight(), _Upstream(delay=1.0)
+
+    async def main():
+        waiters = [asyncio.create_task(flight.do("k", upstream.call)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0.01)
+        # A new caller starts a fresh call instead of joining the cancelled one.
+        upstream.delay = 0.01
+        return await flight.do("k", upstream.call)
+
+    assert asyncio.run(main()) == {"content": "result 2"}
+    assert upstream.cancelled == 1
+
+
+def test_stream_followers_replay_from_the_start():
+    flight, upstream = SingleFlight(), _Upstream(delay=0.02)
+
+    async def consume(delay=0.0, stop_after=None):
+        await asyncio.sleep(delay)
+        seen = []
+        async for chunk in flight.stream("k", upstream.chunks):
+            seen.append(chunk["content"])
+            if stop_after is not None and len(seen) == stop_after:
+                break
+        return seen
+
+    async def main():
+        return await asyncio.gather(consume(), consume(delay=0.05), consume(stop_after=1))
+
+    leader, late, quitter = asyncio.run(main())
+    assert leader == late == ["0", "1", "2", "3"]
+    assert quitter == ["0"]
+    assert upstream.calls == 1 and upstream.cancelled == 0
+
+
+def test_engine_coalesces_resent_messages(tmp_path):
+    registry = AssistantRegistry(Settings(assistant_db_path=str(tmp_path / "mem.sqlite3")))
+    inner = registry.provider
+    calls = []
+
+    async def slow_generate(messages, **kwargs):
+        calls.append(messages)
+        await asyncio.sleep(0.1)
+        return await inner.generate(messages, **kwargs)
+
+    registry.provider = type("Slow", (), {"generate": staticmethod(slow_generate)})()
+
+    async def main():
+        try:
+            tabs = [registry.engine("s").chat_once("hello") for _ in range(2)]
+            return await asyncio.gather(*tabs)
+        finally:
+            await registry.aclose()
+
+    first, second = asyncio.run(main())
+    assert first == second
+    assert len(calls) == 1
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+import httpx
+from fastapi.testclient import TestClient
+
+from assistant.config import Settings
+from assistant.engine import AssistantEngine
+from assistant.memory import ConversationMemory
+from assistant.model_providers.ollama_provider import OllamaProvider
+from assistant.model_providers.openai_provider import OpenAIProvider
+from assistant.server import app
+
+
+async def _collect(agen):
+    return [item async for item in agen]
+
+
+def _engine(tmp_path, session_id="s"):
+    settings = Settings(assistant_db_path=str(tmp_path / "mem.sqlite3"))
+    return AssistantEngine(session_id, settings=settings)
+
+
+def test_engine_streams_deltas_and_persists_reply(tmp_path):
+    engine = _engine(tmp_path)
+    deltas = asyncio.run(_collect(engine.stream_once("stream me please")))
+    assert len(deltas) > 1
+    assert "".join(deltas) == "[Local Assistant] You said: stream me please"
+    history = engine.memory.fetch("s")
+    assert history[-1] == {"role": "assistant", "content": "".join(deltas)}
+
+
+def test_engine_streams_tool_followup_round(tmp_path):
+    engine = _engine(tmp_path)
+    deltas = asyncio.run(_collect(engine.stream_once("what time is it")))
+    reply = "".join(deltas)
+    assert '"utc"' in reply
+    assert ConversationMemory(engine.settings.assistant_db_path).fetch("s")[-1]["content"] == reply
+
+
+def test_ollama_stream_parses_ndjson():
+    lines = [
+        {"message": {"content": "Hel"}, "done": False},
+        {"message": {"content": "lo"}, "done": False},
+        {"message": {"content": ""}, "done": True},
+    ]
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, text="\n".join(json.dumps(line) for line in lines))
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        provider = OllamaProvider("http://ollama", "m", client=client)
+        try:
+            return await _collect(provider.stream([{"role": "user", "content": "x"}]))
+        finally:
+            await client.aclose()
+
+    chunks = asyncio.run(run())
+    assert [c["content"] for c in chunks] == ["Hel", "lo"]
+
+
+def test_openai_stream_assembles_tool_calls():
+    def sse(delta):
+        chunk = {
+            "id": "c",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "m",
+            "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+        }
+        return f"data: {json.dumps(chunk)}\n\n"
+
+    call_start = {"index": 0, "id": "call_1", "function": {"name": "add_numbers", "arguments": ""}}
+    body = (
+        sse({"role": "assistant", "content": "Sure"})
+        + sse({"tool_calls": [dict(call_start, type="function")]})
+        + sse({"tool_calls": [{"index": 0, "function": {"arguments": '{"a": 1, '}}]})
+        + sse({"tool_calls": [{"index": 0, "function": {"arguments": '"b": 2}'}}]})
+        + "data: [DONE]\n\n"
+    )
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.content)["stream"] is True
+        return httpx.Response(200, text=body, headers={"content-type": "text/event-stream"})
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        provider = OpenAIProvider("k", "m", http_client=client, base_url="http://openai/v1")
+        try:
+            return await _collect(provider.stream([{"role": "user", "content": "x"}]))
+        finally:
+            await client.aclose()
+
+    chunks = asyncio.run(run())
+    assert chunks[0]["content"] == "Sure"
+    assert chunks[-1]["tool_calls"] == [
+        {"id": "call_1", "name": "add_numbers", "arguments": '{"a": 1, "b": 2}'}
+    ]
+
+
+def test_sse_emits_json_deltas():
+    with TestClient(app) as client:
+        r = client.post("/chat/stream", json={"session_id": "sse", "message": "two words"})
+        events = [e[len("data: ") :] for e in r.text.split("\n\n") if e.startswith("data: ")]
+        assert events[-1] == "[DONE]"
+        assert "".join(json.loads(e) for e in events[:-1]).endswith("two words")
+        assert len(events) > 2
+
+
+def test_ws_streaming_frames():
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws") as ws:
+            ws.send_text(json.dumps({"message": "hi there", "stream": True}))
+            deltas = []
+            while True:
+                frame = ws.receive_json()
+                if frame.get("done"):
+                    break
+                deltas.append(frame["delta"])
+            assert frame["content"] == "".join(deltas)
+            assert frame["content"].endswith("hi there")
+
+
+def test_ws_treats_other_json_as_plain_text():
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws") as ws:
+            ws.send_text('{"a": 1}')
+            assert ws.receive_text().endswith('{"a": 1}')
+            ws.send_text("[1, 2]")
+            assert ws.receive_text().endswith("[1, 2]")
+            ws.send_text(json.dumps({"message": "structured"}))
+            assert ws.receive_text().endswith("structured")
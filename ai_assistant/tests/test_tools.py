@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+import time
+
+from prometheus_client import generate_latest
+
+from assistant.config import Settings
+from assistant.engine import AssistantEngine
+from assistant.tools import ToolRegistry, ToolRunner, call_tool, export_tool_schemas_for_openai
+from assistant.tools.registry import compile_schema
+
+SCHEMA = {"description": "", "parameters": {"type": "object", "properties": {}}}
+
+
+def _blocking_sleep(args):
+    time.sleep(float(args.get("seconds", 0.2)))
+    return {"slept": args.get("seconds", 0.2), "thread": threading.current_thread().name}
+
+
+async def _async_echo(args):
+    await asyncio.sleep(0.05)
+    return {"echo": args.get("text")}
+
+
+def _runner(**kwargs):
+    registry = ToolRegistry()
+    registry.register("sleep", _blocking_sleep, SCHEMA)
+    registry.tool("echo", schema=SCHEMA)(_async_echo)
+    return ToolRunner(registry=registry, **kwargs)
+
+
+def _call(name, **args):
+    return {"id": f"call_{name}", "name": name, "arguments": json.dumps(args)}
+
+
+def test_calls_run_concurrently_and_keep_order():
+    runner = _runner(max_workers=4)
+    calls = [_call("sleep", seconds=0.3), _call("echo", text="hi"), _call("sleep", seconds=0.1)]
+
+    async def main():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        task = asyncio.create_task(ticker())
+        start = time.perf_counter()
+        results = await runner.run(calls)
+        task.cancel()
+        return results, time.perf_counter() - start, ticks
+
+    results, elapsed, ticks = asyncio.run(main())
+    runner.close()
+    decoded = [json.loads(result) for result in results]
+    assert decoded[0]["slept"] == 0.3 and decoded[2]["slept"] == 0.1
+    assert decoded[1] == {"echo": "hi"}
+    assert decoded[0]["thread"].startswith("tool")
+    assert elapsed < 0.55
+    # The event loop kept running while the sync tools blocked.
+    assert ticks >= 10
+
+
+def test_timeouts_and_errors_become_tool_results():
+    runner = _runner(timeout=5.0, timeouts={"sleep": 0.05})
+    calls = [_call("sleep", seconds=0.5), _call("missing"), _call("echo", text="ok")]
+    results = [json.loads(r) for r in asyncio.run(runner.run(calls))]
+    runner.close()
+    assert results[0] == {"error": "Tool sleep timed out"}
+    assert results[1] == {"error": "Unknown tool: missing"}
+    assert results[2] == {"echo": "ok"}
+    text = generate_latest().decode()
+    assert 'assistant_tool_latency_seconds_count{tool="echo"}' in text
+    assert 'assistant_tool_calls_total{outcome="timeout",tool="sleep"}' in text
+
+
+def test_engine_runs_all_tool_calls_of_a_turn(tmp_path):
+    class TwoToolProvider:
+        def __init__(self):
+            self.followup = None
+
+        async def generate(self, messages, tools=None, tool_choice=None, timeout=None, **_):
+            if tools:
+                calls = [
+                    {"id": "a", "name": "add_numbers", "arguments": '{"a": 1, "b": 2}'},
+                    {"id": "b", "name": "get_current_time", "arguments": "{}"},
+                ]
+                return {"content": "", "tool_calls": calls}
+            self.followup = messages
+            return {"content": "done", "tool_calls": None}
+
+    provider = TwoToolProvider()
+    settings = Settings(assistant_db_path=str(tmp_path / "mem.sqlite3"))
+    engine = AssistantEngine("s", settings=settings, provider=provider)
+    assert asyncio.run(engine.chat_once("add and tell time")) == "done"
+    tool_messages = [m for m in provider.followup if m["role"] == "tool"]
+    assert [m["tool_call_id"] for m in tool_messages] == ["a", "b"]
+    assert json.loads(tool_messages[0]["content"]) == {"sum": 3.0}
+    assert "utc" in json.loads(tool_messages[1]["content"])
+
+
+def test_schemas_are_built_once_and_arguments_validated():
+    schemas = export_tool_schemas_for_openai()
+    assert export_tool_schemas_for_openai() is schemas
+    assert {s["function"]["name"] for s in schemas} >= {"add_numbers", "fetch_url_text"}
+    assert call_tool("add_numbers", '{"a": 1, "b": 2.5}') == {"sum": 3.5}
+
+    runner = ToolRunner()
+    calls = [
+        {"name": "add_numbers", "arguments": '{"a": "one", "c": 1}'},
+        {"name": "add_numbers", "arguments": "{not json"},
+    ]
+    bad_types, bad_json = [json.loads(r) for r in asyncio.run(runner.run(calls))]
+    runner.close()
+    assert bad_types["error"] == "Invalid arguments for add_numbers"
+    assert bad_types["details"] == [
+        {"path": "b", "message": "is required"},
+        {"path": "a", "message": "expected number"},
+        {"path": "c", "message": "is not allowed"},
+    ]
+    assert bad_json["details"][0]["path"] == ""
+    assert "not valid JSON" in bad_json["details"][0]["message"]
+
+
+def test_compiled_validator_covers_nested_schemas():
+    validate = compile_schema(
+        {
+            "type": "object",
+            "properties": {
+                "tags": {"type": "array", "items": {"type": "string", "maxLength": 3}},
+                "mode": {"enum": ["fast", "slow"]},
+                "count": {"type": "integer", "minimum": 1},
+            },
+        }
+    )
+    assert validate({"tags": ["ab"], "mode": "fast", "count": 2}) == []
+    assert validate({"tags": ["abcd", 1], "mode": "other", "count": 0}) == [
+        {"path": "tags.0", "message": "violates maxLength 3"},
+        {"path": "tags.1", "message": "expected string"},
+        {"path": "mode", "message": "must be one of ['fast', 'slow']"},
+        {"path": "count", "message": "violates minimum 1"},
+    ]
+    assert validate([]) == [{"path": "", "message": "expected object"}]
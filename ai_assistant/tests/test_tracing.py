@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from assistant import tracing
+from assistant.config import Settings
+from assistant.profiling import Profiler, StackSampler, summarize
+from assistant.registry import AssistantRegistry
+
+
+def _spans():
+    exporter = tracing.memory_exporter()
+    spans = exporter.get_finished_spans()
+    exporter.clear()
+    return spans
+
+
+def test_chat_turn_has_a_span_per_stage(tmp_path):
+    tracing.configure("memory")
+    registry = AssistantRegistry(Settings(assistant_db_path=str(tmp_path / "mem.sqlite3")))
+
+    async def main():
+        try:
+            return await registry.engine("s1").chat_once("what time is it?")
+        finally:
+            await registry.aclose()
+
+    asyncio.run(main())
+    spans = _spans()
+    root = next(span for span in spans if span.name == "assistant.chat")
+    children = [
+        span for span in spans if span.parent and span.parent.span_id == root.context.span_id
+    ]
+    assert [span.name for span in sorted(children, key=lambda span: span.start_time)] == [
+        "memory.append",
+        "memory.fetch",
+        "provider.generate",
+        "tool.call",
+        "provider.generate",
+        "memory.append",
+    ]
+    assert root.attributes["assistant.session_id"] == "s1"
+    assert root.attributes["llm.provider"] == "local"
+    tool = next(span for span in children if span.name == "tool.call")
+    assert tool.attributes["tool.name"] == "get_current_time"
+    assert tool.attributes["tool.outcome"] == "ok"
+    first = next(span for span in children if span.name == "provider.generate")
+    assert first.attributes["llm.tool_calls"] == 1
+    assert first.attributes["llm.usage.prompt_tokens"] > 0
+    assert {span.context.trace_id for span in spans} == {root.context.trace_id}
+
+
+def _busy(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+def test_stack_sampler_folds_the_sampled_thread():
+    sampler = StackSampler(interval=0.001).start()
+    _busy(0.05)
+    folded = sampler.stop()
+    assert "test_tracing.py:_busy" in folded
+    assert "test_tracing.py:_busy" in summarize(folded)
+
+
+def test_requested_profile_is_attached_and_exported(tmp_path):
+    tracing.configure("memory")
+    registry = AssistantRegistry(Settings(assistant_db_path=str(tmp_path / "mem.sqlite3")))
+    registry.profiler = Profiler(allow_requests=True, interval=0.001, directory=str(tmp_path))
+    inner = registry.provider
+
+    async def slow_generate(messages, **kwargs):
+        _busy(0.05)
+        return await inner.generate(messages, **kwargs)
+
+    registry.provider = type("Slow", (), {"generate": staticmethod(slow_generate)})()
+
+    async def main():
+        try:
+            engine = registry.engine("s")
+            await engine.chat_once("hello", profile=True)
+            profiled = engine.profile_id
+            await engine.chat_once("hello again")
+            return profiled, engine.profile_id
+        finally:
+            await registry.aclose()
+
+    profiled, unprofiled = asyncio.run(main())
+    assert profiled is not None and unprofiled is None
+    root = next(span for span in _spans() if span.attributes.get("profile.id") == profiled)
+    assert "slow_generate" in root.attributes["profile.folded"]
+    assert root.attributes["profile.samples"] > 0
+    assert (tmp_path / f"{profiled}.folded").read_text().count("slow_generate") >= 1
@@ -0,0 +1,165 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from assistant.tools import web_fetch
+from assistant.tools.http_cache import ResponseCache, freshness
+from assistant.tools.web_fetch import WebFetcher
+
+
+class _Pages(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requests = []
+    big_bytes_sent = 0
+
+    def do_GET(self):  # noqa: N802
+        _Pages.requests.append((self.path, self.headers.get("If-None-Match")))
+        if self.path == "/etag":
+            if self.headers.get("If-None-Match") == '"v1"':
+                return self._send(304, b"", {"ETag": '"v1"', "Cache-Control": "no-cache"})
+            return self._send(200, b"versioned doc", {"ETag": '"v1"', "Cache-Control": "no-cache"})
+        if self.path == "/fresh":
+            return self._send(200, b"fresh doc", {"Cache-Control": "max-age=60"})
+        if self.path == "/nostore":
+            return self._send(200, b"secret", {"Cache-Control": "no-store", "ETag": '"x"'})
+        if self.path == "/slow":
+            time.sleep(0.3)
+            return self._send(200, b"slow doc", {"Cache-Control": "max-age=60"})
+        if self.path == "/big":
+            return self._send_big()
+        self._send(404, b"missing", {})
+
+    def _send(self, status, body, headers):
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "text/plain; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_big(self):
+        # 10 MB, chunked; the client should hang up long before the end.
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunk = b"a" * 16384
+        try:
+            for _ in range(640):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                _Pages.big_bytes_sent += len(chunk)
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture()
+def pages():
+    _Pages.requests = []
+    _Pages.big_bytes_sent = 0
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _Pages)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def _run(fetcher, coro):
+    async def main():
+        try:
+            return await coro
+        finally:
+            await fetcher.aclose()
+
+    return asyncio.run(main())
+
+
+def test_fresh_hits_skip_the_network_and_stale_entries_revalidate(pages):
+    fetcher = WebFetcher()
+
+    async def scenario():
+        fresh = [await fetcher.fetch(pages + "/fresh") for _ in range(3)]
+        versioned = [await fetcher.fetch(pages + "/etag") for _ in range(2)]
+        return fresh, versioned
+
+    fresh, versioned = _run(fetcher, scenario())
+    assert fresh == ["fresh doc"] * 3
+    assert versioned == ["versioned doc"] * 2
+    assert _Pages.requests == [("/fresh", None), ("/etag", None), ("/etag", '"v1"')]
+
+
+def test_concurrent_fetches_of_one_url_are_coalesced(pages):
+    fetcher = WebFetcher()
+
+    async def burst():
+        return await asyncio.gather(*(fetcher.fetch(pages + "/slow") for _ in range(5)))
+
+    results = _run(fetcher, burst())
+    assert results == ["slow doc"] * 5
+    assert _Pages.requests == [("/slow", None)]
+
+
+def test_body_is_capped_without_downloading_everything(pages):
+    fetcher = WebFetcher(max_bytes=100_000)
+    text = _run(fetcher, fetcher.fetch(pages + "/big"))
+    assert len(text) == 100_000
+    time.sleep(0.2)
+    assert _Pages.big_bytes_sent < 10 * 1024 * 1024
+
+
+def test_disk_cache_survives_new_fetchers_and_no_store_is_honored(pages, tmp_path):
+    async def both(fetcher):
+        return [await fetcher.fetch(pages + "/fresh"), await fetcher.fetch(pages + "/nostore")]
+
+    first = WebFetcher(cache=ResponseCache(directory=str(tmp_path)))
+    assert _run(first, both(first)) == ["fresh doc", "secret"]
+    second = WebFetcher(cache=ResponseCache(directory=str(tmp_path)))
+    assert _run(second, both(second)) == ["fresh doc", "secret"]
+    assert [path for path, _ in _Pages.requests] == ["/fresh", "/nostore", "/nostore"]
+
+
+def test_tool_reports_http_errors(pages):
+    fetcher = WebFetcher()
+    web_fetch.configure(fetcher)
+    try:
+        with pytest.raises(ValueError, match="HTTP error: 404"):
+            _run(fetcher, web_fetch.fetch_url_text({"url": pages + "/missing"}))
+    finally:
+        web_fetch.configure(None)
+
+
+def test_standalone_tool_closes_its_client_and_keeps_the_cache(pages, monkeypatch):
+    clients = []
+    client_class = httpx.AsyncClient
+
+    def tracking_client(**kwargs):
+        clients.append(client_class(**kwargs))
+        return clients[-1]
+
+    monkeypatch.setattr(httpx, "AsyncClient", tracking_client)
+    monkeypatch.setattr(web_fetch, "_standalone_cache", ResponseCache())
+    for _ in range(2):
+        result = asyncio.run(web_fetch.fetch_url_text({"url": pages + "/fresh"}))
+        assert result["text"] == "fresh doc"
+    assert len(clients) == 2 and all(client.is_closed for client in clients)
+    assert _Pages.requests == [("/fresh", None)]
+
+
+def test_freshness_rules():
+    assert freshness({"cache-control": "no-store"}) is None
+    assert freshness({"cache-control": "no-cache, max-age=60"}) == 0.0
+    assert freshness({"cache-control": "public, max-age=120"}) == 120.0
+    headers = {"date": "Mon, 01 Jan 2024 00:00:00 GMT", "expires": "Mon, 01 Jan 2024 00:05:00 GMT"}
+    assert freshness(headers) == 300.0
+    assert freshness({}) == 0.0